@@ -4,6 +4,7 @@ import os
 from pathlib import Path
 
 import chess
+import numpy as np
 import torch
 
 from packages.play.src.constants import RYLEE_MODEL_PATH, RYLEE_SKILL_LEVEL
@@ -132,31 +133,16 @@ class RyleePlayer(Player):
         # Get probabilities for all moves
         probs = move_output[0].cpu()  # Shape: (2104,)
 
-        # Find the legal move with highest probability
-        best_move = None
-        best_prob = -float("inf")
-
-        for move in legal_moves:
-            # Convert move to UCI string
-            uci_move = move.uci()
-
-            # Look up move index in vocabulary
-            move_idx = self.legal_moves_dataset.get_index_from_move(uci_move)
-
-            if move_idx == -1:
-                # Move not in vocabulary, skip
-                continue
-
-            prob = probs[move_idx].item()
-            if prob > best_prob:
-                best_prob = prob
-                best_move = move
+        # Find the legal move with highest probability, gathering all indices at once
+        move_indices = self.legal_moves_dataset.get_indices_from_moves(legal_moves)
+        in_vocabulary = np.flatnonzero(move_indices >= 0)
 
         # Fallback to first legal move if no valid move found
-        if best_move is None:
-            best_move = legal_moves[0]
+        if len(in_vocabulary) == 0:
+            return legal_moves[0]
 
-        return best_move
+        legal_probs = probs.numpy()[move_indices[in_vocabulary]]
+        return legal_moves[int(in_vocabulary[np.argmax(legal_probs)])]
 
     def _build_input_tensors(self, board: chess.Board) -> tuple[torch.Tensor, torch.Tensor]:
         """
@@ -168,7 +154,7 @@ class RyleePlayer(Player):
         turn = "w" if board.turn else "b"
         elo_tensor = ProcessedSnapshotsProcessor.normalize_elo(self.skill_level, self.skill_level)
         turn_tensor = ProcessedSnapshotsProcessor.encode_turn(turn)
-        board_tensor = ProcessedSnapshotsProcessor.fen_to_tensor(board.fen())
+        board_tensor = ProcessedSnapshotsProcessor.board_to_tensor(board)
 
         # Combine into single input tensor and add batch dimension
         metadata_tensor = torch.cat([elo_tensor, turn_tensor], dim=0).unsqueeze(0).to(self.device)
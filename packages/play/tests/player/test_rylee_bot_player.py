@@ -0,0 +1,83 @@
+"""Tests for the Rylee neural-network player."""
+
+import sqlite3
+from unittest.mock import patch
+
+import chess
+import pytest
+import torch
+
+from packages.play.src.player import rylee_bot_player
+from packages.play.src.player.rylee_bot_player import RyleePlayer, RyleePlayerConfig
+from packages.train.src.dataset.loaders.legal_moves import LegalMovesDataset
+from packages.train.src.dataset.processers.legal_moves import get_legal_moves
+
+
+class _FixedOutputModel(torch.nn.Module):
+    """Stand-in network returning the same move probabilities for every position."""
+
+    def __init__(self, probs: torch.Tensor):
+        super().__init__()
+        self.probs = probs
+
+    def forward(self, metadata, board):
+        assert metadata.shape == (1, 4)
+        assert board.shape == (1, 12, 8, 8)
+        return self.probs.unsqueeze(0), None
+
+
+@pytest.fixture
+def vocabulary(tmp_path):
+    """Legal move vocabulary stored in a temporary database."""
+    db_path = tmp_path / "legal_moves.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE legal_moves (move TEXT, types TEXT)")
+    conn.executemany(
+        "INSERT INTO legal_moves (move, types) VALUES (?, ?)",
+        [(m.move, ",".join(m.types)) for m in get_legal_moves()],
+    )
+    conn.commit()
+    conn.close()
+    return LegalMovesDataset(db_path=db_path)
+
+
+def _player(tmp_path, vocabulary: LegalMovesDataset, probs: torch.Tensor) -> RyleePlayer:
+    model_path = tmp_path / "model.pt"
+    model_path.touch()
+    with (
+        patch.object(rylee_bot_player, "LegalMovesDataset", return_value=vocabulary),
+        patch.object(RyleePlayer, "_load_model", return_value=_FixedOutputModel(probs)),
+    ):
+        return RyleePlayer(RyleePlayerConfig(model_path=str(model_path)))
+
+
+class TestRyleePlayer:
+    """Tests for RyleePlayer move selection."""
+
+    def test_picks_most_probable_legal_move(self, tmp_path, vocabulary):
+        """Test moves the network prefers but that are illegal are ignored."""
+        probs = torch.zeros(len(vocabulary))
+        probs[vocabulary.get_index_from_move("e2e5")] = 0.9  # not legal
+        probs[vocabulary.get_index_from_move("g1f3")] = 0.5
+        probs[vocabulary.get_index_from_move("e2e4")] = 0.3
+        player = _player(tmp_path, vocabulary, probs)
+
+        assert player.get_move(chess.Board()) == chess.Move.from_uci("g1f3")
+
+    def test_picks_promotion(self, tmp_path, vocabulary):
+        """Test promotions are matched to their vocabulary entries."""
+        probs = torch.zeros(len(vocabulary))
+        probs[vocabulary.get_index_from_move("b7b8N")] = 0.8
+        player = _player(tmp_path, vocabulary, probs)
+
+        move = player.get_move(chess.Board("4k3/1P6/8/8/8/8/8/4K3 w - - 0 1"))
+
+        assert move == chess.Move.from_uci("b7b8n")
+
+    def test_falls_back_to_first_legal_move(self, tmp_path, vocabulary):
+        """Test a legal move is returned even if no legal move is in the vocabulary."""
+        vocabulary.move_code_indices[:] = -1
+        player = _player(tmp_path, vocabulary, torch.zeros(len(vocabulary)))
+        board = chess.Board()
+
+        assert player.get_move(board) == next(iter(board.legal_moves))
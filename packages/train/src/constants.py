@@ -18,6 +18,12 @@ def _get_bool(key: str, default: bool) -> bool:
     return value.lower() in ("true", "1", "yes")
 
 
+def _get_list(key: str, default: str) -> tuple[str, ...]:
+    """Get a comma-separated list from an environment variable (empty means no entries)."""
+    value = os.getenv(key, default)
+    return tuple(item.strip() for item in value.split(",") if item.strip())
+
+
 # Database configuration
 DB_FILE = os.getenv("DB_FILE", "database.sqlite3")
 if not os.path.isabs(DB_FILE):
@@ -25,20 +31,40 @@ if not os.path.isabs(DB_FILE):
 
 # Default thresholds for data fetching
 DEFAULT_SNAPSHOTS_THRESHOLD = int(os.getenv("DEFAULT_SNAPSHOTS_THRESHOLD", "10000"))
-DEFAULT_MAX_SIZE_GB = float(os.getenv("DEFAULT_MAX_SIZE_GB", "10.0"))
+DEFAULT_MAX_SIZE_GB = float(os.getenv("DEFAULT_MAX_SIZE_GB", "10.0"))  # Archive and DB size limit
 DEFAULT_PRINT_INTERVAL = int(os.getenv("DEFAULT_PRINT_INTERVAL", "1000"))
 DEFAULT_MAX_FILES = int(os.getenv("DEFAULT_MAX_FILES", "5"))
 DEFAULT_BATCH_SIZE = int(os.getenv("DEFAULT_BATCH_SIZE", "1000"))  # Batch size for database writes
+SNAPSHOT_WORKERS = int(os.getenv("SNAPSHOT_WORKERS", "1"))  # Parser processes, 0 = all cores
+SNAPSHOT_CHUNK_SIZE = int(os.getenv("SNAPSHOT_CHUNK_SIZE", "64"))  # Games per worker task
+PROCESSED_WORKERS = int(os.getenv("PROCESSED_WORKERS", "1"))  # Encoder processes, 0 = all cores
+PROCESSED_RANGE_SIZE = int(os.getenv("PROCESSED_RANGE_SIZE", "100000"))  # Snapshot ids per task
+# Keep the PGN text of raw games after their snapshots have been extracted
+KEEP_PROCESSED_PGN = _get_bool("KEEP_PROCESSED_PGN", False)
 
 # ELO rating ranges for filtering
 MIN_ELO = int(os.getenv("MIN_ELO", "600"))
 MAX_ELO = int(os.getenv("MAX_ELO", "1900"))
 
+# Header-only filter applied before games are stored in raw_games (empty disables a check)
+INGEST_MAX_ELO_GAP = int(os.getenv("INGEST_MAX_ELO_GAP") or 0) or None
+INGEST_TIME_CONTROLS = _get_list("INGEST_TIME_CONTROLS", "Blitz,Rapid,Classical")
+INGEST_VARIANTS = _get_list("INGEST_VARIANTS", "Standard")
+
 # Network settings
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "16384"))  # 16 KB for decompression buffer
 
 # Lichess API URLs
 LICHESS_BASE_URL = os.getenv("LICHESS_BASE_URL", "https://database.lichess.org/standard/")
+METADATA_WORKERS = int(os.getenv("METADATA_WORKERS", "16"))  # Concurrent HEAD requests
+
+# Local cache of downloaded .pgn.zst archives
+ARCHIVE_CACHE_DIR = os.getenv("ARCHIVE_CACHE_DIR", "src/dataset/archive_cache")
+if not os.path.isabs(ARCHIVE_CACHE_DIR):
+    ARCHIVE_CACHE_DIR = str(Path(__file__).parent.parent / ARCHIVE_CACHE_DIR)
+ARCHIVE_CACHE_MAX_GB = float(os.getenv("ARCHIVE_CACHE_MAX_GB", "50.0"))
+# Decompressed bytes per frame when re-chunking a .pgn.zst into a seekable archive
+PGN_INDEX_FRAME_SIZE = int(os.getenv("PGN_INDEX_FRAME_SIZE", "262144"))
 
 # Piece integer mappings (for board representation)
 PIECE_TO_INT = {
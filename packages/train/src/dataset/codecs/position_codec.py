@@ -0,0 +1,179 @@
+"""Compact binary encoding of positions and moves stored in game_snapshots.
+
+A position is packed into 38 bytes instead of a ~60 character FEN:
+
+- 4 bitboards (uint64): white pieces and three planes holding the bits of each
+  piece type (pawn=1 ... king=6), so occupancy is the union of the planes
+- flags (uint8): side to move in bit 0, castling rights (K, Q, k, q) in bits 1-4
+- en passant square (int8, -1 for none)
+- halfmove clock and fullmove number (uint16 each)
+
+Packing and unpacking only shift and mask python-chess' bitboards, which is several
+times cheaper than Board.fen() and Board.san().
+
+unpack_piece_bitboards decodes a whole batch of positions with NumPy, without building
+a chess.Board per position. The 12 piece bitboards (96 bytes) are also how boards are
+stored in processed_snapshots; bitboards_to_planes expands them into the (12, 8, 8)
+one-hot planes the model reads.
+
+A move is a uint16 code: from square | to square << 6 | promotion piece type << 12.
+Unlike an index into the legal move vocabulary it does not change when the vocabulary
+is rebuilt. FEN and SAN remain available on demand through the helpers below.
+"""
+
+import struct
+from collections.abc import Sequence
+
+import chess
+import numpy as np
+
+_POSITION_FORMAT = struct.Struct("<4QBbHH")
+POSITION_SIZE = _POSITION_FORMAT.size
+# Same layout as _POSITION_FORMAT, to read many positions at once
+_POSITION_DTYPE = np.dtype(
+    [
+        ("white", "<u8"),
+        ("planes", "<u8", (3,)),
+        ("flags", "u1"),
+        ("ep_square", "i1"),
+        ("halfmove", "<u2"),
+        ("fullmove", "<u2"),
+    ]
+)
+
+_TURN_FLAG = 1
+# (castling flag, rook square whose right it stands for)
+_CASTLING_FLAGS = (
+    (1 << 1, chess.BB_H1),
+    (1 << 2, chess.BB_A1),
+    (1 << 3, chess.BB_H8),
+    (1 << 4, chess.BB_A8),
+)
+
+
+def pack_board(board: chess.Board) -> bytes:
+    """Pack a standard chess position into POSITION_SIZE bytes."""
+    plane0 = board.pawns | board.bishops | board.queens  # piece types 1, 3, 5
+    plane1 = board.knights | board.bishops | board.kings  # piece types 2, 3, 6
+    plane2 = board.rooks | board.queens | board.kings  # piece types 4, 5, 6
+
+    flags = _TURN_FLAG if board.turn == chess.WHITE else 0
+    for flag, rook_square in _CASTLING_FLAGS:
+        if board.castling_rights & rook_square:
+            flags |= flag
+
+    return _POSITION_FORMAT.pack(
+        board.occupied_co[chess.WHITE],
+        plane0,
+        plane1,
+        plane2,
+        flags,
+        board.ep_square if board.ep_square is not None else -1,
+        board.halfmove_clock,
+        board.fullmove_number,
+    )
+
+
+def unpack_board(position: bytes) -> chess.Board:
+    """Rebuild the chess.Board packed by pack_board (without move history)."""
+    white, plane0, plane1, plane2, flags, ep_square, halfmove, fullmove = _POSITION_FORMAT.unpack(
+        position
+    )
+
+    board = chess.Board.empty()
+    board.pawns = plane0 & ~plane1 & ~plane2
+    board.knights = plane1 & ~plane0 & ~plane2
+    board.bishops = plane0 & plane1 & ~plane2
+    board.rooks = plane2 & ~plane0 & ~plane1
+    board.queens = plane0 & plane2 & ~plane1
+    board.kings = plane1 & plane2 & ~plane0
+    board.occupied = plane0 | plane1 | plane2
+    board.occupied_co[chess.WHITE] = white
+    board.occupied_co[chess.BLACK] = board.occupied & ~white
+
+    board.turn = bool(flags & _TURN_FLAG)
+    board.castling_rights = 0
+    for flag, rook_square in _CASTLING_FLAGS:
+        if flags & flag:
+            board.castling_rights |= rook_square
+    board.ep_square = ep_square if ep_square >= 0 else None
+    board.halfmove_clock = halfmove
+    board.fullmove_number = fullmove
+    return board
+
+
+def unpack_piece_bitboards(positions: Sequence[bytes]) -> np.ndarray:
+    """Return the piece bitboards of packed positions as an (N, 12) uint64 array.
+
+    Columns are the white pawn, knight, bishop, rook, queen and king bitboards, then
+    the black ones, computed with vectorised bit operations over the whole batch.
+    """
+    packed = np.frombuffer(b"".join(positions), dtype=_POSITION_DTYPE)
+    white = packed["white"][:, None]
+    plane0, plane1, plane2 = (packed["planes"][:, i] for i in range(3))
+    pieces = np.stack(
+        [
+            plane0 & ~plane1 & ~plane2,  # pawns
+            plane1 & ~plane0 & ~plane2,  # knights
+            plane0 & plane1 & ~plane2,  # bishops
+            plane2 & ~plane0 & ~plane1,  # rooks
+            plane0 & plane2 & ~plane1,  # queens
+            plane1 & plane2 & ~plane0,  # kings
+        ],
+        axis=1,
+    )
+    return np.concatenate([pieces & white, pieces & ~white], axis=1)
+
+
+def bitboards_to_planes(bitboards: np.ndarray) -> np.ndarray:
+    """Expand uint64 bitboards into 8x8 float32 planes indexed [rank, file].
+
+    Each bitboard is viewed as its 8 little-endian bytes, one per rank, whose bits are
+    unpacked least significant first, i.e. in file order.
+
+    Args:
+        bitboards: uint64 array of any shape (...,)
+
+    Returns:
+        float32 array of shape (..., 8, 8)
+    """
+    ranks = np.ascontiguousarray(bitboards, dtype="<u8").view(np.uint8)
+    planes = np.unpackbits(ranks, bitorder="little")
+    return planes.reshape(*bitboards.shape, 8, 8).astype(np.float32)
+
+
+def planes_to_bitboards(planes: np.ndarray) -> np.ndarray:
+    """Inverse of bitboards_to_planes: pack (..., 8, 8) planes into uint64 bitboards."""
+    ranks = np.packbits(planes.reshape(*planes.shape[:-2], 64) > 0.5, axis=-1, bitorder="little")
+    return np.ascontiguousarray(ranks).view("<u8").reshape(planes.shape[:-2])
+
+
+def encode_move(move: chess.Move) -> int:
+    """Encode a move as a uint16 from/to/promotion code."""
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def decode_move(move_code: int) -> chess.Move:
+    """Decode a move code produced by encode_move."""
+    promotion = move_code >> 12
+    return chess.Move(move_code & 0x3F, (move_code >> 6) & 0x3F, promotion or None)
+
+
+def position_to_fen(position: bytes) -> str:
+    """Return the FEN of a packed position."""
+    return unpack_board(position).fen()
+
+
+def fen_to_position(fen: str) -> bytes:
+    """Pack the position described by a FEN string."""
+    return pack_board(chess.Board(fen))
+
+
+def move_code_to_san(position: bytes, move_code: int) -> str:
+    """Return the SAN of a move code played from a packed position."""
+    return unpack_board(position).san(decode_move(move_code))
+
+
+def san_to_move_code(fen: str, san: str) -> int:
+    """Encode a SAN move played from the position described by a FEN string."""
+    return encode_move(chess.Board(fen).parse_san(san))
@@ -1,36 +1,75 @@
 """Filler script to populate the processed_snapshots table with encoded data."""
 
+import multiprocessing
+import os
+import queue
+from collections.abc import Generator
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import suppress
+from multiprocessing.queues import Queue
+from multiprocessing.synchronize import Event
+
 from packages.train.src.constants import (
     DEFAULT_BATCH_SIZE,
     DEFAULT_PRINT_INTERVAL,
     DEFAULT_SNAPSHOTS_THRESHOLD,
+    PROCESSED_RANGE_SIZE,
+    PROCESSED_WORKERS,
 )
+from packages.train.src.dataset.models.processed_range import ProcessedRange
 from packages.train.src.dataset.processers.processed_snapshots import ProcessedSnapshotsProcessor
 from packages.train.src.dataset.repositories.database import initialize_database
 from packages.train.src.dataset.repositories.game_snapshots import (
     count_snapshots,
-    get_snapshots_batch,
+    get_last_snapshot_id,
+    iter_snapshots_batches,
 )
-from packages.train.src.dataset.repositories.processed_snapshots import (
-    count_processed_snapshots,
-    save_processed_snapshots,
+from packages.train.src.dataset.repositories.ingest import save_processed_batch
+from packages.train.src.dataset.repositories.processed_ranges import (
+    fetch_processed_ranges,
+    save_processed_ranges,
 )
 
+# (range start_id, last id read, rows to save); the range is done once last id is its end_id
+EncodedBatch = tuple[int, int, list[tuple[int, bytes, bytes, int, bytes]]]
+
+# Seconds the writer waits on the queue before checking the workers for errors, and a
+# worker waits on a full queue before checking whether to stop
+_QUEUE_POLL_TIMEOUT = 1.0
+
+# Worker process state, set by _init_worker
+_worker_processor: ProcessedSnapshotsProcessor | None = None
+_worker_queue: "Queue[EncodedBatch] | None" = None
+_worker_stop: Event | None = None
+
 
 def fill_processed_snapshots(
     batch_size: int = DEFAULT_BATCH_SIZE,
     print_interval: int = DEFAULT_PRINT_INTERVAL,
     max_snapshots: int | None = DEFAULT_SNAPSHOTS_THRESHOLD,
+    workers: int = PROCESSED_WORKERS,
+    range_size: int = PROCESSED_RANGE_SIZE,
 ):
     """Process raw game snapshots and populate the processed_snapshots table.
 
+    The snapshot ids up to the max_snapshots-th snapshot are split into ranges of
+    range_size ids, recorded in the processed_ranges table. Each range is read in id
+    order with keyset pagination, and every batch is committed together with the
+    progress of its range, so an interrupted run resumes every range where it stopped.
+
+    workers > 1 encodes ranges in that many processes (0 uses every core), each with
+    its own read connection and ProcessedSnapshotsProcessor. Encoded batches go through
+    a bounded queue to this process, which stays the only database writer.
+
     Args:
         batch_size: Number of snapshots to process per batch
         print_interval: Interval for progress printing
         max_snapshots: Maximum number of snapshots to process (None for all available)
+        workers: Number of encoder processes
+        range_size: Number of snapshot ids per range
     """
     initialize_database()
-    processor = ProcessedSnapshotsProcessor()
+    workers = workers if workers > 0 else os.cpu_count() or 1
 
     print("Starting to fill processed_snapshots table...")
 
@@ -45,62 +84,157 @@ def fill_processed_snapshots(
     print(f"Total snapshots available: {total_snapshots}")
     print(f"Target snapshots to process: {target_snapshots}")
 
-    # Get starting point - continue from last processed snapshot
-    last_processed_id = count_processed_snapshots()
-    offset = last_processed_id
+    last_id = get_last_snapshot_id(max_snapshots)
+    ranges = _plan_ranges(last_id, range_size)
+    print(f"Processing {len(ranges)} ranges of snapshot ids up to {last_id}")
 
-    print(f"Starting from snapshot: {offset + 1}")
+    encoded_batches = (
+        _encode_in_workers(ranges, batch_size, workers)
+        if workers > 1
+        else _encode_ranges(ProcessedSnapshotsProcessor(), ranges, batch_size)
+    )
 
     processed_count = 0
     last_print = 0
-
-    # Process in batches
-    while offset < target_snapshots:
-        rows = get_snapshots_batch(offset, batch_size)
-
-        if not rows:
-            break
-
-        to_save = []
-        for row in rows:
-            snapshot_id = row[0]
-            data = {
-                "fen": row[1],
-                "move": row[2],
-                "turn": row[3],
-                "white_elo": row[4] if row[4] is not None else 0,
-                "black_elo": row[5] if row[5] is not None else 0,
-                "result": row[6],
-            }
-
-            try:
-                board, metadata, chosen_move, valid_moves = processor.process_snapshot_row(data)
-                to_save.append(
-                    (
-                        snapshot_id,
-                        board.numpy().tobytes(),
-                        metadata.numpy().tobytes(),
-                        chosen_move,
-                        valid_moves.numpy().tobytes(),
-                    )
-                )
-            except Exception as e:
-                print(f"Warning: Failed to process snapshot {snapshot_id}: {e}")
-                continue
-
-        # Save batch
-        save_processed_snapshots(to_save)
-
-        processed_count += len(to_save)
-        offset += batch_size
-
-        # Progress print
-        if processed_count // print_interval > last_print // print_interval:
-            print(f"{processed_count} snapshots processed...")
-            last_print = processed_count
+    try:
+        for start_id, batch_last_id, to_save in encoded_batches:
+            save_processed_batch(to_save, start_id, batch_last_id)
+            processed_count += len(to_save)
+
+            # Progress print
+            if processed_count // print_interval > last_print // print_interval:
+                print(f"{processed_count} snapshots processed...")
+                last_print = processed_count
+    finally:
+        encoded_batches.close()
 
     print(f"Completed. Processed {processed_count} snapshots.")
 
 
+def _plan_ranges(last_id: int, range_size: int) -> list[ProcessedRange]:
+    """Return the unfinished ranges covering the snapshot ids up to last_id.
+
+    Ranges recorded by earlier runs are kept as they are, and new ranges of range_size
+    ids are appended after the last of them.
+    """
+    ranges = fetch_processed_ranges()
+    planned_until = max((r.end_id for r in ranges), default=0)
+    new_ranges = [
+        ProcessedRange(start_id, min(start_id + range_size, last_id), start_id)
+        for start_id in range(planned_until, last_id, range_size)
+    ]
+    save_processed_ranges(new_ranges)
+    return [r for r in ranges + new_ranges if not r.done and r.start_id < last_id]
+
+
+def _encode_ranges(
+    processor: ProcessedSnapshotsProcessor, ranges: list[ProcessedRange], batch_size: int
+) -> Generator[EncodedBatch, None, None]:
+    """Encode the unprocessed snapshots of each range, one batch at a time.
+
+    Every range ends with an empty batch at its end_id, which marks it as done even if
+    its last snapshots are missing or have no statistics.
+    """
+    for processed_range in ranges:
+        for rows in iter_snapshots_batches(
+            after_id=processed_range.last_id,
+            batch_size=batch_size,
+            max_id=processed_range.end_id,
+        ):
+            yield processed_range.start_id, rows[-1][0], _encode_rows(processor, rows)
+        yield processed_range.start_id, processed_range.end_id, []
+
+
+def _encode_rows(
+    processor: ProcessedSnapshotsProcessor, rows: list[tuple]
+) -> list[tuple[int, bytes, bytes, int, bytes]]:
+    """Encode snapshot rows into rows for save_processed_snapshots."""
+    encoded = processor.process_snapshot_rows(rows)
+    return [
+        (
+            int(snapshot_id),
+            board.tobytes(),
+            metadata.tobytes(),
+            int(chosen),
+            valid.astype("<u2").tobytes(),
+        )
+        for snapshot_id, board, metadata, chosen, valid in zip(
+            encoded.snapshot_ids,
+            encoded.bitboards.astype("<u8"),
+            encoded.metadata,
+            encoded.chosen_moves,
+            encoded.valid_moves,
+            strict=True,
+        )
+    ]
+
+
+def _init_worker(batches: "Queue[EncodedBatch]", stop: Event) -> None:
+    """Worker initializer: build this process's processor and keep the shared queue."""
+    global _worker_processor, _worker_queue, _worker_stop
+    # Batches a stopped writer never reads must not keep the worker from exiting
+    batches.cancel_join_thread()
+    _worker_processor = ProcessedSnapshotsProcessor()
+    _worker_queue = batches
+    _worker_stop = stop
+
+
+def _encode_range_in_worker(processed_range: ProcessedRange, batch_size: int) -> None:
+    """Worker entry point: encode one range and put its batches on the queue."""
+    assert _worker_processor is not None
+    assert _worker_queue is not None and _worker_stop is not None
+    for batch in _encode_ranges(_worker_processor, [processed_range], batch_size):
+        while True:
+            if _worker_stop.is_set():
+                return
+            with suppress(queue.Full):
+                _worker_queue.put(batch, timeout=_QUEUE_POLL_TIMEOUT)
+                break
+
+
+def _encode_in_workers(
+    ranges: list[ProcessedRange], batch_size: int, workers: int
+) -> Generator[EncodedBatch, None, None]:
+    """Encode ranges in worker processes, yielding batches as they arrive.
+
+    The queue holds at most two batches per worker, which bounds memory and blocks the
+    workers while the writer catches up. Batches of one range arrive in id order.
+    """
+    context = multiprocessing.get_context()
+    batches: Queue[EncodedBatch] = context.Queue(maxsize=2 * workers)
+    stop = context.Event()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(batches, stop)
+    ) as executor:
+        futures: list[Future[None]] = [
+            executor.submit(_encode_range_in_worker, processed_range, batch_size)
+            for processed_range in ranges
+        ]
+        # Ranges not done yet; a range is done by the first batch reaching its end_id
+        end_ids = {r.start_id: r.end_id for r in ranges}
+        try:
+            while end_ids:
+                try:
+                    batch = batches.get(timeout=_QUEUE_POLL_TIMEOUT)
+                except queue.Empty:
+                    _raise_worker_error(futures)
+                    continue
+                start_id, last_id, _ = batch
+                if end_ids.get(start_id) == last_id:
+                    del end_ids[start_id]
+                yield batch
+        finally:
+            # Workers see stop after their current batch, or within a poll of a full queue
+            stop.set()
+            executor.shutdown(cancel_futures=True)
+
+
+def _raise_worker_error(futures: list[Future[None]]) -> None:
+    """Re-raise the error of the first worker task that failed, if any."""
+    for future in futures:
+        if future.done() and not future.cancelled() and (error := future.exception()) is not None:
+            raise error
+
+
 if __name__ == "__main__":
     fill_processed_snapshots()
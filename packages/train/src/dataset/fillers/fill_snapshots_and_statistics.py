@@ -3,15 +3,23 @@ from packages.train.src.constants import (
     DEFAULT_MAX_SIZE_GB,
     DEFAULT_PRINT_INTERVAL,
     DEFAULT_SNAPSHOTS_THRESHOLD,
+    SNAPSHOT_WORKERS,
 )
 from packages.train.src.dataset.processers.game_snapshots import SnapshotBatchProcessor
-from packages.train.src.dataset.repositories.database import initialize_database
+from packages.train.src.dataset.processers.ingest_filter import IngestFilter
+from packages.train.src.dataset.repositories.database import (
+    initialize_database,
+    over_size_budget,
+    reclaim_free_pages,
+)
 from packages.train.src.dataset.repositories.files_metadata import (
     ensure_metadata_exists,
     fetch_file_metadata_by_filename,
     mark_file_as_processed,
 )
+from packages.train.src.dataset.repositories.ingest import bulk_ingest
 from packages.train.src.dataset.repositories.raw_games import fetch_unprocessed_raw_games
+from packages.train.src.dataset.requesters.archive_cache import ArchiveCache
 from packages.train.src.dataset.requesters.raw_games import (
     fetch_new_raw_games,
     fetch_raw_games_from_file,
@@ -23,39 +31,86 @@ def fill_database_with_snapshots(
     max_size_gb: float = DEFAULT_MAX_SIZE_GB,
     print_interval: int = DEFAULT_PRINT_INTERVAL,
     batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = SNAPSHOT_WORKERS,
+    max_db_size_gb: float = DEFAULT_MAX_SIZE_GB,
 ) -> None:
     """Download and process Lichess files until reaching snapshot threshold.
 
     Downloads files under max_size_gb, processes games, and saves snapshots and statistics.
-    Stops when snapshots_threshold is reached or no more files are available.
+    Ingestion also stops once the database file approaches max_db_size_gb and nothing
+    more can be reclaimed by dropping the PGN of processed games. The size is checked
+    after each committed batch, not for every game.
+    Download, parsing and snapshot generation run interleaved: as soon as
+    snapshots_threshold is reached the download is closed and the file's progress is
+    recorded so that a later run resumes from there. Stops when no more files are
+    available.
+
+    workers > 1 parses games in that many processes (0 uses every core); the
+    database is still written by this process only.
+
+    Games rejected by the header-only IngestFilter (configured in constants) are
+    skipped before they reach raw_games.
+
+    The secondary indexes of game_snapshots and game_statistics are dropped while
+    ingesting and rebuilt afterwards when the run more than doubles the snapshot count.
 
     Note: This automatically populates both game_snapshots and game_statistics tables.
     """
     initialize_database()
     ensure_metadata_exists()
 
-    processor = SnapshotBatchProcessor(batch_size=batch_size, print_interval=print_interval)
-
-    while True:
-        if processor.get_snapshot_count() >= snapshots_threshold:
-            print(f"Reached {processor.get_snapshot_count()} snapshots. Done.")
-            break
-
-        games_processed = processor.process_games(
-            games=fetch_unprocessed_raw_games(),
-            should_stop=lambda: processor.get_snapshot_count() >= snapshots_threshold,
-        )
-
-        if games_processed == 0:
-            print("No unprocessed games left. Fetching a new file...")
-            new_games_batch = list(fetch_new_raw_games(max_files=1, max_size_gb=max_size_gb))
-
-            if not new_games_batch:
-                print("WARNING: No new files or games available. Stopping.")
+    processor = SnapshotBatchProcessor(
+        batch_size=batch_size, print_interval=print_interval, workers=workers
+    )
+    cache = ArchiveCache()
+    ingest_filter = IngestFilter()
+
+    def threshold_reached() -> bool:
+        return processor.get_snapshot_count() >= snapshots_threshold
+
+    def over_budget() -> bool:
+        return over_size_budget(max_db_size_gb)
+
+    # Rebuilding an index costs about as much as maintaining it while as many rows
+    # as the table already holds are inserted
+    existing = processor.get_snapshot_count()
+    with bulk_ingest(enabled=snapshots_threshold - existing > existing):
+        while True:
+            if threshold_reached():
+                print(f"Reached {processor.get_snapshot_count()} snapshots. Done.")
+                break
+            if over_budget():
+                print(f"Database reached its size budget of {max_db_size_gb} GB. Stopping.")
                 break
 
-            print(f"New {len(new_games_batch)} raw games saved. Continuing processing...")
-
+            games_processed = processor.process_games(
+                games=fetch_unprocessed_raw_games(),
+                should_stop=threshold_reached,
+                should_stop_after_batch=over_budget,
+            )
+
+            if games_processed == 0:
+                print("No unprocessed games left. Streaming a new file...")
+                new_games = fetch_new_raw_games(
+                    max_files=1, max_size_gb=max_size_gb, cache=cache, ingest_filter=ingest_filter
+                )
+                try:
+                    games_processed = processor.process_games(
+                        games=new_games,
+                        should_stop=threshold_reached,
+                        should_stop_after_batch=over_budget,
+                    )
+                finally:
+                    # Closing the stream early records the file's progress for resuming
+                    new_games.close()
+
+                if not games_processed:
+                    print("WARNING: No new files or games available. Stopping.")
+                    break
+
+                print(f"Processed {games_processed} newly downloaded games. Continuing...")
+
+    reclaim_free_pages()
     print(f"Completed. Total snapshots: {processor.get_snapshot_count()}")
 
 
@@ -63,6 +118,7 @@ def fill_database_with_snapshots_from_lichess_filename(
     filename: str,
     print_interval: int = DEFAULT_PRINT_INTERVAL,
     batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = SNAPSHOT_WORKERS,
 ) -> None:
     """Download and process a specific Lichess file by filename.
 
@@ -81,17 +137,23 @@ def fill_database_with_snapshots_from_lichess_filename(
 
     if not file_meta.processed:
         games_downloaded = 0
-        for _ in fetch_raw_games_from_file(file_meta):
+        for _ in fetch_raw_games_from_file(
+            file_meta, cache=ArchiveCache(), ingest_filter=IngestFilter()
+        ):
             games_downloaded += 1
         print(f"Downloaded and saved {games_downloaded} raw games from {file_meta.filename}.")
     else:
         print(f"File already downloaded: {file_meta.filename}")
 
     print(f"Processing games from {file_meta.filename}...")
-    processor = SnapshotBatchProcessor(batch_size=batch_size, print_interval=print_interval)
-    games_processed = processor.process_games(
-        games=fetch_unprocessed_raw_games(file_id=file_meta.id),
+    processor = SnapshotBatchProcessor(
+        batch_size=batch_size, print_interval=print_interval, workers=workers
     )
+    with bulk_ingest():
+        games_processed = processor.process_games(
+            games=fetch_unprocessed_raw_games(file_id=file_meta.id),
+        )
+    reclaim_free_pages()
     print(f"Processed {games_processed} games from {file_meta.filename}.")
 
     if not file_meta.processed:
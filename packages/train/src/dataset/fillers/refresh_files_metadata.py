@@ -0,0 +1,49 @@
+"""
+Pick up newly published Lichess archives without re-crawling the known ones.
+
+counts.txt and the directory listing are requested conditionally, so an unchanged
+listing costs two 304 responses and HEAD requests are sent only for new archives.
+
+Usage:
+    python -m packages.train.src.dataset.fillers.refresh_files_metadata
+"""
+
+from packages.train.src.dataset.repositories.database import initialize_database
+from packages.train.src.dataset.repositories.files_metadata import (
+    fetch_all_files_metadata,
+    save_files_metadata,
+    update_files_games,
+)
+from packages.train.src.dataset.repositories.http_validators import (
+    fetch_http_validators,
+    save_http_validators,
+)
+from packages.train.src.dataset.requesters.file_metadata import fetch_files_metadata_changes
+
+
+def refresh_files_metadata() -> int:
+    """Add metadata for new archives and refresh game counts.
+
+    Returns:
+        Number of archives added to files_metadata
+    """
+    initialize_database()
+
+    known_filenames = [f.filename for f in fetch_all_files_metadata()]
+    changes = fetch_files_metadata_changes(known_filenames, fetch_http_validators())
+    if changes is None:
+        print("File metadata is up to date.")
+        return 0
+
+    save_files_metadata(changes.new_files)
+    if changes.counts:
+        update_files_games(changes.counts)
+    # Validators last: if saving fails, the next refresh downloads everything again
+    save_http_validators(changes.validators)
+
+    print(f"Added {len(changes.new_files)} new files to the metadata.")
+    return len(changes.new_files)
+
+
+if __name__ == "__main__":
+    refresh_files_metadata()
@@ -2,12 +2,16 @@
 
 from pathlib import Path
 
-from torch.utils.data import Dataset
+import numpy as np
+import torch
+from torch.utils.data import Dataset, default_collate
 
 from packages.train.src.constants import DB_FILE
+from packages.train.src.dataset.codecs.position_codec import bitboards_to_planes
 from packages.train.src.dataset.repositories.database import initialize_database
 from packages.train.src.dataset.repositories.processed_snapshots import (
     count_processed_snapshots,
+    get_processed_snapshot_ids,
     get_processed_snapshots_batch,
 )
 
@@ -16,7 +20,9 @@ class GameSnapshotsDataset(Dataset):
     """PyTorch Dataset for loading pre-processed game snapshots from SQLite database.
 
     Loads pre-encoded board positions, metadata, chosen moves, and valid moves from the processed_snapshots table.
-    Assumes the table is fully populated by the filler script.
+    Index i is the (start_index + i)-th processed snapshot in id order; the ids of the
+    slice are read once on creation, as processed ids have gaps. Boards are stored as 12
+    piece bitboards and expanded into one-hot planes for the whole batch at once.
 
     Args:
         start_index: Starting index for dataset slice
@@ -28,7 +34,9 @@ class GameSnapshotsDataset(Dataset):
             - board: Tensor of shape (12, 8, 8) - one-hot encoded pieces
             - metadata: Tensor of shape (4,) - [white_elo_norm, black_elo_norm, turn_white, turn_black]
             - chosen_move: Integer index of the chosen move in legal_moves
-            - valid_moves: Tensor of shape (num_legal_moves,) - binary mask of legal moves
+            - valid_moves: int64 Tensor of shape (k,) - vocabulary indices of the k legal moves
+
+    Batch it with collate_snapshots, which keeps the legal moves sparse.
     """
 
     def __init__(self, start_index: int, num_indexes: int, db_path: str | Path | None = None):
@@ -43,6 +51,7 @@ class GameSnapshotsDataset(Dataset):
         self.db_path = str(db_path) if db_path else DB_FILE
 
         initialize_database()
+        self.snapshot_ids = get_processed_snapshot_ids(start_index, num_indexes)
 
     def __len__(self) -> int:
         """Return the number of samples in the dataset."""
@@ -60,27 +69,51 @@ class GameSnapshotsDataset(Dataset):
         return self.__getitems__([idx])[0]
 
     def __getitems__(self, idxs: list[int]):
-        """Get multiple samples from the dataset by reading pre-processed data.
-
-        Assumes processed_snapshots table is fully populated by the filler.
-        """
-        # Convert dataset indices to game_snapshots.id values (1-indexed)
-        db_idxs = [idx + self.start_index + 1 for idx in idxs]
+        """Get multiple samples from the dataset by reading pre-processed data."""
+        # Convert dataset indices to the game_snapshots.id values of the slice
+        db_idxs = [int(self.snapshot_ids[idx]) for idx in idxs]
 
         # Query processed_snapshots for all requested IDs in one go
         cached = get_processed_snapshots_batch(db_idxs)
 
-        # Build results in original order
-        results = []
         for db_idx in db_idxs:
             if db_idx not in cached:
                 raise IndexError(
                     f"No processed data for snapshot ID {db_idx}. Run the filler first."
                 )
+        snapshots = [cached[db_idx] for db_idx in db_idxs]
 
-            snapshot = cached[db_idx]
-            results.append(
-                ((snapshot.board, snapshot.metadata), (snapshot.chosen_move, snapshot.valid_moves))
-            )
+        # Expand the boards of the whole batch in one call
+        boards = torch.from_numpy(
+            bitboards_to_planes(np.stack([snapshot.bitboards for snapshot in snapshots]))
+        )
+
+        # Build results in original order
+        return [
+            ((board, snapshot.metadata), (snapshot.chosen_move, snapshot.valid_moves))
+            for board, snapshot in zip(boards, snapshots, strict=True)
+        ]
+
+
+def collate_snapshots(batch: list) -> tuple:
+    """Collate GameSnapshotsDataset samples into a batch, keeping legal moves sparse.
 
-        return results
+    Legal move lists differ in length, so instead of being stacked they are returned as
+    the coordinates of the ones of the (batch_size, num_legal_moves) legal move mask.
+
+    Returns:
+        ((board, metadata), (chosen_move, (legal_rows, legal_moves))) where board,
+        metadata and chosen_move are stacked as by default_collate, and legal_rows and
+        legal_moves are int64 tensors holding the sample and vocabulary index of every
+        legal move of the batch
+    """
+    inputs, chosen_moves, valid_moves = [], [], []
+    for sample_inputs, (chosen_move, sample_valid_moves) in batch:
+        inputs.append(sample_inputs)
+        chosen_moves.append(chosen_move)
+        valid_moves.append(sample_valid_moves)
+
+    lengths = torch.tensor([len(moves) for moves in valid_moves])
+    legal_rows = torch.repeat_interleave(torch.arange(len(batch)), lengths)
+    legal_moves = torch.cat(valid_moves) if valid_moves else torch.empty(0, dtype=torch.int64)
+    return default_collate(inputs), (default_collate(chosen_moves), (legal_rows, legal_moves))
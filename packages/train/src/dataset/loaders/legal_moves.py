@@ -1,12 +1,16 @@
 """PyTorch Dataset for legal chess moves."""
 
-import sqlite3
+from collections.abc import Iterable
 from pathlib import Path
 from typing import Any
 
+import chess
+import numpy as np
 import torch
 
 from packages.train.src.constants import DB_FILE
+from packages.train.src.dataset.codecs.position_codec import encode_move
+from packages.train.src.dataset.repositories.connection import get_connection
 
 
 class LegalMovesDataset:
@@ -24,6 +28,11 @@ class LegalMovesDataset:
         PIECE_TO_IDX: Mapping of piece names to their respective indices.
         FILES: String representing valid file names in chess notation.
         RANKS: String representing valid rank names in chess notation.
+        move_index_table: Vocabulary index of every move, indexed by
+            [from_square, to_square, promotion piece type (0 for none)], -1 for moves
+            outside the vocabulary.
+        move_code_indices: The same table flattened and indexed by the move codes of
+            position_codec.encode_move, for vectorised lookups.
     """
 
     PIECE_NAMES = ["pawn", "knight", "bishop", "rook", "queen", "king"]
@@ -50,15 +59,16 @@ class LegalMovesDataset:
             self.vocab = vocab
 
         self.idx_to_move = {idx: move for move, idx in self.vocab.items()}
+        self.move_code_indices = self._build_move_code_indices()
+        # A move code is from | to << 6 | promotion << 12, so this is a view of the same array
+        self.move_index_table = self.move_code_indices.reshape(7, 64, 64).transpose(2, 1, 0)
 
     def _load_data(self) -> list[dict]:
         """Load all legal moves from database."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = get_connection(self.db_path).cursor()
 
         cursor.execute("SELECT move, types FROM legal_moves")
         rows = cursor.fetchall()
-        conn.close()
 
         data = []
         for row in rows:
@@ -77,6 +87,20 @@ class LegalMovesDataset:
                 vocab[move] = len(vocab)
         return vocab
 
+    def _build_move_code_indices(self) -> np.ndarray:
+        """Map every move code to its vocabulary index (-1 outside the vocabulary).
+
+        Vocabulary moves are UCI strings; promotion letters are matched case-insensitively.
+        """
+        indices = np.full(7 << 12, -1, dtype=np.int64)
+        for move, idx in self.vocab.items():
+            try:
+                parsed = chess.Move.from_uci(move.lower())
+            except ValueError:
+                continue
+            indices[encode_move(parsed)] = idx
+        return indices
+
     def _encode_move(self, move: str) -> torch.Tensor:
         """Encode move as a tensor.
 
@@ -155,6 +179,29 @@ class LegalMovesDataset:
         """
         return self.vocab.get(move, -1)
 
+    def get_index_from_chess_move(self, move: chess.Move) -> int:
+        """Get vocabulary index of a move with integer arithmetic only.
+
+        Args:
+            move: Move to look up
+
+        Returns:
+            Vocabulary index, or -1 if move not in vocabulary
+        """
+        return int(self.move_index_table[move.from_square, move.to_square, move.promotion or 0])
+
+    def get_indices_from_moves(self, moves: Iterable[chess.Move]) -> np.ndarray:
+        """Get vocabulary indices of many moves in one vectorised gather.
+
+        Args:
+            moves: Moves to look up, e.g. board.legal_moves
+
+        Returns:
+            int64 array of vocabulary indices, -1 for moves not in vocabulary
+        """
+        codes = np.fromiter(map(encode_move, moves), dtype=np.int64)
+        return self.move_code_indices[codes]
+
     def __len__(self) -> int:
         """Return the number of legal moves in the dataset."""
         return len(self.data)
@@ -9,3 +9,4 @@ class FileMetadata:
     size_gb: float
     id: int | None = None  # DB primary key
     processed: bool = False  # New field
+    games_consumed: int = 0  # Games already streamed into raw_games (resume point)
@@ -1,11 +1,30 @@
 from dataclasses import dataclass
 
+from packages.train.src.dataset.codecs.position_codec import (
+    move_code_to_san,
+    position_to_fen,
+)
+
 
 @dataclass
 class GameSnapshot:
     raw_game_id: int
     move_number: int
     turn: str  # 'w' for white, 'b' for black
-    move: str  # move in SAN notation
-    fen: str  # FEN string representation of the board
-    # Note: white_elo, black_elo, and result are stored in game_statistics table
+    move_code: int  # move played, see position_codec.encode_move
+    position: bytes  # board before the move, see position_codec.pack_board
+    # Copied from the game's statistics so training reads need no join
+    white_elo: int | None = None
+    black_elo: int | None = None
+    result: str | None = None
+    event_class: str | None = None  # Event tag without the tournament URL
+
+    @property
+    def fen(self) -> str:
+        """FEN string representation of the board, decoded on demand."""
+        return position_to_fen(self.position)
+
+    @property
+    def move(self) -> str:
+        """Move in SAN notation, decoded on demand."""
+        return move_code_to_san(self.position, self.move_code)
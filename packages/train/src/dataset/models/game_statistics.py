@@ -1,5 +1,19 @@
+import re
 from dataclasses import dataclass
 
+# Lichess appends the tournament/swiss URL to the Event tag of arena and swiss games
+_EVENT_URL = re.compile(r"\s+https?://\S+$")
+
+
+def event_class(event: str | None) -> str | None:
+    """Return the Event tag without its tournament URL.
+
+    e.g. "Rated Blitz tournament https://lichess.org/tournament/x" -> "Rated Blitz tournament"
+    """
+    if event is None:
+        return None
+    return _EVENT_URL.sub("", event)
+
 
 @dataclass
 class GameStatistics:
@@ -48,3 +62,8 @@ class GameStatistics:
 
     # Calculated fields
     total_moves: int | None = None
+
+    @property
+    def event_class(self) -> str | None:
+        """Event without its tournament URL, e.g. "Rated Blitz game"."""
+        return event_class(self.event)
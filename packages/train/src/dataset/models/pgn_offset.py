@@ -0,0 +1,23 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class PgnOffset:
+    """Location of one game in a local PGN archive, with its key headers.
+
+    For a plain .pgn file offset is the game's byte offset in the file. For a seekable
+    .pgn.zst the game lives in the zstd frame at frame_offset (frame_length compressed
+    bytes) and offset is relative to the decompressed frame.
+    """
+
+    archive: str  # Path of the indexed (or re-chunked) archive
+    game_index: int  # Position of the game in the archive, as RawGame.game_index
+    offset: int
+    length: int
+    frame_offset: int | None = None
+    frame_length: int | None = None
+    event: str | None = None
+    site: str | None = None
+    white_elo: int | None = None
+    black_elo: int | None = None
+    result: str | None = None
@@ -0,0 +1,18 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class ProcessedRange:
+    """Progress of fill_processed_snapshots over one range of snapshot ids.
+
+    The range covers the ids in (start_id, end_id]. Its snapshots are encoded in id
+    order, so every snapshot up to last_id is processed and the range resumes after it.
+    """
+
+    start_id: int
+    end_id: int
+    last_id: int
+
+    @property
+    def done(self) -> bool:
+        return self.last_id >= self.end_id
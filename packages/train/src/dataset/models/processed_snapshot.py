@@ -3,16 +3,18 @@ from dataclasses import dataclass
 import numpy as np
 import torch
 
+from packages.train.src.dataset.codecs.position_codec import bitboards_to_planes
+
 
 @dataclass
 class ProcessedSnapshot:
     """Model for a processed game snapshot with deserialized tensors."""
 
     snapshot_id: int
-    board: torch.Tensor  # Shape: (12, 8, 8)
+    bitboards: np.ndarray  # Shape: (12,) uint64 - one bitboard per piece type and color
     metadata: torch.Tensor  # Shape: (4,) - [white_elo_norm, black_elo_norm, turn_white, turn_black]
     chosen_move: int
-    valid_moves: torch.Tensor  # Shape: (num_legal_moves,)
+    valid_moves: torch.Tensor  # Shape: (k,) int64 - vocabulary indices of the k legal moves
 
     @classmethod
     def from_bytes(
@@ -24,16 +26,21 @@ class ProcessedSnapshot:
         valid_moves_bytes: bytes,
     ) -> "ProcessedSnapshot":
         """Create a ProcessedSnapshot from stored bytes."""
-        board = torch.from_numpy(
-            np.frombuffer(board_bytes, dtype=np.float32).reshape(12, 8, 8).copy()
-        )
+        bitboards = np.frombuffer(board_bytes, dtype="<u8")
         metadata = torch.from_numpy(np.frombuffer(metadata_bytes, dtype=np.float32).copy())
-        valid_moves = torch.from_numpy(np.frombuffer(valid_moves_bytes, dtype=np.float32).copy())
+        valid_moves = torch.from_numpy(
+            np.frombuffer(valid_moves_bytes, dtype="<u2").astype(np.int64)
+        )
 
         return cls(
             snapshot_id=snapshot_id,
-            board=board,
+            bitboards=bitboards,
             metadata=metadata,
             chosen_move=chosen_move,
             valid_moves=valid_moves,
         )
+
+    @property
+    def board(self) -> torch.Tensor:
+        """One-hot board planes of shape (12, 8, 8) expanded from the bitboards."""
+        return torch.from_numpy(bitboards_to_planes(self.bitboards))
@@ -7,3 +7,5 @@ class RawGame:
     file_id: int | None = None  # Foreign key to file_metadata
     pgn: str = ""
     processed: bool = False  # Tracks if snapshots have been generated
+    game_index: int | None = None  # Position of the game in its archive file
+    site: str | None = None  # Lichess URL of the game (Site tag), unique per game
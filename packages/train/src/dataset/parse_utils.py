@@ -0,0 +1,8 @@
+def parse_int(val: str | None) -> int | None:
+    """Convert a string to int, return None if conversion fails."""
+    if val is None:
+        return None
+    try:
+        return int(val)
+    except (TypeError, ValueError):
+        return None
@@ -14,13 +14,15 @@ def pipeline(
     Args:
         database_info: Dictionary containing database configuration including:
             - num_indexes: Target number of snapshots to process
-            - max_size_gb: Maximum size in GB for downloaded files
+            - max_size_gb: Maximum size in GB for downloaded files and for the database
     """
     print("Starting database population process...")
 
     # Fill snapshots and statistics (snapshots may be referenced by other tables)
     print("Filling game snapshots and statistics...")
-    fill_database_with_snapshots(snapshots_threshold=num_indexes, max_size_gb=max_size_gb)
+    fill_database_with_snapshots(
+        snapshots_threshold=num_indexes, max_size_gb=max_size_gb, max_db_size_gb=max_size_gb
+    )
 
     # Then fill legal moves
     print("Filling legal moves...")
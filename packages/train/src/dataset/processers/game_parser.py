@@ -0,0 +1,97 @@
+import re
+from dataclasses import dataclass, field
+from io import StringIO
+
+import chess
+import chess.pgn
+
+from packages.train.src.dataset.codecs.position_codec import encode_move, pack_board
+from packages.train.src.dataset.models.game_snapshot import GameSnapshot
+from packages.train.src.dataset.models.game_statistics import GameStatistics
+from packages.train.src.dataset.models.raw_game import RawGame
+from packages.train.src.dataset.processers.game_statistics import build_game_statistics
+
+# Comments carry Lichess' [%clk]/[%eval] annotations, which nothing downstream reads
+_COMMENT = re.compile(r"\{[^}]*\}")
+
+
+@dataclass
+class ParsedGame:
+    """Everything the pipeline extracts from one PGN game."""
+
+    statistics: GameStatistics | None
+    snapshots: list[GameSnapshot] = field(default_factory=list)
+
+
+class _SinglePassVisitor(chess.pgn.BaseVisitor[ParsedGame]):
+    """Collects headers and one snapshot per mainline move while the PGN is read.
+
+    Unlike chess.pgn.GameBuilder no game tree is built, variations are skipped by the
+    parser and comments are dropped as soon as they are read.
+    """
+
+    def __init__(self, raw_game_id: int | None):
+        self.raw_game_id = raw_game_id
+        self.headers = chess.pgn.Headers()
+        self.snapshots: list[GameSnapshot] = []
+
+    def begin_headers(self) -> chess.pgn.Headers:
+        return self.headers
+
+    def visit_header(self, tagname: str, tagvalue: str) -> None:
+        self.headers[tagname] = tagvalue
+
+    def begin_variation(self) -> chess.pgn.SkipType:
+        return chess.pgn.SKIP
+
+    def visit_move(self, board: chess.Board, move: chess.Move) -> None:
+        # board is the position before the move; the parser pushes it afterwards
+        self.snapshots.append(
+            GameSnapshot(
+                raw_game_id=self.raw_game_id if self.raw_game_id is not None else 0,
+                move_number=len(self.snapshots) + 1,
+                turn="w" if board.turn == chess.WHITE else "b",
+                move_code=encode_move(move),
+                position=pack_board(board),
+            )
+        )
+
+    def handle_error(self, error: Exception) -> None:
+        # Same leniency as GameBuilder: keep the moves parsed before the error
+        print(f"Warning: PGN error in raw_game_id={self.raw_game_id}: {error}")
+
+    def result(self) -> ParsedGame:
+        statistics = None
+        if self.raw_game_id:
+            statistics = build_game_statistics(
+                self.raw_game_id, self.headers, total_moves=len(self.snapshots)
+            )
+            event_class = statistics.event_class
+            for snapshot in self.snapshots:
+                snapshot.white_elo = statistics.white_elo
+                snapshot.black_elo = statistics.black_elo
+                snapshot.result = statistics.result
+                snapshot.event_class = event_class
+        return ParsedGame(statistics=statistics, snapshots=self.snapshots)
+
+
+def parse_raw_game(raw_game: RawGame) -> ParsedGame | None:
+    """Parse a RawGame once into its GameStatistics and GameSnapshots.
+
+    Args:
+        raw_game: RawGame object containing PGN string
+
+    Returns:
+        The parsed game (statistics is None for unsaved games), or None if the PGN
+        holds no game
+    """
+    pgn = _strip_comments(raw_game.pgn)
+    return chess.pgn.read_game(StringIO(pgn), Visitor=lambda: _SinglePassVisitor(raw_game.id))
+
+
+def _strip_comments(pgn: str) -> str:
+    """Remove {comments} from the movetext so the parser never tokenizes them."""
+    header_end = pgn.find("\n\n")
+    if header_end == -1 or "{" not in pgn:
+        return pgn
+    return pgn[:header_end] + _COMMENT.sub("", pgn[header_end:])
@@ -1,74 +1,73 @@
-from collections.abc import Callable, Iterator
-from io import StringIO
-
-import chess
-import chess.pgn
-
-from packages.train.src.constants import DEFAULT_BATCH_SIZE, DEFAULT_PRINT_INTERVAL
+import os
+from collections import deque
+from collections.abc import Callable, Generator, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+
+from packages.train.src.constants import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_PRINT_INTERVAL,
+    SNAPSHOT_CHUNK_SIZE,
+    SNAPSHOT_WORKERS,
+)
 from packages.train.src.dataset.models.game_snapshot import GameSnapshot
+from packages.train.src.dataset.models.game_statistics import GameStatistics
 from packages.train.src.dataset.models.raw_game import RawGame
-from packages.train.src.dataset.processers.game_statistics import extract_statistics_from_raw_game
-from packages.train.src.dataset.repositories.game_snapshots import (
-    count_snapshots,
-    save_snapshots_batch,
-)
-from packages.train.src.dataset.repositories.game_statistics import save_game_statistics
-from packages.train.src.dataset.repositories.raw_games import mark_raw_game_as_processed
+from packages.train.src.dataset.processers.game_parser import ParsedGame, parse_raw_game
+from packages.train.src.dataset.repositories.game_snapshots import count_snapshots
+from packages.train.src.dataset.repositories.ingest import save_ingest_chunk
 
 
 def raw_game_to_snapshots(raw_game: RawGame) -> Iterator[GameSnapshot]:
     """Convert a RawGame into GameSnapshot objects (one per move).
 
-    Note: white_elo, black_elo, and result are stored in game_statistics table.
+    Saved games (with an id) get their white_elo, black_elo, result and event class
+    copied onto every snapshot.
     """
-    pgn_io = StringIO(raw_game.pgn)
-    game = chess.pgn.read_game(pgn_io)
-    if game is None:
+    parsed = parse_raw_game(raw_game)
+    if parsed is None:
         return
+    yield from parsed.snapshots
 
-    board = game.board()
-    move_number = 1
-
-    for move in game.mainline_moves():
-        turn = "w" if board.turn == chess.WHITE else "b"
-        previous_board = board.copy()
-        san_move = board.san(move)
-        board.push(move)
 
-        fen = previous_board.fen()
+def _parse_chunk(games: list[RawGame]) -> list[ParsedGame | None]:
+    """Worker entry point: parse a chunk of games."""
+    return [parse_raw_game(game) for game in games]
 
-        yield GameSnapshot(
-            raw_game_id=raw_game.id if raw_game.id is not None else 0,
-            move_number=move_number,
-            turn=turn,
-            move=san_move,
-            fen=fen,
-        )
 
-        move_number += 1
+def _chunked(games: Iterator[RawGame], size: int) -> Iterator[list[RawGame]]:
+    iterator = iter(games)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
 
 
-def _safe_int(val: str | None) -> int | None:
-    """Convert a string to int, return None if conversion fails."""
-    if val is None:
-        return None
-    try:
-        return int(val)
-    except (TypeError, ValueError):
-        return None
+class SnapshotBatchProcessor:
+    """Processes raw games into snapshots with batching and progress tracking.
 
+    Results are written in chunks of batch_size games: the statistics, snapshots and
+    processed flags of a chunk are committed in one transaction, so an interrupted run
+    never leaves a game half-written.
 
-class SnapshotBatchProcessor:
-    """Processes raw games into snapshots with batching and progress tracking."""
+    With more than one worker, games are parsed in worker processes in chunks of
+    chunk_size games while this process stays the only database writer. Results are
+    written in input order, so the output is the same as with a single worker.
+    """
 
     def __init__(
         self,
         batch_size: int = DEFAULT_BATCH_SIZE,
         print_interval: int = DEFAULT_PRINT_INTERVAL,
+        workers: int = SNAPSHOT_WORKERS,
+        chunk_size: int = SNAPSHOT_CHUNK_SIZE,
     ):
         self.batch_size = batch_size
         self.print_interval = print_interval
-        self._batch: list[GameSnapshot] = []
+        self.workers = workers if workers > 0 else os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._pending_statistics: list[GameStatistics] = []
+        self._pending_snapshots: list[GameSnapshot] = []
+        self._pending_game_ids: list[int] = []
+        # Includes pending snapshots, so thresholds are checked against what will be written
         self._snapshot_count = count_snapshots()
         self._last_print_count = self._snapshot_count
 
@@ -77,53 +76,101 @@ class SnapshotBatchProcessor:
         games: Iterator[RawGame],
         should_stop: Callable[[], bool] | None = None,
         filter_game: Callable[[RawGame], bool] | None = None,
+        should_stop_after_batch: Callable[[], bool] | None = None,
     ) -> int:
         """Process games into snapshots and statistics, saving to database in batches.
 
         Args:
             games: Iterator of RawGame objects
-            should_stop: Optional callback to stop processing early
+            should_stop: Optional callback to stop processing early, checked before each game
             filter_game: Optional callback to filter games (return True to process)
+            should_stop_after_batch: Optional callback to stop processing early, checked
+                only after each committed batch, for checks too costly to run per game
 
         Returns:
             Number of games processed
         """
-        games_processed = 0
-
-        for game in games:
-            if should_stop and should_stop():
-                self._flush_batch()
-                break
+        if filter_game:
+            games = (game for game in games if filter_game(game))
 
-            if filter_game and not filter_game(game):
-                continue
+        parsed_games: Generator[tuple[RawGame, ParsedGame | None], None, None] = (
+            self._parse_in_workers(games)
+            if self.workers > 1
+            else ((game, parse_raw_game(game)) for game in games)
+        )
 
-            games_processed += 1
+        games_processed = 0
+        try:
+            while not (should_stop and should_stop()):
+                item = next(parsed_games, None)
+                if item is None:
+                    break
+                games_processed += 1
+                flushed = self._add_parsed_game(*item)
+                if flushed and should_stop_after_batch and should_stop_after_batch():
+                    break
+        finally:
+            parsed_games.close()
+            self._flush_batch()
 
-            # Extract and save game statistics
-            stats = extract_statistics_from_raw_game(game)
-            if stats:
-                save_game_statistics(stats)
+        return games_processed
 
-            # Process snapshots
-            for snapshot in raw_game_to_snapshots(game):
-                self._batch.append(snapshot)
-                if len(self._batch) >= self.batch_size:
-                    self._flush_batch()
+    def _add_parsed_game(self, game: RawGame, parsed: ParsedGame | None) -> bool:
+        """Queue one game's statistics, snapshots and processed flag for the next commit.
 
+        Returns:
+            True if the game completed a batch, which was committed
+        """
+        if parsed is None:
+            print(f"Warning: Failed to parse PGN for raw_game_id={game.id}")
+        else:
+            if parsed.statistics:
+                self._pending_statistics.append(parsed.statistics)
+            self._pending_snapshots.extend(parsed.snapshots)
+            self._snapshot_count += len(parsed.snapshots)
+
+        if game.id is not None:
+            self._pending_game_ids.append(game.id)
+        game.processed = True
+
+        if len(self._pending_game_ids) >= self.batch_size:
             self._flush_batch()
-            mark_raw_game_as_processed(game)
+            return True
+        return False
 
-        return games_processed
+    def _parse_in_workers(
+        self, games: Iterator[RawGame]
+    ) -> Generator[tuple[RawGame, ParsedGame | None], None, None]:
+        """Parse games in worker processes, yielding results in input order.
+
+        At most two chunks per worker are in flight, which bounds memory and limits
+        how far reading runs ahead of writing when the caller stops early.
+        """
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            in_flight: deque[tuple[list[RawGame], Future[list[ParsedGame | None]]]] = deque()
+            try:
+                for chunk in _chunked(games, self.chunk_size):
+                    in_flight.append((chunk, executor.submit(_parse_chunk, chunk)))
+                    if len(in_flight) >= 2 * self.workers:
+                        chunk, future = in_flight.popleft()
+                        yield from zip(chunk, future.result(), strict=True)
+
+                while in_flight:
+                    chunk, future = in_flight.popleft()
+                    yield from zip(chunk, future.result(), strict=True)
+            finally:
+                for _, future in in_flight:
+                    future.cancel()
 
     def _flush_batch(self) -> None:
-        """Save current batch to database and print progress updates."""
-        if not self._batch:
+        """Commit the pending chunk of games and print progress updates."""
+        if not self._pending_game_ids and not self._pending_snapshots:
             return
 
-        save_snapshots_batch(self._batch)
-        self._snapshot_count = count_snapshots()
-        self._batch = []
+        save_ingest_chunk(self._pending_statistics, self._pending_snapshots, self._pending_game_ids)
+        self._pending_statistics = []
+        self._pending_snapshots = []
+        self._pending_game_ids = []
 
         if (
             self._snapshot_count // self.print_interval
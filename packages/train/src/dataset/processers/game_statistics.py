@@ -1,10 +1,11 @@
-from collections.abc import Iterator
+from collections.abc import Iterator, Mapping
 from io import StringIO
 
 import chess.pgn
 
 from packages.train.src.dataset.models.game_statistics import GameStatistics
 from packages.train.src.dataset.models.raw_game import RawGame
+from packages.train.src.dataset.parse_utils import parse_int
 
 
 def extract_statistics_from_raw_game(raw_game: RawGame) -> GameStatistics | None:
@@ -26,25 +27,31 @@ def extract_statistics_from_raw_game(raw_game: RawGame) -> GameStatistics | None
         print(f"Warning: Failed to parse PGN for raw_game_id={raw_game.id}")
         return None
 
-    headers = game.headers
-
-    # Helper to safely get integer values
-    def safe_int(val: str | None) -> int | None:
-        if val is None:
-            return None
-        try:
-            return int(val)
-        except (TypeError, ValueError):
-            return None
-
     # Count total moves
     total_moves = 0
     for _ in game.mainline_moves():
         total_moves += 1
 
+    return build_game_statistics(raw_game.id, game.headers, total_moves)
+
+
+def build_game_statistics(
+    raw_game_id: int, headers: Mapping[str, str], total_moves: int
+) -> GameStatistics:
+    """Build GameStatistics from parsed PGN headers.
+
+    Args:
+        raw_game_id: ID of the raw game the headers belong to
+        headers: PGN tag pairs
+        total_moves: Number of mainline moves (plies) in the game
+
+    Returns:
+        GameStatistics object with every available header filled in
+    """
+
     # Extract all available headers
     stats = GameStatistics(
-        raw_game_id=raw_game.id,
+        raw_game_id=raw_game_id,
         # Standard Seven Tag Roster
         event=headers.get("Event"),
         site=headers.get("Site"),
@@ -54,10 +61,10 @@ def extract_statistics_from_raw_game(raw_game: RawGame) -> GameStatistics | None
         black=headers.get("Black"),
         result=headers.get("Result"),
         # Player ratings
-        white_elo=safe_int(headers.get("WhiteElo")),
-        black_elo=safe_int(headers.get("BlackElo")),
-        white_rating_diff=safe_int(headers.get("WhiteRatingDiff")),
-        black_rating_diff=safe_int(headers.get("BlackRatingDiff")),
+        white_elo=parse_int(headers.get("WhiteElo")),
+        black_elo=parse_int(headers.get("BlackElo")),
+        white_rating_diff=parse_int(headers.get("WhiteRatingDiff")),
+        black_rating_diff=parse_int(headers.get("BlackRatingDiff")),
         # Time control
         time_control=headers.get("TimeControl"),
         # Opening
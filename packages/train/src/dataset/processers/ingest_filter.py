@@ -0,0 +1,72 @@
+import re
+from dataclasses import dataclass
+
+from packages.train.src.constants import (
+    INGEST_MAX_ELO_GAP,
+    INGEST_TIME_CONTROLS,
+    INGEST_VARIANTS,
+    MAX_ELO,
+    MIN_ELO,
+)
+from packages.train.src.dataset.parse_utils import parse_int
+
+_HEADER_TAG = re.compile(r'^\[(\w+) "([^"]*)"\]', re.MULTILINE)
+_TIME_CONTROL_CLASS = re.compile(r"\b(UltraBullet|Bullet|Blitz|Rapid|Classical|Correspondence)\b")
+# Lichess omits the Variant tag for standard chess
+_DEFAULT_VARIANT = "Standard"
+
+
+@dataclass(frozen=True)
+class IngestFilter:
+    """Accepts or rejects a game from its PGN header block alone, without parsing moves.
+
+    Every criterion is optional: None (or an empty tuple) disables it.
+
+    Attributes:
+        min_elo: Minimum rating of both players
+        max_elo: Maximum rating of both players
+        max_elo_gap: Maximum rating difference between the players
+        time_controls: Accepted time-control classes, read from the Event tag
+            (e.g. "Rated Blitz game" -> "Blitz")
+        variants: Accepted values of the Variant tag
+    """
+
+    min_elo: int | None = MIN_ELO
+    max_elo: int | None = MAX_ELO
+    max_elo_gap: int | None = INGEST_MAX_ELO_GAP
+    time_controls: tuple[str, ...] = INGEST_TIME_CONTROLS
+    variants: tuple[str, ...] = INGEST_VARIANTS
+
+    def accepts(self, pgn: str) -> bool:
+        """Return True if the game's headers pass every enabled criterion."""
+        return self.accepts_headers(parse_headers(pgn))
+
+    def accepts_headers(self, headers: dict[str, str]) -> bool:
+        """Same as accepts, for headers already read with parse_headers."""
+        if self.variants and headers.get("Variant", _DEFAULT_VARIANT) not in self.variants:
+            return False
+
+        if self.time_controls:
+            match = _TIME_CONTROL_CLASS.search(headers.get("Event", ""))
+            if match is None or match.group(1) not in self.time_controls:
+                return False
+
+        if self.min_elo is None and self.max_elo is None and self.max_elo_gap is None:
+            return True
+
+        white_elo = parse_int(headers.get("WhiteElo"))
+        black_elo = parse_int(headers.get("BlackElo"))
+        if white_elo is None or black_elo is None:
+            return False
+        if self.min_elo is not None and min(white_elo, black_elo) < self.min_elo:
+            return False
+        if self.max_elo is not None and max(white_elo, black_elo) > self.max_elo:
+            return False
+        return self.max_elo_gap is None or abs(white_elo - black_elo) <= self.max_elo_gap
+
+
+def parse_headers(pgn: str) -> dict[str, str]:
+    """Read the tag pairs of a PGN game, stopping at the first blank line."""
+    header_end = pgn.find("\n\n")
+    header_block = pgn if header_end == -1 else pgn[:header_end]
+    return dict(_HEADER_TAG.findall(header_block))
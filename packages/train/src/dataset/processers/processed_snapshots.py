@@ -1,12 +1,41 @@
 """Processor for encoding game snapshots into tensors."""
 
+import struct
+from collections.abc import Sequence
+from dataclasses import dataclass
+
 import chess
 import numpy as np
 import torch
 
+from packages.train.src.dataset.codecs.position_codec import (
+    bitboards_to_planes,
+    encode_move,
+    unpack_board,
+    unpack_piece_bitboards,
+)
 from packages.train.src.dataset.loaders.legal_moves import LegalMovesDataset
 
 
+@dataclass
+class EncodedSnapshots:
+    """A batch of snapshots encoded for training, as contiguous arrays."""
+
+    snapshot_ids: np.ndarray  # (N,) int64
+    bitboards: np.ndarray  # (N, 12) uint64 piece bitboards, the stored board format
+    metadata: np.ndarray  # (N, 4) float32: normalized white/black ELO, turn one-hot
+    chosen_moves: np.ndarray  # (N,) int64 index in the legal move vocabulary
+    valid_moves: list[np.ndarray]  # N sorted uint16 arrays of legal move vocabulary indices
+
+    def __len__(self) -> int:
+        return len(self.snapshot_ids)
+
+    @property
+    def boards(self) -> np.ndarray:
+        """(N, 12, 8, 8) float32 planes, see ProcessedSnapshotsProcessor.board_to_tensor."""
+        return bitboards_to_planes(self.bitboards)
+
+
 class ProcessedSnapshotsProcessor:
     """Processes raw game snapshot data into encoded tensors for storage."""
 
@@ -29,43 +58,49 @@ class ProcessedSnapshotsProcessor:
         chess.QUEEN: 4,
     }
 
-    def __init__(self):
-        self.legal_moves = LegalMovesDataset()
+    # Precomputed from all of the data from 2013
+    ELO_MEAN = 1638.43153
+    ELO_STD = 185.80054702756055
+
+    def __init__(self, legal_moves: LegalMovesDataset | None = None):
+        self.legal_moves = legal_moves if legal_moves is not None else LegalMovesDataset()
 
     @staticmethod
     def fen_to_tensor(fen: str) -> torch.Tensor:
         """Convert FEN string to tensor representation.
 
-        Creates a 1d flattened tensor of a chess board where each tile represents
-        a piece type/color:
-        - Channels 0-5: White pieces (pawn, knight, bishop, rook, queen, king)
-        - Channels 6-11: Black pieces (pawn, knight, bishop, rook, queen, king)
-
         Args:
             fen: FEN string representation of board
 
         Returns:
-            Tensor of shape (8*8*12,)
+            Tensor of shape (12, 8, 8), see board_to_tensor
         """
-        board = chess.Board(fen)
-        tensor = np.zeros((12, 8, 8), dtype=np.float32)
+        return ProcessedSnapshotsProcessor.board_to_tensor(chess.Board(fen))
 
-        for square in chess.SQUARES:
-            piece = board.piece_at(square)
-            if piece:
-                rank = chess.square_rank(square)
-                file = chess.square_file(square)
-
-                # Get piece type index (0-5)
-                piece_idx = ProcessedSnapshotsProcessor.PIECE_TYPES[piece.piece_type]
+    @staticmethod
+    def board_to_tensor(board: chess.Board) -> torch.Tensor:
+        """Convert a board to tensor representation.
 
-                # Add 6 for black pieces
-                if not piece.color:  # Black
-                    piece_idx += 6
+        Creates a tensor of a chess board where each channel represents a piece
+        type/color:
+        - Channels 0-5: White pieces (pawn, knight, bishop, rook, queen, king)
+        - Channels 6-11: Black pieces (pawn, knight, bishop, rook, queen, king)
 
-                tensor[piece_idx, rank, file] = 1.0
+        Args:
+            board: Board to encode
 
-        return torch.from_numpy(tensor)
+        Returns:
+            Tensor of shape (12, 8, 8), indexed [channel, rank, file]
+        """
+        bitboards = np.array(
+            [
+                board.pieces_mask(piece_type, color)
+                for color in (chess.WHITE, chess.BLACK)
+                for piece_type in ProcessedSnapshotsProcessor.PIECE_TYPES
+            ],
+            dtype=np.uint64,
+        )
+        return torch.from_numpy(bitboards_to_planes(bitboards))
 
     @staticmethod
     def encode_result(result: str, turn: str) -> torch.Tensor:
@@ -115,71 +150,95 @@ class ProcessedSnapshotsProcessor:
         Returns:
             Normalized tensor (2,) [white_elo, black_elo]
         """
-
-        standard_deviation = 185.80054702756055
-        mean = 1638.43153
+        mean = ProcessedSnapshotsProcessor.ELO_MEAN
+        standard_deviation = ProcessedSnapshotsProcessor.ELO_STD
 
         black_z_norm = (black_elo - mean) / standard_deviation
         white_z_norm = (white_elo - mean) / standard_deviation
 
         return torch.tensor([white_z_norm, black_z_norm], dtype=torch.float32)
 
-    def _encode_move(self, fen: str, move_san: str) -> int:
-        """Encode move as indexes of start and end positions and promotion index.
+    def _encode_move(self, move: chess.Move) -> int:
+        """Encode move as its index in the legal_moves dataset.
 
         Args:
-            fen: FEN string of the position before the move
-            move_san: Move in SAN notation
+            move: Move played
 
         Returns:
-            - move: int index of move in legal_moves dataset
+            - move: int index of move in legal_moves dataset (0 if it is not in it)
         """
-        try:
-            board = chess.Board(fen)
-
-            # Parse SAN move to get UCI move to determine promotion
-            move = board.parse_san(move_san)
-            move_index = self.legal_moves.get_index_from_move(board.uci(move))
-
-            if move_index == -1:
-                return 0
-            return move_index
-
-        except (ValueError, AssertionError):
-            # If move parsing fails, return zeros
+        move_index = self.legal_moves.get_index_from_chess_move(move)
+        if move_index == -1:
             return 0
+        return move_index
 
-    def _encode_valid_moves(self, fen: str) -> torch.Tensor:
-        """Encode all legal moves for a given position."""
-        board = chess.Board(fen)
-
-        valid_moves = list(board.legal_moves)
-
-        moves_tensor = torch.zeros(len(self.legal_moves), dtype=torch.float32)
-
-        for move in valid_moves:
-            idx = self.legal_moves.get_index_from_move(board.uci(move))
-            if idx >= 0:
-                moves_tensor[idx] = 1.0
-
-        return moves_tensor
+    def process_snapshot_rows(self, rows: Sequence[tuple]) -> EncodedSnapshots:
+        """Encode a batch of game_snapshots rows.
 
-    def process_snapshot_row(
-        self, data: dict
-    ) -> tuple[torch.Tensor, torch.Tensor, int, torch.Tensor]:
-        """Encode a single row of data into tensors.
+        Each position is unpacked into a chess.Board once, only to generate its legal
+        moves; the bitboards, ELOs and turns are computed for the whole batch with
+        NumPy, and all move codes are mapped to vocabulary indices in one gather. Rows
+        that cannot be decoded are skipped with a warning.
 
         Args:
-            data: Dict with keys: fen, move, turn, white_elo, black_elo, result
+            rows: (id, position, move_code, turn, white_elo, black_elo, ...) tuples as
+                returned by iter_snapshots_batches (position and move_code as stored by
+                position_codec, a missing ELO counts as 0)
 
         Returns:
-            Tuple of (board, metadata, chosen_move, valid_moves)
+            The encoded rows, in input order
         """
-        chosen_move = self._encode_move(data["fen"], data["move"])
-        valid_moves = self._encode_valid_moves(data["fen"])
-        turn = self.encode_turn(data["turn"])
-        elos = self.normalize_elo(data["white_elo"], data["black_elo"])
-        board = self.fen_to_tensor(data["fen"])
-        metadata = torch.cat((elos, turn), 0)
-
-        return board, metadata, chosen_move, valid_moves
+        move_indices = self.legal_moves.move_code_indices
+        snapshot_ids: list[int] = []
+        positions: list[bytes] = []
+        move_codes: list[int] = []
+        turns: list[bool] = []
+        elos: list[tuple[int, int]] = []
+        legal_rows: list[int] = []
+        legal_codes: list[int] = []
+        for snapshot_id, position, move_code, turn, white_elo, black_elo, *_ in rows:
+            try:
+                if not 0 <= move_code < len(move_indices):
+                    raise ValueError(f"invalid move code {move_code}")
+                codes = [encode_move(move) for move in unpack_board(position).legal_moves]
+            except (TypeError, ValueError, struct.error) as e:
+                print(f"Warning: Failed to process snapshot {snapshot_id}: {e}")
+                continue
+
+            legal_rows.extend([len(snapshot_ids)] * len(codes))
+            legal_codes.extend(codes)
+            snapshot_ids.append(snapshot_id)
+            positions.append(position)
+            move_codes.append(move_code)
+            turns.append(turn == "w")
+            elos.append((white_elo or 0, black_elo or 0))
+
+        count = len(snapshot_ids)
+        metadata = np.empty((count, 4), dtype=np.float32)
+        elo_array = np.array(elos, dtype=np.float64).reshape(count, 2)
+        metadata[:, :2] = (elo_array - self.ELO_MEAN) / self.ELO_STD
+        is_white = np.array(turns, dtype=bool)
+        metadata[:, 2] = is_white
+        metadata[:, 3] = ~is_white
+
+        # Moves outside the vocabulary are encoded as 0, like _encode_move
+        chosen_moves = np.maximum(move_indices[np.array(move_codes, dtype=np.int64)], 0)
+
+        # Sparse legal moves: the sorted vocabulary indices of each row
+        legal_indices = move_indices[np.array(legal_codes, dtype=np.int64)]
+        in_vocabulary = legal_indices >= 0
+        legal_rows_array = np.array(legal_rows, dtype=np.int64)[in_vocabulary]
+        legal_indices = legal_indices[in_vocabulary]
+        order = np.lexsort((legal_indices, legal_rows_array))
+        legal_indices = legal_indices[order].astype(np.uint16)  # The vocabulary has 2104 moves
+        counts = np.bincount(legal_rows_array, minlength=count)
+        ends = np.cumsum(counts)
+        valid_moves = [legal_indices[end - n : end] for end, n in zip(ends, counts, strict=True)]
+
+        return EncodedSnapshots(
+            snapshot_ids=np.array(snapshot_ids, dtype=np.int64),
+            bitboards=unpack_piece_bitboards(positions),
+            metadata=metadata,
+            chosen_moves=chosen_moves,
+            valid_moves=valid_moves,
+        )
@@ -0,0 +1,102 @@
+"""Shared SQLite connections for the repositories.
+
+Repositories call ``get_connection(DB_FILE)`` instead of ``sqlite3.connect`` so a
+thread reuses one connection per database instead of reopening the file for every
+row. Connections are cached per thread and per process (a forked worker never reuses
+its parent's handle) and are configured with one of two pragma profiles:
+
+- ``"bulk"``: ingest settings (WAL, relaxed fsync, large page cache)
+- ``"read"``: training settings for read-mostly access (large mmap window)
+
+Use ``use_pragma_profile`` to switch the profile of every connection in the process.
+Any path sqlite3 accepts works, including ``":memory:"``; an in-memory database lives
+as long as its cached connection.
+"""
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+PRAGMA_PROFILES: dict[str, dict[str, str | int]] = {
+    "bulk": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -256 * 1024,  # KiB, i.e. 256 MiB
+        "mmap_size": 256 * 1024**2,
+        "temp_store": "MEMORY",
+    },
+    "read": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -64 * 1024,  # KiB, i.e. 64 MiB
+        "mmap_size": 4 * 1024**3,
+        "temp_store": "MEMORY",
+    },
+}
+DEFAULT_PRAGMA_PROFILE = "bulk"
+# Connections kept open per thread; older ones are closed (tests touch many databases)
+_MAX_CONNECTIONS_PER_THREAD = 8
+
+_local = threading.local()
+_profile = DEFAULT_PRAGMA_PROFILE
+
+
+def get_connection(path: str | Path) -> sqlite3.Connection:
+    """Return this thread's connection to the database at path, opening it if needed.
+
+    The connection is shared: use ``with conn:`` for transactions and never close it.
+    """
+    key = str(path)
+    connections = _thread_connections()
+    entry = connections.get(key)
+    if entry is None:
+        conn = sqlite3.connect(key)
+        _apply_pragmas(conn, _profile)
+        connections[key] = (conn, _profile)
+        if len(connections) > _MAX_CONNECTIONS_PER_THREAD:
+            _, (oldest, _) = connections.popitem(last=False)
+            oldest.close()
+        return conn
+
+    conn, profile = entry
+    connections.move_to_end(key)
+    if profile != _profile:
+        # The profile was switched after this connection was opened
+        _apply_pragmas(conn, _profile)
+        connections[key] = (conn, _profile)
+    return conn
+
+
+def use_pragma_profile(profile: str) -> None:
+    """Switch the pragma profile of every connection in this process.
+
+    Open connections pick up the new profile the next time they are requested.
+    """
+    global _profile
+    if profile not in PRAGMA_PROFILES:
+        raise ValueError(f"Unknown pragma profile: {profile!r}")
+    _profile = profile
+
+
+def close_connections() -> None:
+    """Close every connection cached by the calling thread."""
+    connections = _thread_connections()
+    for conn, _ in connections.values():
+        conn.close()
+    connections.clear()
+
+
+def _thread_connections() -> "OrderedDict[str, tuple[sqlite3.Connection, str]]":
+    if getattr(_local, "pid", None) != os.getpid():
+        # Fresh thread, or a process forked from one that had open connections
+        _local.pid = os.getpid()
+        _local.connections = OrderedDict()
+    connections: OrderedDict[str, tuple[sqlite3.Connection, str]] = _local.connections
+    return connections
+
+
+def _apply_pragmas(conn: sqlite3.Connection, profile: str) -> None:
+    for name, value in PRAGMA_PROFILES[profile].items():
+        conn.execute(f"PRAGMA {name} = {value}")
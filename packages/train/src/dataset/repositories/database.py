@@ -1,35 +1,231 @@
+"""Database creation and schema migrations.
+
+The 'schema_version' table holds the number of entries of MIGRATIONS applied to the
+database. Migrations run in order and are never edited once released: schema changes
+(new tables, indexes, columns or storage formats) are appended as new migrations, so
+existing databases are upgraded in place.
+
+New databases use incremental auto-vacuum, so pages freed by dropping processed PGN
+text are returned to the file system by reclaim_free_pages without a full VACUUM.
+Existing databases keep their mode, as changing it rewrites the whole file; the
+migration prints how to convert one. over_size_budget enforces the configured size
+limit on the database file.
+"""
+
 import sqlite3
 from collections.abc import Callable
 
 from packages.train.src.constants import DB_FILE
-from packages.train.src.dataset.repositories.files_metadata import create_files_metadata_table
-from packages.train.src.dataset.repositories.game_snapshots import create_game_snapshots_table
+from packages.train.src.dataset.repositories.connection import get_connection
+from packages.train.src.dataset.repositories.files_metadata import (
+    add_games_consumed_column,
+    create_files_metadata_table,
+)
+from packages.train.src.dataset.repositories.game_snapshots import (
+    add_statistics_columns,
+    create_game_snapshots_table,
+    pack_snapshot_columns,
+)
 from packages.train.src.dataset.repositories.game_statistics import create_game_statistics_table
+from packages.train.src.dataset.repositories.http_validators import (
+    create_http_validators_table,
+)
+from packages.train.src.dataset.repositories.indexes import (
+    create_dropped_indexes_table,
+    rebuild_dropped_indexes,
+)
 from packages.train.src.dataset.repositories.legal_move import create_legal_moves_table
+from packages.train.src.dataset.repositories.pgn_offsets import create_pgn_offsets_table
+from packages.train.src.dataset.repositories.processed_ranges import create_processed_ranges_table
 from packages.train.src.dataset.repositories.processed_snapshots import (
     create_processed_snapshots_table,
+    pack_processed_boards,
+    pack_valid_moves,
+)
+from packages.train.src.dataset.repositories.raw_games import (
+    add_game_index_column,
+    add_site_column,
+    create_pgn_dictionary_table,
+    create_raw_games_table,
+    drop_processed_pgn,
 )
-from packages.train.src.dataset.repositories.raw_games import create_raw_games_table
 
 # List of functions that create tables in the database
-TABLE_CREATORS: list[Callable[[], None]] = [
+TABLE_CREATORS: list[Callable[[str], None]] = [
     create_files_metadata_table,
     create_raw_games_table,
     create_game_snapshots_table,
     create_game_statistics_table,
     create_legal_moves_table,
     create_processed_snapshots_table,
+    create_http_validators_table,
+]
+
+
+_VERSION_TABLE_NAME = "schema_version"
+_AUTO_VACUUM_INCREMENTAL = 2
+# Ingest stops this far below the budget: the pending batch and index rebuilds add to it
+_SIZE_BUDGET_HEADROOM = 0.05
+
+
+def _create_tables(db_path: str) -> None:
+    """Migration 1: the tables as they existed before schema versioning."""
+    for table_creator in TABLE_CREATORS:
+        table_creator(db_path)
+
+
+def _use_incremental_vacuum(db_path: str) -> None:
+    """Make a database without tables use incremental auto-vacuum.
+
+    Once the connection has switched the file to WAL the mode only changes with a
+    VACUUM, which costs nothing while the database is still empty.
+    """
+    conn = get_connection(db_path)
+    conn.commit()
+    if conn.execute("SELECT 1 FROM sqlite_master").fetchone() is None:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+
+
+def _report_auto_vacuum(db_path: str) -> None:
+    """Migration: explain how to switch an existing database to incremental auto-vacuum.
+
+    Its mode only changes with a VACUUM, which rewrites the whole file and needs about
+    as much free disk again, so it is left to the user. Until then free pages are
+    reused by new rows but never returned to the file system.
+    """
+    conn = get_connection(db_path)
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != _AUTO_VACUUM_INCREMENTAL:
+        print(
+            f"Note: {db_path} does not use incremental auto-vacuum, so dropped PGN text "
+            "never shrinks the file. To convert it (rewrites the whole file), run:\n"
+            f"  sqlite3 {db_path} 'PRAGMA auto_vacuum = INCREMENTAL; VACUUM;'"
+        )
+
+
+def _seed_row_counts(db_path: str) -> None:
+    """Migration: seed the row counters of tables created before their creators did.
+
+    The creators are idempotent; on an existing table they only add what is missing.
+    """
+    create_game_snapshots_table(db_path)
+    create_processed_snapshots_table(db_path)
+
+
+# Ordered schema migrations, each run against the path of the database being migrated;
+# the schema version is the number of migrations applied
+MIGRATIONS: list[Callable[[str], None]] = [
+    _create_tables,
+    add_statistics_columns,
+    pack_snapshot_columns,
+    add_game_index_column,
+    _report_auto_vacuum,
+    create_pgn_dictionary_table,
+    create_pgn_offsets_table,
+    add_site_column,
+    pack_processed_boards,
+    pack_valid_moves,
+    create_processed_ranges_table,
+    _seed_row_counts,
+    add_games_consumed_column,
 ]
+SCHEMA_VERSION = len(MIGRATIONS)
 
 
 def initialize_database() -> None:
     """
-    Creates the SQLite database and the tables if they don't exist.
+    Creates the SQLite database if needed and migrates its schema to SCHEMA_VERSION.
+
+    When the schema is current this is a single read of schema_version. Indexes left
+    dropped by an interrupted bulk ingest are rebuilt.
+
+    Raises:
+        RuntimeError: If the database was written by a newer schema version
     """
-    # Connecting ensures the file exists
-    with sqlite3.connect(DB_FILE):
-        pass
+    db_path = DB_FILE
+    version, has_dropped_indexes = get_schema_state(db_path)
+    if version == SCHEMA_VERSION and not has_dropped_indexes:
+        return
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema version {version} is newer than the supported "
+            f"version {SCHEMA_VERSION}"
+        )
 
-    # Initialize tables
-    for table_creator in TABLE_CREATORS:
-        table_creator()
+    if version == 0:
+        _use_incremental_vacuum(db_path)
+    for number in range(version + 1, SCHEMA_VERSION + 1):
+        print(f"Migrating database schema to version {number}...")
+        MIGRATIONS[number - 1](db_path)
+        _set_schema_version(db_path, number)
+
+    if has_dropped_indexes:
+        print("Rebuilding indexes dropped by an interrupted ingest...")
+        with get_connection(db_path) as conn:
+            rebuild_dropped_indexes(conn.cursor())
+
+
+def get_schema_state(db_path: str) -> tuple[int, bool]:
+    """Return the schema version and whether indexes are waiting to be rebuilt.
+
+    Databases created before schema versioning (or not at all) are at version 0.
+    """
+    conn = get_connection(db_path)
+    try:
+        row = conn.execute(
+            f"SELECT version, EXISTS (SELECT 1 FROM dropped_indexes) FROM {_VERSION_TABLE_NAME}"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        # No schema_version table yet
+        return 0, False
+    if row is None:
+        return 0, False
+    return row[0], bool(row[1])
+
+
+def _set_schema_version(db_path: str, version: int) -> None:
+    with get_connection(db_path) as conn:
+        c = conn.cursor()
+        c.execute(f"CREATE TABLE IF NOT EXISTS {_VERSION_TABLE_NAME} (version INTEGER NOT NULL)")
+        create_dropped_indexes_table(c)
+        c.execute(f"DELETE FROM {_VERSION_TABLE_NAME}")
+        c.execute(f"INSERT INTO {_VERSION_TABLE_NAME} (version) VALUES (?)", (version,))
+
+
+def database_size_gb() -> float:
+    """Return the size of the database file in GB (without its write-ahead log)."""
+    conn = get_connection(DB_FILE)
+    page_count: int = conn.execute("PRAGMA page_count").fetchone()[0]
+    page_size: int = conn.execute("PRAGMA page_size").fetchone()[0]
+    return page_count * page_size / 1024**3
+
+
+def reclaim_free_pages() -> int:
+    """Return the database's free pages to the file system.
+
+    Returns:
+        Number of pages released
+    """
+    conn = get_connection(DB_FILE)
+    conn.commit()
+    free_pages: int = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if free_pages:
+        conn.execute("PRAGMA incremental_vacuum").fetchall()
+    return free_pages
+
+
+def over_size_budget(max_size_gb: float) -> bool:
+    """Return True if the database is too close to max_size_gb to keep ingesting.
+
+    Below the budget this is two pragma reads. Near it, the PGN of processed games is
+    dropped and free pages are released before giving up.
+    """
+    limit = max_size_gb * (1 - _SIZE_BUDGET_HEADROOM)
+    if database_size_gb() < limit:
+        return False
+
+    dropped = drop_processed_pgn()
+    if dropped:
+        print(f"Dropped the PGN of {dropped} processed games.")
+    reclaim_free_pages()
+    return database_size_gb() >= limit
@@ -1,7 +1,7 @@
-import sqlite3
 from pathlib import Path
 
 from packages.train.src.constants import DB_FILE
+from packages.train.src.dataset.repositories.connection import get_connection
 
 
 def is_database_initialized() -> bool:
@@ -9,14 +9,9 @@ def is_database_initialized() -> bool:
     if not Path(DB_FILE).exists():
         return False
 
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_connection(DB_FILE)
     cursor = conn.cursor()
-    try:
-        # Check if 'files_metadata' table exists
-        cursor.execute(
-            "SELECT name FROM sqlite_master WHERE type='table' AND name='files_metadata';"
-        )
-        table_exists = cursor.fetchone() is not None
-    finally:
-        conn.close()
+    # Check if 'files_metadata' table exists
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='files_metadata';")
+    table_exists = cursor.fetchone() is not None
     return table_exists
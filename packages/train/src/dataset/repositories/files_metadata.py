@@ -3,6 +3,7 @@ from collections.abc import Iterable, Iterator
 
 from packages.train.src.constants import DB_FILE
 from packages.train.src.dataset.models.file_metadata import FileMetadata
+from packages.train.src.dataset.repositories.connection import get_connection
 from packages.train.src.dataset.repositories.db_utils import is_database_initialized
 
 _TABLE_NAME: str = "files_metadata"
@@ -20,8 +21,13 @@ def ensure_metadata_exists() -> None:
         print("File metadata already exists.")
 
 
-def create_files_metadata_table():
-    with sqlite3.connect(DB_FILE) as conn:
+def create_files_metadata_table(db_path: str):
+    """Create the 'files_metadata' table if it does not exist.
+
+    This is the table as of schema version 1; add_games_consumed_column adds the
+    ingestion cursor of each file.
+    """
+    with get_connection(db_path) as conn:
         cursor = conn.cursor()
         cursor.execute(
             f"""
@@ -38,71 +44,115 @@ def create_files_metadata_table():
         conn.commit()
 
 
+def add_games_consumed_column(db_path: str):
+    """Schema migration: add the 'games_consumed' column.
+
+    It counts the games of a file already stored, so an interrupted download resumes
+    after them (see set_file_progress). Existing rows start at 0.
+    """
+    with get_connection(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"PRAGMA table_info({_TABLE_NAME})")
+        if "games_consumed" not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {_TABLE_NAME} ADD COLUMN games_consumed INTEGER DEFAULT 0")
+
+
 def files_metadata_exist() -> bool:
     """Check if files_metadata table has any rows."""
     if not is_database_initialized():
         return False
 
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_connection(DB_FILE)
     cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT 1 FROM files_metadata LIMIT 1;")
-        has_rows = cursor.fetchone() is not None
-    finally:
-        conn.close()
+    cursor.execute("SELECT 1 FROM files_metadata LIMIT 1;")
+    has_rows = cursor.fetchone() is not None
     return has_rows
 
 
+_UPSERT_SQL = f"""
+    INSERT INTO {_TABLE_NAME} (url, filename, games, size_gb, processed)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(url) DO UPDATE SET games = excluded.games, size_gb = excluded.size_gb
+"""
+
+
 def save_file_metadata(file: FileMetadata) -> None:
-    """Save FileMetadata to database (skips duplicates by URL)."""
-    with sqlite3.connect(DB_FILE) as conn:
-        cursor = conn.cursor()
-        cursor.execute(f"SELECT id FROM {_TABLE_NAME} WHERE url = ?", (file.url,))
-        row = cursor.fetchone()
-        if row:
-            file.id = row[0]
-            return
+    """Save FileMetadata to database (keeps the existing row and id for a known URL)."""
+    save_files_metadata([file])
 
-        cursor.execute(
-            f"""
-            INSERT INTO {_TABLE_NAME} (url, filename, games, size_gb, processed)
-            VALUES (?, ?, ?, ?, ?)
-            """,
-            (file.url, file.filename, file.games, file.size_gb, int(file.processed)),
+
+def save_files_metadata(files: Iterable[FileMetadata]) -> None:
+    """Upsert multiple FileMetadata objects in a single transaction.
+
+    Rows are matched by URL: known files keep their id and processing state, only the
+    game count and size are refreshed. Each object's ``id`` is set afterwards.
+    """
+    files = list(files)
+    if not files:
+        return
+
+    with get_connection(DB_FILE) as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            _UPSERT_SQL,
+            [(f.url, f.filename, f.games, f.size_gb, int(f.processed)) for f in files],
         )
-        file.id = cursor.lastrowid
+        cursor.execute(f"SELECT url, id FROM {_TABLE_NAME}")
+        ids = dict(cursor.fetchall())
         conn.commit()
 
-
-def save_files_metadata(files: Iterable[FileMetadata]) -> None:
-    """Save multiple FileMetadata objects to database."""
     for file in files:
-        save_file_metadata(file)
+        file.id = ids[file.url]
+
+
+def update_files_games(counts: dict[str, int]) -> None:
+    """Refresh the game counts of known files from a filename -> games mapping."""
+    with get_connection(DB_FILE) as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            f"UPDATE {_TABLE_NAME} SET games = ? WHERE filename = ? AND games != ?",
+            [(games, filename, games) for filename, games in counts.items()],
+        )
+        conn.commit()
 
 
 def mark_file_as_processed(file: FileMetadata) -> None:
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_connection(DB_FILE) as conn:
         cursor = conn.cursor()
         cursor.execute(f"UPDATE {_TABLE_NAME} SET processed = 1 WHERE url = ?", (file.url,))
         file.processed = True
         conn.commit()
 
 
+def set_file_progress(cursor: sqlite3.Cursor, file: FileMetadata, games_consumed: int) -> None:
+    """Record a file's ingestion cursor using the caller's transaction.
+
+    Committing it together with the games it covers keeps the two consistent, so an
+    ingest killed at any point resumes exactly after the last stored game.
+    """
+    cursor.execute(
+        f"UPDATE {_TABLE_NAME} SET games_consumed = ? WHERE url = ?",
+        (games_consumed, file.url),
+    )
+
+
 def fetch_all_files_metadata() -> Iterator[FileMetadata]:
     """Fetch all FileMetadata from database."""
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_connection(DB_FILE) as conn:
         cursor = conn.cursor()
-        cursor.execute(f"SELECT id, url, filename, games, size_gb, processed FROM {_TABLE_NAME}")
+        cursor.execute(
+            f"SELECT id, url, filename, games, size_gb, processed, games_consumed FROM {_TABLE_NAME}"
+        )
         for row in cursor:
             yield _row_to_file_metadata(row)
 
 
 def fetch_files_metadata_under_size(max_gb: float) -> Iterator[FileMetadata]:
     """Fetch FileMetadata for files smaller than max_gb."""
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_connection(DB_FILE) as conn:
         cursor = conn.cursor()
         cursor.execute(
-            f"SELECT id, url, filename, games, size_gb, processed FROM {_TABLE_NAME} WHERE size_gb < ?",
+            f"SELECT id, url, filename, games, size_gb, processed, games_consumed FROM {_TABLE_NAME} WHERE size_gb < ?",
             (max_gb,),
         )
         for row in cursor:
@@ -111,10 +161,10 @@ def fetch_files_metadata_under_size(max_gb: float) -> Iterator[FileMetadata]:
 
 def fetch_file_metadata_by_filename(filename: str) -> FileMetadata | None:
     """Fetch FileMetadata by filename (returns None if not found)."""
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_connection(DB_FILE) as conn:
         cursor = conn.cursor()
         cursor.execute(
-            f"SELECT id, url, filename, games, size_gb, processed FROM {_TABLE_NAME} WHERE filename = ?",
+            f"SELECT id, url, filename, games, size_gb, processed, games_consumed FROM {_TABLE_NAME} WHERE filename = ?",
             (filename,),
         )
         row = cursor.fetchone()
@@ -131,4 +181,5 @@ def _row_to_file_metadata(row: tuple) -> FileMetadata:
         games=row[3],
         size_gb=row[4],
         processed=bool(row[5]),  # Convert 0/1 to boolean
+        games_consumed=row[6] or 0,
     )
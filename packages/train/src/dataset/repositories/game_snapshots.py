@@ -1,19 +1,44 @@
 import sqlite3
-from collections.abc import Iterable
+from collections.abc import Iterable, Iterator
 
-from packages.train.src.constants import DB_FILE
+from packages.train.src.constants import DB_FILE, DEFAULT_BATCH_SIZE
+from packages.train.src.dataset.codecs.position_codec import (
+    fen_to_position,
+    san_to_move_code,
+)
 from packages.train.src.dataset.models.game_snapshot import GameSnapshot
+from packages.train.src.dataset.models.game_statistics import event_class
+from packages.train.src.dataset.repositories.connection import get_connection
+from packages.train.src.dataset.repositories.indexes import Index, create_indexes
+from packages.train.src.dataset.repositories.row_counts import (
+    add_to_row_count,
+    create_row_counts_table,
+    get_row_count,
+    seed_row_count,
+)
 
 _TABLE_NAME = "game_snapshots"
+# Copied from game_statistics so training reads are range scans over one table
+_STATISTICS_COLUMNS = {
+    "white_elo": "INTEGER",
+    "black_elo": "INTEGER",
+    "result": "TEXT",
+    "event_class": "TEXT",
+}
+_MAX_ROWID = 2**63 - 1
+GAME_SNAPSHOTS_INDEXES = [
+    Index("idx_game_snapshots_raw_game_id", _TABLE_NAME, "raw_game_id"),
+]
 
 
-def create_game_snapshots_table():
+def create_game_snapshots_table(db_path: str):
     """Create the 'game_snapshots' table if it does not exist.
 
-    Note: white_elo, black_elo, and result are stored in game_statistics table.
-    Join with game_statistics using raw_game_id to get this data.
+    This is the table as of schema version 1; add_statistics_columns adds the
+    denormalised game statistics columns and pack_snapshot_columns replaces the fen
+    and SAN move columns with their binary encodings.
     """
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_connection(db_path)
     c = conn.cursor()
 
     c.execute(
@@ -29,48 +54,134 @@ def create_game_snapshots_table():
     )
     """
     )
+    create_row_counts_table(c)
+    seed_row_count(c, _TABLE_NAME)
+    create_indexes(c, GAME_SNAPSHOTS_INDEXES)
     conn.commit()
-    conn.close()
 
 
-def game_snapshots_table_exists() -> bool:
-    """Return True if the table exists."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    try:
+def add_statistics_columns(db_path: str):
+    """Schema migration: copy white_elo, black_elo, result and event class inline.
+
+    Adds the columns and backfills them from game_statistics in one transaction.
+    Snapshots without statistics keep NULLs and are skipped by the batch readers,
+    as they were by the former join.
+    """
+    with get_connection(db_path) as conn:
+        c = conn.cursor()
+        c.execute(f"PRAGMA table_info({_TABLE_NAME})")
+        columns = {row[1] for row in c.fetchall()}
+        for name, sql_type in _STATISTICS_COLUMNS.items():
+            if name not in columns:
+                c.execute(f"ALTER TABLE {_TABLE_NAME} ADD COLUMN {name} {sql_type}")
+
+        conn.create_function("event_class", 1, event_class, deterministic=True)
+        c.execute(
+            f"""
+            UPDATE {_TABLE_NAME}
+            SET white_elo = gst.white_elo,
+                black_elo = gst.black_elo,
+                result = gst.result,
+                event_class = event_class(gst.event)
+            FROM game_statistics gst
+            WHERE {_TABLE_NAME}.raw_game_id = gst.raw_game_id
+            """
+        )
+
+
+def pack_snapshot_columns(db_path: str):
+    """Schema migration: store positions and moves in the compact binary format.
+
+    Adds the 'position' BLOB and 'move_code' INTEGER columns, converts the fen and SAN
+    move of every existing row (see codecs.position_codec) and drops the text
+    columns, all in one transaction. The freed pages stay in the file until the
+    database is vacuumed.
+
+    Raises:
+        RuntimeError: If a fen or move cannot be converted; the text columns are kept
+    """
+    with get_connection(db_path) as conn:
+        c = conn.cursor()
+        c.execute(f"PRAGMA table_info({_TABLE_NAME})")
+        columns = {row[1] for row in c.fetchall()}
+        if "position" not in columns:
+            c.execute(f"ALTER TABLE {_TABLE_NAME} ADD COLUMN position BLOB")
+        if "move_code" not in columns:
+            c.execute(f"ALTER TABLE {_TABLE_NAME} ADD COLUMN move_code INTEGER")
+        if "fen" not in columns:
+            return
+
+        conn.create_function("fen_to_position", 1, _or_none(fen_to_position), deterministic=True)
+        conn.create_function("san_to_move_code", 2, _or_none(san_to_move_code), deterministic=True)
         c.execute(
             f"""
-        SELECT name FROM sqlite_master WHERE type='table' AND name='{_TABLE_NAME}';
-        """
+            UPDATE {_TABLE_NAME}
+            SET position = fen_to_position(fen),
+                move_code = san_to_move_code(fen, move)
+            """
+        )
+        c.execute(
+            f"""
+            SELECT COUNT(*) FROM {_TABLE_NAME}
+            WHERE (position IS NULL AND fen IS NOT NULL)
+               OR (move_code IS NULL AND move IS NOT NULL)
+            """
         )
-        exists = c.fetchone() is not None
-    finally:
-        conn.close()
+        unconverted = c.fetchone()[0]
+        if unconverted:
+            raise RuntimeError(
+                f"{unconverted} {_TABLE_NAME} rows have a fen or move that cannot be "
+                "converted; fix or delete them before migrating"
+            )
+        c.execute(f"ALTER TABLE {_TABLE_NAME} DROP COLUMN fen")
+        c.execute(f"ALTER TABLE {_TABLE_NAME} DROP COLUMN move")
+
+
+def _or_none(convert):
+    """Wrap a converter for use in SQL so that malformed values become NULL."""
+
+    def wrapper(*args):
+        if None in args:
+            return None
+        try:
+            return convert(*args)
+        except (TypeError, ValueError):
+            return None
+
+    return wrapper
+
+
+def game_snapshots_table_exists() -> bool:
+    """Return True if the table exists."""
+    conn = get_connection(DB_FILE)
+    c = conn.cursor()
+    c.execute(
+        f"""
+    SELECT name FROM sqlite_master WHERE type='table' AND name='{_TABLE_NAME}';
+    """
+    )
+    exists = c.fetchone() is not None
     return exists
 
 
 def save_snapshot(snapshot: GameSnapshot):
     """Insert a single GameSnapshot."""
-    with sqlite3.connect(DB_FILE, isolation_level=None) as conn:
+    with get_connection(DB_FILE) as conn:
         c = conn.cursor()
 
         # Insert
         c.execute(
             f"""
         INSERT INTO {_TABLE_NAME} (
-            raw_game_id, move_number, turn, move, fen
+            raw_game_id, move_number, turn, move_code, position,
+            white_elo, black_elo, result, event_class
         ) VALUES (
-            ?, ?, ?, ?, ?
+            ?, ?, ?, ?, ?, ?, ?, ?, ?
         )
         """,
-            (
-                snapshot.raw_game_id,
-                snapshot.move_number,
-                snapshot.turn,
-                snapshot.move,
-                snapshot.fen,
-            ),
+            _snapshot_to_row(snapshot),
         )
+        add_to_row_count(c, _TABLE_NAME, 1)
 
 
 def save_snapshots(snapshots: Iterable[GameSnapshot]):
@@ -86,79 +197,155 @@ def save_snapshots_batch(snapshots: list[GameSnapshot]):
     if not snapshots:
         return
 
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_connection(DB_FILE) as conn:
         c = conn.cursor()
+        insert_snapshots(c, snapshots)
+        conn.commit()
 
-        # Prepare data for batch insert
-        data = [
-            (
-                snapshot.raw_game_id,
-                snapshot.move_number,
-                snapshot.turn,
-                snapshot.move,
-                snapshot.fen,
-            )
-            for snapshot in snapshots
-        ]
 
-        # Batch insert all snapshots
-        c.executemany(
-            f"""
-            INSERT INTO {_TABLE_NAME} (
-                raw_game_id, move_number, turn, move, fen
-            ) VALUES (?, ?, ?, ?, ?)
-            """,
-            data,
-        )
-        conn.commit()
+def insert_snapshots(cursor: sqlite3.Cursor, snapshots: list[GameSnapshot]) -> None:
+    """Insert snapshots and update their row counter using the caller's transaction."""
+    if not snapshots:
+        return
+
+    # Prepare data for batch insert
+    data = [_snapshot_to_row(snapshot) for snapshot in snapshots]
+
+    # Batch insert all snapshots
+    cursor.executemany(
+        f"""
+        INSERT INTO {_TABLE_NAME} (
+            raw_game_id, move_number, turn, move_code, position,
+            white_elo, black_elo, result, event_class
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        data,
+    )
+    add_to_row_count(cursor, _TABLE_NAME, len(data))
 
 
 def count_snapshots() -> int:
-    """Return the total number of snapshots currently in the database."""
-    conn = sqlite3.connect(DB_FILE)
+    """Return the total number of snapshots currently in the database (O(1))."""
+    conn = get_connection(DB_FILE)
     c = conn.cursor()
-    try:
-        c.execute("SELECT COUNT(*) FROM game_snapshots")
-        result = c.fetchone()
-        count = result[0] if result else 0
-    finally:
-        conn.close()
+    count = get_row_count(c, _TABLE_NAME)
     return count
 
 
-def get_snapshots_batch(offset: int, batch_size: int) -> list[tuple]:
-    """Fetch a batch of snapshots joined with game statistics."""
-    with sqlite3.connect(DB_FILE) as conn:
+def get_snapshots_batch(after_id: int, batch_size: int, max_id: int = _MAX_ROWID) -> list[tuple]:
+    """Fetch the next batch of snapshots with their game statistics.
+
+    Uses keyset pagination: the query seeks straight to the first snapshot id after
+    after_id instead of skipping rows like LIMIT/OFFSET would. The statistics are
+    stored inline, so a batch is a range scan over game_snapshots alone.
+
+    Args:
+        after_id: Snapshot id the previous batch ended at (0 to start from the beginning)
+        batch_size: Number of rows to fetch
+        max_id: Largest snapshot id to fetch
+
+    Returns:
+        List of tuples: (id, position, move_code, turn, white_elo, black_elo, result), ordered by id
+    """
+    with get_connection(DB_FILE) as conn:
         c = conn.cursor()
         c.execute(
             """
             SELECT
-                gs.id,
-                gs.fen,
-                gs.move,
-                gs.turn,
-                gst.white_elo,
-                gst.black_elo,
-                gst.result
+                id,
+                position,
+                move_code,
+                turn,
+                white_elo,
+                black_elo,
+                result
             FROM
-                game_snapshots gs
-            JOIN
-                game_statistics gst ON gs.raw_game_id = gst.raw_game_id
+                game_snapshots
+            WHERE
+                id > ? AND id <= ? AND result IS NOT NULL
             ORDER BY
-                gs.id
-            LIMIT ? OFFSET ?
+                id
+            LIMIT ?
             """,
-            (batch_size, offset),
+            (after_id, max_id, batch_size),
         )
         return c.fetchall()
 
 
+def iter_snapshots_batches(
+    after_id: int = 0, batch_size: int = DEFAULT_BATCH_SIZE, max_id: int = _MAX_ROWID
+) -> Iterator[list[tuple]]:
+    """Yield batches of snapshots with their game statistics, in id order.
+
+    Each batch resumes after the last id of the previous one, so reading the whole
+    table costs one index seek per batch. No read cursor is held open between batches.
+
+    Args:
+        after_id: Only snapshots with a larger id are yielded
+        batch_size: Number of rows per batch
+        max_id: Only snapshots up to this id are yielded
+
+    Yields:
+        Lists of (id, position, move_code, turn, white_elo, black_elo, result) tuples
+    """
+    while True:
+        rows = get_snapshots_batch(after_id, batch_size, max_id)
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1][0]
+
+
+def get_last_snapshot_id(max_snapshots: int | None = None) -> int:
+    """Return the id of the last snapshot with statistics, or 0 if there is none.
+
+    Args:
+        max_snapshots: Return the id of the max_snapshots-th snapshot with statistics
+            instead, if there are that many
+
+    Note: Finding the max_snapshots-th snapshot walks the primary key up to it; the
+    last one is found by walking it back from MAX(id) to the nearest row with a result.
+    """
+    conn = get_connection(DB_FILE)
+    c = conn.cursor()
+    if max_snapshots is not None:
+        if max_snapshots <= 0:
+            return 0
+        c.execute(
+            f"SELECT id FROM {_TABLE_NAME} WHERE result IS NOT NULL ORDER BY id LIMIT 1 OFFSET ?",
+            (max_snapshots - 1,),
+        )
+        row = c.fetchone()
+        if row is not None:
+            snapshot_id: int = row[0]
+            return snapshot_id
+    c.execute(f"SELECT id FROM {_TABLE_NAME} WHERE result IS NOT NULL ORDER BY id DESC LIMIT 1")
+    row = c.fetchone()
+    last_id: int = row[0] if row is not None else 0
+    return last_id
+
+
+def _snapshot_to_row(snapshot: GameSnapshot) -> tuple:
+    """Convert a GameSnapshot to the values of an INSERT (without id)."""
+    return (
+        snapshot.raw_game_id,
+        snapshot.move_number,
+        snapshot.turn,
+        snapshot.move_code,
+        snapshot.position,
+        snapshot.white_elo,
+        snapshot.black_elo,
+        snapshot.result,
+        snapshot.event_class,
+    )
+
+
 def _row_to_snapshot(row: tuple) -> GameSnapshot:
     """Convert a DB row to a GameSnapshot object."""
     return GameSnapshot(
         raw_game_id=row[1],
         move_number=row[2],
         turn=row[3],
-        move=row[4],
-        fen=row[5],
+        move_code=row[4],
+        position=row[5],
     )
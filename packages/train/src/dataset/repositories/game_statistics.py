@@ -3,13 +3,21 @@ from collections.abc import Iterator
 
 from packages.train.src.constants import DB_FILE
 from packages.train.src.dataset.models.game_statistics import GameStatistics
+from packages.train.src.dataset.repositories.connection import get_connection
+from packages.train.src.dataset.repositories.indexes import Index, create_indexes
 
 _TABLE_NAME = "game_statistics"
+GAME_STATISTICS_INDEXES = [
+    Index("idx_game_statistics_eco", _TABLE_NAME, "eco"),
+    Index("idx_game_statistics_time_control", _TABLE_NAME, "time_control"),
+    # Event and Elo range filters of the evaluation scripts
+    Index("idx_game_statistics_event_elo", _TABLE_NAME, "event, white_elo, black_elo"),
+]
 
 
-def create_game_statistics_table():
+def create_game_statistics_table(db_path: str):
     """Create the 'game_statistics' table if it does not exist."""
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_connection(db_path)
     c = conn.cursor()
 
     c.execute(
@@ -41,29 +49,26 @@ def create_game_statistics_table():
     )
     """
     )
+    create_indexes(c, GAME_STATISTICS_INDEXES)
     conn.commit()
-    conn.close()
 
 
 def game_statistics_table_exists() -> bool:
     """Return True if the table exists."""
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_connection(DB_FILE)
     c = conn.cursor()
-    try:
-        c.execute(
-            f"""
-        SELECT name FROM sqlite_master WHERE type='table' AND name='{_TABLE_NAME}';
-        """
-        )
-        exists = c.fetchone() is not None
-    finally:
-        conn.close()
+    c.execute(
+        f"""
+    SELECT name FROM sqlite_master WHERE type='table' AND name='{_TABLE_NAME}';
+    """
+    )
+    exists = c.fetchone() is not None
     return exists
 
 
 def save_game_statistics(stats: GameStatistics):
     """Insert a single GameStatistics record."""
-    with sqlite3.connect(DB_FILE, isolation_level=None) as conn:
+    with get_connection(DB_FILE) as conn:
         c = conn.cursor()
 
         # Check if statistics already exist for this raw_game_id
@@ -121,68 +126,72 @@ def save_game_statistics_batch(stats_list: list[GameStatistics]):
     if not stats_list:
         return
 
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_connection(DB_FILE) as conn:
         c = conn.cursor()
+        insert_game_statistics(c, stats_list)
+        conn.commit()
 
-        # Prepare data for batch insert
-        data = [
-            (
-                stats.raw_game_id,
-                stats.event,
-                stats.site,
-                stats.date,
-                stats.round,
-                stats.white,
-                stats.black,
-                stats.result,
-                stats.white_elo,
-                stats.black_elo,
-                stats.white_rating_diff,
-                stats.black_rating_diff,
-                stats.time_control,
-                stats.eco,
-                stats.opening,
-                stats.termination,
-                stats.utc_date,
-                stats.utc_time,
-                stats.variant,
-                stats.lichess_url,
-                stats.total_moves,
-            )
-            for stats in stats_list
-        ]
 
-        # Batch insert all statistics (ignore duplicates)
-        c.executemany(
-            f"""
-            INSERT OR IGNORE INTO {_TABLE_NAME} (
-                raw_game_id, event, site, date, round, white, black, result,
-                white_elo, black_elo, white_rating_diff, black_rating_diff,
-                time_control, eco, opening, termination, utc_date, utc_time,
-                variant, lichess_url, total_moves
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            data,
+def insert_game_statistics(cursor: sqlite3.Cursor, stats_list: list[GameStatistics]) -> None:
+    """Insert GameStatistics (ignoring duplicates) using the caller's transaction."""
+    if not stats_list:
+        return
+
+    # Prepare data for batch insert
+    data = [
+        (
+            stats.raw_game_id,
+            stats.event,
+            stats.site,
+            stats.date,
+            stats.round,
+            stats.white,
+            stats.black,
+            stats.result,
+            stats.white_elo,
+            stats.black_elo,
+            stats.white_rating_diff,
+            stats.black_rating_diff,
+            stats.time_control,
+            stats.eco,
+            stats.opening,
+            stats.termination,
+            stats.utc_date,
+            stats.utc_time,
+            stats.variant,
+            stats.lichess_url,
+            stats.total_moves,
         )
-        conn.commit()
+        for stats in stats_list
+    ]
+
+    # Batch insert all statistics (ignore duplicates)
+    cursor.executemany(
+        f"""
+        INSERT OR IGNORE INTO {_TABLE_NAME} (
+            raw_game_id, event, site, date, round, white, black, result,
+            white_elo, black_elo, white_rating_diff, black_rating_diff,
+            time_control, eco, opening, termination, utc_date, utc_time,
+            variant, lichess_url, total_moves
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        data,
+    )
 
 
 def count_game_statistics() -> int:
     """Return the total number of game statistics currently in the database."""
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_connection(DB_FILE)
     c = conn.cursor()
-    try:
-        c.execute(f"SELECT COUNT(*) FROM {_TABLE_NAME}")
-        result = c.fetchone()
-        count = result[0] if result else 0
-    finally:
-        conn.close()
+    c.execute(f"SELECT COUNT(*) FROM {_TABLE_NAME}")
+    result = c.fetchone()
+    count = result[0] if result else 0
     return count
 
 
 def fetch_game_statistics_by_raw_game_id(raw_game_id: int) -> GameStatistics | None:
     """Fetch statistics for a specific raw game."""
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_connection(DB_FILE) as conn:
         c = conn.cursor()
         c.execute(f"SELECT * FROM {_TABLE_NAME} WHERE raw_game_id = ?", (raw_game_id,))
         row = c.fetchone()
@@ -193,7 +202,7 @@ def fetch_game_statistics_by_raw_game_id(raw_game_id: int) -> GameStatistics | N
 
 def fetch_games_by_opening(eco: str) -> Iterator[GameStatistics]:
     """Fetch all games with a specific ECO code."""
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_connection(DB_FILE) as conn:
         c = conn.cursor()
         c.execute(f"SELECT * FROM {_TABLE_NAME} WHERE eco = ?", (eco,))
         for row in c:
@@ -202,7 +211,7 @@ def fetch_games_by_opening(eco: str) -> Iterator[GameStatistics]:
 
 def fetch_games_by_time_control(time_control: str) -> Iterator[GameStatistics]:
     """Fetch all games with a specific time control."""
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_connection(DB_FILE) as conn:
         c = conn.cursor()
         c.execute(f"SELECT * FROM {_TABLE_NAME} WHERE time_control = ?", (time_control,))
         for row in c:
@@ -0,0 +1,43 @@
+from packages.train.src.constants import DB_FILE
+from packages.train.src.dataset.repositories.connection import get_connection
+
+_TABLE_NAME = "http_validators"
+
+
+def create_http_validators_table(db_path: str):
+    """Create the table storing ETag/Last-Modified values of fetched Lichess resources."""
+    with get_connection(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {_TABLE_NAME} (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT
+            )
+            """
+        )
+        conn.commit()
+
+
+def fetch_http_validators() -> dict[str, tuple[str | None, str | None]]:
+    """Return stored (etag, last_modified) pairs keyed by URL."""
+    with get_connection(DB_FILE) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT url, etag, last_modified FROM {_TABLE_NAME}")
+        return {url: (etag, last_modified) for url, etag, last_modified in cursor.fetchall()}
+
+
+def save_http_validators(validators: dict[str, tuple[str | None, str | None]]) -> None:
+    """Insert or replace the validators of the given URLs."""
+    with get_connection(DB_FILE) as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            f"""
+            INSERT INTO {_TABLE_NAME} (url, etag, last_modified) VALUES (?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                etag = excluded.etag, last_modified = excluded.last_modified
+            """,
+            [(url, etag, last_modified) for url, (etag, last_modified) in validators.items()],
+        )
+        conn.commit()
@@ -0,0 +1,86 @@
+"""Secondary indexes of the dataset tables.
+
+Each repository declares the indexes of its table and creates them together with the
+table. The helpers take the caller's cursor so that bulk writers can drop indexes
+before a large ingest and rebuild them afterwards (see repositories.ingest).
+
+Dropped indexes are recorded in the 'dropped_indexes' table together with their
+CREATE statement, so that indexes lost to an interrupted ingest are rebuilt when the
+database is next initialized.
+"""
+
+import sqlite3
+from collections.abc import Iterable
+from dataclasses import dataclass
+
+_DROPPED_TABLE_NAME = "dropped_indexes"
+
+
+@dataclass(frozen=True)
+class Index:
+    """A secondary index on one table.
+
+    Attributes:
+        name: Index name, unique within the database
+        table: Indexed table
+        columns: Comma-separated indexed columns
+        where: Optional condition making the index partial
+        unique: Reject rows duplicating the indexed columns
+    """
+
+    name: str
+    table: str
+    columns: str
+    where: str | None = None
+    unique: bool = False
+
+    def create_sql(self) -> str:
+        kind = "UNIQUE INDEX" if self.unique else "INDEX"
+        sql = f"CREATE {kind} IF NOT EXISTS {self.name} ON {self.table} ({self.columns})"
+        if self.where:
+            sql += f" WHERE {self.where}"
+        return sql
+
+
+def create_indexes(cursor: sqlite3.Cursor, indexes: Iterable[Index]) -> None:
+    """Create the given indexes if they do not exist."""
+    for index in indexes:
+        cursor.execute(index.create_sql())
+
+
+def create_dropped_indexes_table(cursor: sqlite3.Cursor) -> None:
+    """Create the 'dropped_indexes' table if it does not exist."""
+    cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {_DROPPED_TABLE_NAME} (
+            name TEXT PRIMARY KEY,
+            create_sql TEXT NOT NULL
+        )
+        """
+    )
+
+
+def drop_indexes(cursor: sqlite3.Cursor, indexes: Iterable[Index]) -> None:
+    """Drop the given indexes, remembering them for rebuild_dropped_indexes."""
+    create_dropped_indexes_table(cursor)
+    for index in indexes:
+        cursor.execute(
+            f"INSERT OR REPLACE INTO {_DROPPED_TABLE_NAME} (name, create_sql) VALUES (?, ?)",
+            (index.name, index.create_sql()),
+        )
+        cursor.execute(f"DROP INDEX IF EXISTS {index.name}")
+
+
+def rebuild_dropped_indexes(cursor: sqlite3.Cursor) -> int:
+    """Recreate every index recorded by drop_indexes.
+
+    Returns:
+        Number of rebuilt indexes
+    """
+    create_dropped_indexes_table(cursor)
+    cursor.execute(f"SELECT name, create_sql FROM {_DROPPED_TABLE_NAME}")
+    dropped = cursor.fetchall()
+    for name, create_sql in dropped:
+        cursor.execute(create_sql)
+        cursor.execute(f"DELETE FROM {_DROPPED_TABLE_NAME} WHERE name = ?", (name,))
+    return len(dropped)
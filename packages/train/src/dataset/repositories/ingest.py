@@ -0,0 +1,129 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from packages.train.src.constants import DB_FILE, KEEP_PROCESSED_PGN
+from packages.train.src.dataset.models.file_metadata import FileMetadata
+from packages.train.src.dataset.models.game_snapshot import GameSnapshot
+from packages.train.src.dataset.models.game_statistics import GameStatistics
+from packages.train.src.dataset.models.raw_game import RawGame
+from packages.train.src.dataset.repositories.connection import get_connection
+from packages.train.src.dataset.repositories.files_metadata import set_file_progress
+from packages.train.src.dataset.repositories.game_snapshots import (
+    GAME_SNAPSHOTS_INDEXES,
+    insert_snapshots,
+)
+from packages.train.src.dataset.repositories.game_statistics import (
+    GAME_STATISTICS_INDEXES,
+    insert_game_statistics,
+)
+from packages.train.src.dataset.repositories.indexes import drop_indexes, rebuild_dropped_indexes
+from packages.train.src.dataset.repositories.processed_ranges import set_range_progress
+from packages.train.src.dataset.repositories.processed_snapshots import (
+    insert_processed_snapshots,
+)
+from packages.train.src.dataset.repositories.raw_games import (
+    insert_raw_games,
+    mark_raw_games_as_processed,
+)
+
+# Indexes of the tables the ingest only writes to. raw_games keeps its indexes: the
+# ingest reads unprocessed games through them.
+_INGEST_DROPPED_INDEXES = GAME_SNAPSHOTS_INDEXES + GAME_STATISTICS_INDEXES
+
+
+def save_ingest_chunk(
+    statistics: list[GameStatistics],
+    snapshots: list[GameSnapshot],
+    raw_game_ids: list[int],
+) -> None:
+    """Write the results of a chunk of games in a single transaction.
+
+    Statistics, snapshots and the processed flags of their raw games are committed
+    together: if anything fails the transaction is rolled back and the games stay
+    unprocessed, so they are simply processed again on the next run. Unless
+    KEEP_PROCESSED_PGN is set, the PGN text of the games is dropped in the same
+    transaction.
+
+    Args:
+        statistics: GameStatistics of the chunk's games
+        snapshots: GameSnapshots of the chunk's games
+        raw_game_ids: IDs of the raw games the chunk covers
+    """
+    with get_connection(DB_FILE) as conn:
+        c = conn.cursor()
+        insert_game_statistics(c, statistics)
+        insert_snapshots(c, snapshots)
+        mark_raw_games_as_processed(c, raw_game_ids, drop_pgn=not KEEP_PROCESSED_PGN)
+        conn.commit()
+
+
+def save_downloaded_games(
+    file: FileMetadata, games: list[RawGame], games_consumed: int
+) -> list[RawGame]:
+    """Store a batch of games read from an archive and advance the file's cursor.
+
+    Both are committed in one transaction, so the cursor never points past a game
+    that was lost or before one that was stored. Games whose site is already in the
+    database are skipped.
+
+    Args:
+        file: Archive the games were read from
+        games: Games read since the previous batch that passed the ingest filter
+        games_consumed: Number of games of the archive read so far, filtered or not
+
+    Returns:
+        The games that were inserted, with their ids set
+    """
+    with get_connection(DB_FILE) as conn:
+        c = conn.cursor()
+        inserted = insert_raw_games(c, games)
+        set_file_progress(c, file, games_consumed)
+        conn.commit()
+    file.games_consumed = games_consumed
+    return inserted
+
+
+def save_processed_batch(
+    data: list[tuple[int, bytes, bytes, int, bytes]], start_id: int, last_id: int
+) -> None:
+    """Store a batch of encoded snapshots and advance the progress of their id range.
+
+    Both are committed in one transaction, so a range resumes right after the last
+    snapshot that was stored.
+
+    Args:
+        data: Rows for save_processed_snapshots
+        start_id: Start of the range the batch was read from
+        last_id: Largest snapshot id of the range that was read, encoded or not
+    """
+    with get_connection(DB_FILE) as conn:
+        c = conn.cursor()
+        insert_processed_snapshots(c, data)
+        set_range_progress(c, start_id, last_id)
+        conn.commit()
+
+
+@contextmanager
+def bulk_ingest(enabled: bool = True) -> Iterator[None]:
+    """Drop the secondary indexes of the ingest's output tables for the duration of a block.
+
+    Rows are then appended without index maintenance and every index is rebuilt in one
+    sorted pass when the block exits, also if it raises. If the process dies inside the
+    block, initialize_database rebuilds the dropped indexes on the next start.
+
+    Args:
+        enabled: If False the block runs with the indexes in place, which is cheaper
+            when only a few rows are added to a large table
+    """
+    if not enabled:
+        yield
+        return
+
+    with get_connection(DB_FILE) as conn:
+        drop_indexes(conn.cursor(), _INGEST_DROPPED_INDEXES)
+    try:
+        yield
+    finally:
+        print("Rebuilding indexes...")
+        with get_connection(DB_FILE) as conn:
+            rebuild_dropped_indexes(conn.cursor())
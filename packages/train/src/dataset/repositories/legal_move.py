@@ -1,15 +1,15 @@
-import sqlite3
 from collections.abc import Iterable
 
 from packages.train.src.constants import DB_FILE
 from packages.train.src.dataset.models.legal_move import LegalMove
+from packages.train.src.dataset.repositories.connection import get_connection
 
 _TABLE_NAME = "legal_moves"
 
 
-def create_legal_moves_table():
+def create_legal_moves_table(db_path: str):
     """Create the 'legal_moves' table if it does not exist."""
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_connection(db_path)
     c = conn.cursor()
 
     c.execute(
@@ -22,12 +22,11 @@ def create_legal_moves_table():
         """
     )
     conn.commit()
-    conn.close()
 
 
 def save_legal_move(move: LegalMove):
     """Insert a single LegalMove, ignoring duplicates."""
-    with sqlite3.connect(DB_FILE, isolation_level=None) as conn:
+    with get_connection(DB_FILE) as conn:
         c = conn.cursor()
         c.execute(
             f"""
@@ -40,7 +39,7 @@ def save_legal_move(move: LegalMove):
 
 def save_legal_moves(moves: Iterable[LegalMove]):
     """Insert multiple LegalMove objects one by one (ignoring duplicates)."""
-    with sqlite3.connect(DB_FILE, isolation_level=None) as conn:
+    with get_connection(DB_FILE) as conn:
         c = conn.cursor()
         c.executemany(
             f"""
@@ -53,14 +52,11 @@ def save_legal_moves(moves: Iterable[LegalMove]):
 
 def count_legal_moves() -> int:
     """Return the total number of legal moves currently in the database."""
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_connection(DB_FILE)
     c = conn.cursor()
-    try:
-        c.execute(f"SELECT COUNT(*) FROM {_TABLE_NAME}")
-        result = c.fetchone()
-        return result[0] if result else 0
-    finally:
-        conn.close()
+    c.execute(f"SELECT COUNT(*) FROM {_TABLE_NAME}")
+    result = c.fetchone()
+    return result[0] if result else 0
 
 
 def _row_to_legal_move(row: tuple) -> LegalMove:
@@ -73,11 +69,8 @@ def _row_to_legal_move(row: tuple) -> LegalMove:
 
 def get_all_legal_moves() -> list[LegalMove]:
     """Return all LegalMove records from the database."""
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_connection(DB_FILE)
     c = conn.cursor()
-    try:
-        c.execute(f"SELECT * FROM {_TABLE_NAME}")
-        rows = c.fetchall()
-        return [_row_to_legal_move(row) for row in rows]
-    finally:
-        conn.close()
+    c.execute(f"SELECT * FROM {_TABLE_NAME}")
+    rows = c.fetchall()
+    return [_row_to_legal_move(row) for row in rows]
@@ -0,0 +1,95 @@
+import sqlite3
+
+from packages.train.src.constants import DB_FILE
+from packages.train.src.dataset.models.pgn_offset import PgnOffset
+from packages.train.src.dataset.repositories.connection import get_connection
+
+_TABLE_NAME = "pgn_offsets"
+_COLUMNS = (
+    "archive, game_index, offset, length, frame_offset, frame_length, "
+    "event, site, white_elo, black_elo, result"
+)
+
+
+def create_pgn_offsets_table(db_path: str):
+    """Create the sidecar table locating games in local PGN archives.
+
+    Keyed by (archive, game_index) without a rowid, so looking a game up is a single
+    B-tree search.
+    """
+    with get_connection(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {_TABLE_NAME} (
+                archive TEXT NOT NULL,
+                game_index INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                frame_offset INTEGER,
+                frame_length INTEGER,
+                event TEXT,
+                site TEXT,
+                white_elo INTEGER,
+                black_elo INTEGER,
+                result TEXT,
+                PRIMARY KEY (archive, game_index)
+            ) WITHOUT ROWID
+            """
+        )
+        conn.commit()
+
+
+def delete_pgn_offsets(cursor: sqlite3.Cursor, archive: str) -> None:
+    """Delete the index of an archive using the caller's transaction."""
+    cursor.execute(f"DELETE FROM {_TABLE_NAME} WHERE archive = ?", (archive,))
+
+
+def rename_pgn_offsets(cursor: sqlite3.Cursor, archive: str, new_archive: str) -> None:
+    """Move the index of an archive to another path using the caller's transaction."""
+    cursor.execute(
+        f"UPDATE {_TABLE_NAME} SET archive = ? WHERE archive = ?", (new_archive, archive)
+    )
+
+
+def insert_pgn_offsets(cursor: sqlite3.Cursor, offsets: list[PgnOffset]) -> None:
+    """Insert or replace game offsets using the caller's transaction."""
+    cursor.executemany(
+        f"INSERT OR REPLACE INTO {_TABLE_NAME} ({_COLUMNS}) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (
+                o.archive,
+                o.game_index,
+                o.offset,
+                o.length,
+                o.frame_offset,
+                o.frame_length,
+                o.event,
+                o.site,
+                o.white_elo,
+                o.black_elo,
+                o.result,
+            )
+            for o in offsets
+        ],
+    )
+
+
+def fetch_pgn_offset(archive: str, game_index: int) -> PgnOffset | None:
+    """Return the location of one game, or None if it is not indexed."""
+    conn = get_connection(DB_FILE)
+    row = conn.execute(
+        f"SELECT {_COLUMNS} FROM {_TABLE_NAME} WHERE archive = ? AND game_index = ?",
+        (archive, game_index),
+    ).fetchone()
+    return PgnOffset(*row) if row is not None else None
+
+
+def count_pgn_offsets(archive: str) -> int:
+    """Return the number of indexed games of an archive."""
+    conn = get_connection(DB_FILE)
+    count: int = conn.execute(
+        f"SELECT COUNT(*) FROM {_TABLE_NAME} WHERE archive = ?", (archive,)
+    ).fetchone()[0]
+    return count
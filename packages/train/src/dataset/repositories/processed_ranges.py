@@ -0,0 +1,56 @@
+import sqlite3
+
+from packages.train.src.constants import DB_FILE
+from packages.train.src.dataset.models.processed_range import ProcessedRange
+from packages.train.src.dataset.repositories.connection import get_connection
+
+_TABLE_NAME = "processed_ranges"
+
+
+def create_processed_ranges_table(db_path: str):
+    """Create the table tracking fill_processed_snapshots per range of snapshot ids.
+
+    Snapshots already processed when the table is created, which were encoded in id
+    order, are recorded as one finished range up to the largest processed id.
+    """
+    with get_connection(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {_TABLE_NAME} (
+                start_id INTEGER PRIMARY KEY,
+                end_id INTEGER NOT NULL,
+                last_id INTEGER NOT NULL
+            )
+            """
+        )
+        cursor.execute(
+            f"""
+            INSERT OR IGNORE INTO {_TABLE_NAME} (start_id, end_id, last_id)
+            SELECT 0, MAX(snapshot_id), MAX(snapshot_id) FROM processed_snapshots
+            HAVING MAX(snapshot_id) IS NOT NULL
+            """
+        )
+
+
+def fetch_processed_ranges() -> list[ProcessedRange]:
+    """Return every planned range, ordered by start_id."""
+    conn = get_connection(DB_FILE)
+    rows = conn.execute(
+        f"SELECT start_id, end_id, last_id FROM {_TABLE_NAME} ORDER BY start_id"
+    ).fetchall()
+    return [ProcessedRange(*row) for row in rows]
+
+
+def save_processed_ranges(ranges: list[ProcessedRange]) -> None:
+    """Insert newly planned ranges in a single transaction."""
+    with get_connection(DB_FILE) as conn:
+        conn.executemany(
+            f"INSERT INTO {_TABLE_NAME} (start_id, end_id, last_id) VALUES (?, ?, ?)",
+            [(r.start_id, r.end_id, r.last_id) for r in ranges],
+        )
+
+
+def set_range_progress(cursor: sqlite3.Cursor, start_id: int, last_id: int) -> None:
+    """Record the last snapshot id encoded in a range using the caller's transaction."""
+    cursor.execute(f"UPDATE {_TABLE_NAME} SET last_id = ? WHERE start_id = ?", (last_id, start_id))
@@ -1,18 +1,34 @@
 import sqlite3
 
+import numpy as np
+
 from packages.train.src.constants import DB_FILE
+from packages.train.src.dataset.codecs.position_codec import planes_to_bitboards
 from packages.train.src.dataset.models.processed_snapshot import ProcessedSnapshot
+from packages.train.src.dataset.repositories.connection import get_connection
+from packages.train.src.dataset.repositories.row_counts import (
+    add_to_row_count,
+    create_row_counts_table,
+    get_row_count,
+    seed_row_count,
+)
 
 _TABLE_NAME = "processed_snapshots"
+# Boards written before pack_processed_boards: 12 * 8 * 8 float32 one-hot planes
+_PLANES_BOARD_SIZE = 12 * 8 * 8 * 4
+# No position has more legal moves, so longer valid_moves are dense float32 vectors
+_MAX_LEGAL_MOVES = 218
 
 
-def create_processed_snapshots_table():
+def create_processed_snapshots_table(db_path: str):
     """Create the 'processed_snapshots' table if it does not exist.
 
     This table caches processed game_snapshots data to avoid
-    processing the same row twice.
+    processing the same row twice. The board is stored as 12 little-endian uint64
+    piece bitboards (96 bytes), see codecs.position_codec, and valid_moves as the
+    sorted little-endian uint16 vocabulary indices of the legal moves.
     """
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_connection(db_path)
     c = conn.cursor()
 
     c.execute(
@@ -27,26 +43,82 @@ def create_processed_snapshots_table():
     )
     """
     )
+    create_row_counts_table(c)
+    seed_row_count(c, _TABLE_NAME)
     conn.commit()
-    conn.close()
+
+
+def pack_processed_boards(db_path: str):
+    """Schema migration: store processed boards as bitboards instead of float32 planes.
+
+    Converts every board still holding 3072 bytes of one-hot planes into its 96 byte
+    bitboards, in one transaction. The freed pages stay in the file until the database
+    is vacuumed.
+    """
+    with get_connection(db_path) as conn:
+        conn.create_function("planes_to_bitboards", 1, _pack_board, deterministic=True)
+        conn.execute(
+            f"""
+            UPDATE {_TABLE_NAME}
+            SET board = planes_to_bitboards(board)
+            WHERE length(board) = {_PLANES_BOARD_SIZE}
+            """
+        )
+
+
+def _pack_board(board: bytes) -> bytes:
+    planes = np.frombuffer(board, dtype=np.float32).reshape(12, 8, 8)
+    return planes_to_bitboards(planes).tobytes()
+
+
+def pack_valid_moves(db_path: str):
+    """Schema migration: store legal moves as uint16 indices instead of dense vectors.
+
+    Converts every valid_moves still holding a float32 mask over the whole vocabulary
+    (8416 bytes) into the indices of its legal moves (about 70 bytes), in one
+    transaction. The freed pages stay in the file until the database is vacuumed.
+    """
+    with get_connection(db_path) as conn:
+        conn.create_function("mask_to_indices", 1, _pack_valid_moves, deterministic=True)
+        conn.execute(
+            f"""
+            UPDATE {_TABLE_NAME}
+            SET valid_moves = mask_to_indices(valid_moves)
+            WHERE length(valid_moves) > {2 * _MAX_LEGAL_MOVES}
+            """
+        )
+
+
+def _pack_valid_moves(valid_moves: bytes) -> bytes:
+    mask = np.frombuffer(valid_moves, dtype=np.float32)
+    return np.flatnonzero(mask).astype("<u2").tobytes()
 
 
 def save_processed_snapshots(data: list[tuple[int, bytes, bytes, int, bytes]]):
     """Save multiple processed snapshots in a single transaction.
 
     Args:
-        data: List of (snapshot_id, board_bytes, metadata_bytes, chosen_move, valid_moves_bytes)
+        data: List of (snapshot_id, board_bytes, metadata_bytes, chosen_move, valid_moves_bytes),
+            board_bytes holding the 12 piece bitboards and valid_moves_bytes the uint16
+            indices of the legal moves
     """
     if not data:
         return
 
-    with sqlite3.connect(DB_FILE) as conn:
-        c = conn.cursor()
-        c.executemany(
-            f"INSERT OR IGNORE INTO {_TABLE_NAME} (snapshot_id, board, metadata, chosen_move, valid_moves) VALUES (?, ?, ?, ?, ?)",
-            data,
-        )
-        conn.commit()
+    with get_connection(DB_FILE) as conn:
+        insert_processed_snapshots(conn.cursor(), data)
+
+
+def insert_processed_snapshots(
+    cursor: sqlite3.Cursor, data: list[tuple[int, bytes, bytes, int, bytes]]
+) -> None:
+    """Insert processed snapshots using the caller's transaction, see save_processed_snapshots."""
+    cursor.executemany(
+        f"INSERT OR IGNORE INTO {_TABLE_NAME} (snapshot_id, board, metadata, chosen_move, valid_moves) VALUES (?, ?, ?, ?, ?)",
+        data,
+    )
+    # rowcount skips rows ignored as duplicates
+    add_to_row_count(cursor, _TABLE_NAME, cursor.rowcount)
 
 
 def get_processed_snapshots_batch(
@@ -63,7 +135,7 @@ def get_processed_snapshots_batch(
     if not snapshot_ids:
         return {}
 
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_connection(DB_FILE) as conn:
         placeholders = ",".join("?" * len(snapshot_ids))
         c = conn.cursor()
         c.execute(
@@ -79,12 +151,23 @@ def get_processed_snapshots_batch(
 
 
 def count_processed_snapshots() -> int:
-    """Get the total number of processed snapshots in the database."""
-    conn = sqlite3.connect(DB_FILE)
+    """Get the total number of processed snapshots in the database (O(1))."""
+    conn = get_connection(DB_FILE)
     c = conn.cursor()
-    try:
-        c.execute(f"SELECT COUNT(*) FROM {_TABLE_NAME}")
-        result = c.fetchone()
-        return result[0] if result else 0
-    finally:
-        conn.close()
+    return get_row_count(c, _TABLE_NAME)
+
+
+def get_processed_snapshot_ids(offset: int, limit: int) -> np.ndarray:
+    """Return the ids of up to limit processed snapshots, skipping the offset first ones.
+
+    Ids are in ascending order. They have gaps wherever a snapshot was not encoded (no
+    statistics) or its range was not finished, so the n-th processed snapshot can only
+    be found by its position in this list.
+    """
+    conn = get_connection(DB_FILE)
+    c = conn.cursor()
+    c.execute(
+        f"SELECT snapshot_id FROM {_TABLE_NAME} ORDER BY snapshot_id LIMIT ? OFFSET ?",
+        (limit, offset),
+    )
+    return np.fromiter((row[0] for row in c), dtype=np.int64)
@@ -1,15 +1,81 @@
+"""Repository of the 'raw_games' table.
+
+PGN text is stored compressed with a zstd dictionary trained once per database from
+its first games (table 'pgn_dictionary'). Until the dictionary exists, and for rows
+written before it did, the PGN is stored as plain TEXT; compressed rows are BLOBs.
+Compression happens on insert and decompression when rows are converted to RawGame,
+so callers only ever see text.
+"""
+
 import sqlite3
+import threading
 from collections.abc import Iterator
+from dataclasses import dataclass
 
-from packages.train.src.constants import DB_FILE
+import zstandard as zstd
+
+from packages.train.src.constants import DB_FILE, DEFAULT_BATCH_SIZE
 from packages.train.src.dataset.models.raw_game import RawGame
+from packages.train.src.dataset.repositories.connection import get_connection
+from packages.train.src.dataset.repositories.indexes import Index, create_indexes
 
 _TABLE_NAME = "raw_games"
+# Ids bound per UPDATE. The schema needs SQLite 3.35+ (RETURNING here, DROP COLUMN in
+# game_snapshots), which allows 32766 parameters per statement, far above a chunk
+_MAX_SQL_PARAMS = 999
+# Partial indexes only hold unprocessed games, so they shrink as games are processed
+RAW_GAMES_INDEXES = [
+    Index("idx_raw_games_unprocessed", _TABLE_NAME, "processed", where="processed = 0"),
+    Index("idx_raw_games_unprocessed_file", _TABLE_NAME, "file_id", where="processed = 0"),
+]
+# Games stored before the site column have NULL and are not deduplicated
+_SITE_INDEX = Index(
+    "idx_raw_games_site", _TABLE_NAME, "site", where="site IS NOT NULL", unique=True
+)
+_COLUMNS = "id, file_id, pgn, processed, game_index, site"
+
+_DICTIONARY_TABLE_NAME = "pgn_dictionary"
+_DICTIONARY_SIZE = 64 * 1024
+# Plain-text games inserted before a dictionary is trained from the latest of them
+_DICTIONARY_SAMPLES = 1_000
+_COMPRESSION_LEVEL = 3
+
+_local = threading.local()
+
+
+@dataclass(frozen=True)
+class _PgnCodec:
+    """Compresses PGN text with a database's dictionary (zstd objects are per thread)."""
 
+    compressor: zstd.ZstdCompressor
+    decompressor: zstd.ZstdDecompressor
 
-def create_raw_games_table():
-    """Create the 'raw_games' table if it does not exist."""
-    conn = sqlite3.connect(DB_FILE)
+    @classmethod
+    def from_dictionary(cls, data: bytes) -> "_PgnCodec":
+        dictionary = zstd.ZstdCompressionDict(data)
+        dictionary.precompute_compress(level=_COMPRESSION_LEVEL)
+        return cls(
+            compressor=zstd.ZstdCompressor(level=_COMPRESSION_LEVEL, dict_data=dictionary),
+            decompressor=zstd.ZstdDecompressor(dict_data=dictionary),
+        )
+
+    def encode(self, pgn: str) -> str | bytes:
+        # Empty PGN marks a processed game whose text was dropped
+        return self.compressor.compress(pgn.encode("utf-8")) if pgn else pgn
+
+    def decode(self, stored: str | bytes) -> str:
+        if isinstance(stored, bytes):
+            return self.decompressor.decompress(stored).decode("utf-8")
+        return stored
+
+
+def create_raw_games_table(db_path: str):
+    """Create the 'raw_games' table if it does not exist.
+
+    This is the table as of schema version 1; add_game_index_column adds the
+    position of each game in its archive file.
+    """
+    conn = get_connection(db_path)
     c = conn.cursor()
     c.execute(
         f"""
@@ -22,40 +88,71 @@ def create_raw_games_table():
     )
     """
     )
+    create_indexes(c, RAW_GAMES_INDEXES)
     conn.commit()
-    conn.close()
 
 
-def raw_games_table_exists() -> bool:
-    """Return True if the table exists in the database."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    try:
-        c.execute(
-            f"""
-        SELECT name FROM sqlite_master WHERE type='table' AND name='{_TABLE_NAME}';
-        """
-        )
-        exists = c.fetchone() is not None
-    finally:
-        conn.close()
-    return exists
+def add_game_index_column(db_path: str):
+    """Schema migration: add the 'game_index' column.
+
+    Together with file_id it locates a game in its Lichess archive, so the PGN of a
+    processed game can be dropped (see drop_processed_pgn) and read again from the
+    archive if it is ever needed. Existing rows keep NULL.
+    """
+    with get_connection(db_path) as conn:
+        c = conn.cursor()
+        c.execute(f"PRAGMA table_info({_TABLE_NAME})")
+        if "game_index" not in {row[1] for row in c.fetchall()}:
+            c.execute(f"ALTER TABLE {_TABLE_NAME} ADD COLUMN game_index INTEGER")
 
 
-def save_raw_game(game: RawGame):
-    """Insert a single RawGame into the database."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
+def add_site_column(db_path: str):
+    """Schema migration: add the 'site' column and its unique index.
 
+    The Lichess game URL identifies a game across runs and files, so storing a game
+    that is already in the table is a no-op (see insert_raw_games). Existing rows
+    keep NULL.
+    """
+    with get_connection(db_path) as conn:
+        c = conn.cursor()
+        c.execute(f"PRAGMA table_info({_TABLE_NAME})")
+        if "site" not in {row[1] for row in c.fetchall()}:
+            c.execute(f"ALTER TABLE {_TABLE_NAME} ADD COLUMN site TEXT")
+        create_indexes(c, [_SITE_INDEX])
+
+
+def create_pgn_dictionary_table(db_path: str):
+    """Schema migration: create the table holding the PGN compression dictionary."""
+    conn = get_connection(db_path)
+    c = conn.cursor()
     c.execute(
         f"""
-    INSERT INTO {_TABLE_NAME} (file_id, pgn, processed)
-    VALUES (?, ?, ?)
-    """,
-        (game.file_id, game.pgn, int(getattr(game, "processed", 0))),
+    CREATE TABLE IF NOT EXISTS {_DICTIONARY_TABLE_NAME} (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        dict_id INTEGER NOT NULL,
+        data BLOB NOT NULL
+    )
+    """
     )
     conn.commit()
-    conn.close()
+
+
+def raw_games_table_exists() -> bool:
+    """Return True if the table exists in the database."""
+    conn = get_connection(DB_FILE)
+    c = conn.cursor()
+    c.execute(
+        f"""
+    SELECT name FROM sqlite_master WHERE type='table' AND name='{_TABLE_NAME}';
+    """
+    )
+    exists = c.fetchone() is not None
+    return exists
+
+
+def save_raw_game(game: RawGame):
+    """Insert a single RawGame into the database (ignored if its site is already stored)."""
+    save_raw_games_batch([game])
 
 
 def save_raw_games(games: list[RawGame]):
@@ -71,103 +168,237 @@ def save_raw_games_batch(games: list[RawGame]):
     if not games:
         return
 
-    with sqlite3.connect(DB_FILE) as conn:
-        c = conn.cursor()
+    with get_connection(DB_FILE) as conn:
+        insert_raw_games(conn.cursor(), games)
 
-        # Prepare data for batch insert
-        data = [
-            (
-                game.file_id,
-                game.pgn,
-                int(getattr(game, "processed", 0)),
-            )
-            for game in games
-        ]
 
-        # Batch insert all games
-        c.executemany(
+def insert_raw_games(cursor: sqlite3.Cursor, games: list[RawGame]) -> list[RawGame]:
+    """Insert raw games using the caller's transaction and set their ids.
+
+    A game whose site is already stored is skipped and keeps id None, so that
+    re-reading part of an archive never duplicates games.
+
+    Returns:
+        The games that were inserted
+    """
+    codec = _get_pgn_codec(cursor)
+    inserted = []
+    for game in games:
+        cursor.execute(
             f"""
-            INSERT INTO {_TABLE_NAME} (file_id, pgn, processed)
-            VALUES (?, ?, ?)
+            INSERT INTO {_TABLE_NAME} (file_id, pgn, processed, game_index, site)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(site) WHERE site IS NOT NULL DO NOTHING
+            RETURNING id
             """,
-            data,
+            (
+                game.file_id,
+                codec.encode(game.pgn) if codec else game.pgn,
+                int(game.processed),
+                game.game_index,
+                game.site,
+            ),
         )
-        conn.commit()
+        row = cursor.fetchone()
+        if row is not None:
+            game.id = row[0]
+            inserted.append(game)
+    if codec is None and inserted:
+        _train_pgn_dictionary(cursor)
+    return inserted
 
 
 def mark_raw_game_as_processed(game: RawGame):
     """Mark a RawGame as processed in the DB."""
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_connection(DB_FILE)
     c = conn.cursor()
     c.execute(f"UPDATE {_TABLE_NAME} SET processed = 1 WHERE id = ?", (game.id,))
     conn.commit()
-    conn.close()
     game.processed = True
 
 
+def mark_raw_games_as_processed(
+    cursor: sqlite3.Cursor, raw_game_ids: list[int], drop_pgn: bool = False
+) -> None:
+    """Mark raw games as processed using the caller's transaction.
+
+    Ids are sent in chunks of one UPDATE ... WHERE id IN (...) each, staying below
+    SQLite's bound-parameter limit.
+
+    Args:
+        cursor: Cursor of the caller's transaction
+        raw_game_ids: IDs of the processed games
+        drop_pgn: Also replace their PGN text with an empty string
+    """
+    assignments = "processed = 1, pgn = ''" if drop_pgn else "processed = 1"
+    for start in range(0, len(raw_game_ids), _MAX_SQL_PARAMS):
+        chunk = raw_game_ids[start : start + _MAX_SQL_PARAMS]
+        placeholders = ",".join("?" * len(chunk))
+        cursor.execute(
+            f"UPDATE {_TABLE_NAME} SET {assignments} WHERE id IN ({placeholders})", chunk
+        )
+
+
+def drop_processed_pgn(batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Replace the PGN text of every processed game with an empty string.
+
+    Statistics and snapshots are extracted from a game once, so its PGN is dead weight
+    afterwards; file_id and game_index still locate it in its archive. Games are
+    cleared in id-ordered batches of one transaction each.
+
+    Returns:
+        Number of games whose PGN was dropped
+    """
+    dropped = 0
+    last_id = 0
+    while True:
+        with get_connection(DB_FILE) as conn:
+            c = conn.cursor()
+            c.execute(
+                f"SELECT id FROM {_TABLE_NAME} "
+                "WHERE id > ? AND processed = 1 AND pgn != '' ORDER BY id LIMIT ?",
+                (last_id, batch_size),
+            )
+            ids = [row[0] for row in c.fetchall()]
+            if not ids:
+                return dropped
+            mark_raw_games_as_processed(c, ids, drop_pgn=True)
+        dropped += len(ids)
+        last_id = ids[-1]
+
+
 def fetch_raw_games(file_id: int | None = None) -> list[RawGame]:
     """Fetch all raw games, optionally filtered by file_id."""
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_connection(DB_FILE)
     c = conn.cursor()
-    try:
-        if file_id is not None:
-            c.execute(
-                f"SELECT id, file_id, pgn, processed FROM {_TABLE_NAME} WHERE file_id = ?",
-                (file_id,),
-            )
-        else:
-            c.execute(f"SELECT id, file_id, pgn, processed FROM {_TABLE_NAME}")
-        rows = c.fetchall()
-    finally:
-        conn.close()
-    return [_row_to_raw_game(row) for row in rows]
+    if file_id is not None:
+        c.execute(
+            f"SELECT {_COLUMNS} FROM {_TABLE_NAME} WHERE file_id = ?",
+            (file_id,),
+        )
+    else:
+        c.execute(f"SELECT {_COLUMNS} FROM {_TABLE_NAME}")
+    rows = c.fetchall()
+    codec = _get_pgn_codec(c)
+    return [_row_to_raw_game(row, codec) for row in rows]
 
 
-def get_raw_snapshots_batch(offset: int, batch_size: int) -> list[tuple]:
-    """Get a batch of raw snapshot data for processing.
+def get_raw_snapshots_batch(after_id: int, batch_size: int) -> list[tuple]:
+    """Get the next batch of raw snapshot data for processing.
 
     Args:
-        offset: Starting offset for the query
+        after_id: Snapshot id the previous batch ended at (0 to start from the beginning)
         batch_size: Number of rows to fetch
 
     Returns:
-        List of tuples: (id, fen, move, turn, white_elo, black_elo, result)
+        List of tuples: (id, position, move_code, turn, white_elo, black_elo, result)
     """
-    with sqlite3.connect(DB_FILE) as conn:
+    with get_connection(DB_FILE) as conn:
         cur = conn.cursor()
         cur.execute(
             """
-            SELECT gs.id, gs.fen, gs.move, gs.turn,
-                   gst.white_elo, gst.black_elo, gst.result
-            FROM game_snapshots gs
-            JOIN game_statistics gst ON gs.raw_game_id = gst.raw_game_id
-            ORDER BY gs.id
-            LIMIT ? OFFSET ?
+            SELECT id, position, move_code, turn, white_elo, black_elo, result
+            FROM game_snapshots
+            WHERE id > ? AND result IS NOT NULL
+            ORDER BY id
+            LIMIT ?
             """,
-            (batch_size, offset),
+            (after_id, batch_size),
         )
         return cur.fetchall()
 
 
-def fetch_unprocessed_raw_games(file_id: int | None = None) -> Iterator[RawGame]:
-    """Yield RawGame objects that have not yet been processed into snapshots."""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    try:
+def fetch_unprocessed_raw_games(
+    file_id: int | None = None, batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[RawGame]:
+    """Yield RawGame objects that have not yet been processed into snapshots.
+
+    Rows are read in id-ordered pages of ``batch_size`` so that neither a whole file's
+    games are held in memory nor a read cursor is kept open while callers write.
+    """
+    last_id = 0
+    while True:
+        conn = get_connection(DB_FILE)
+        c = conn.cursor()
         if file_id is not None:
             c.execute(
-                f"SELECT id, file_id, pgn, processed FROM {_TABLE_NAME} WHERE file_id = ? AND processed = 0",
-                (file_id,),
+                f"SELECT {_COLUMNS} FROM {_TABLE_NAME} "
+                "WHERE file_id = ? AND processed = 0 AND id > ? ORDER BY id LIMIT ?",
+                (file_id, last_id, batch_size),
             )
         else:
-            c.execute(f"SELECT id, file_id, pgn, processed FROM {_TABLE_NAME} WHERE processed = 0")
+            c.execute(
+                f"SELECT {_COLUMNS} FROM {_TABLE_NAME} "
+                "WHERE processed = 0 AND id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size),
+            )
         rows = c.fetchall()
-    finally:
-        conn.close()
-    for row in rows:
-        yield _row_to_raw_game(row)
+
+        if not rows:
+            return
+        codec = _get_pgn_codec(c)
+        for row in rows:
+            yield _row_to_raw_game(row, codec)
+        last_id = rows[-1][0]
+
+
+def _row_to_raw_game(row: tuple, codec: "_PgnCodec | None") -> RawGame:
+    """Convert a database row tuple into a RawGame object, decompressing its PGN."""
+    return RawGame(
+        id=row[0],
+        file_id=row[1],
+        pgn=codec.decode(row[2]) if codec else row[2],
+        processed=bool(row[3]),
+        game_index=row[4],
+        site=row[5],
+    )
+
+
+def _get_pgn_codec(cursor: sqlite3.Cursor) -> _PgnCodec | None:
+    """Return the codec of the database's PGN dictionary, or None before it is trained.
+
+    Codecs are cached per thread; the dictionary id read here keeps a cached codec
+    from being used with another database at the same path.
+    """
+    row = cursor.execute(f"SELECT dict_id FROM {_DICTIONARY_TABLE_NAME}").fetchone()
+    if row is None:
+        return None
+
+    codecs: dict[tuple[str, int], _PgnCodec] = _thread_state().codecs
+    key = (str(DB_FILE), row[0])
+    if key not in codecs:
+        cursor.execute(f"SELECT data FROM {_DICTIONARY_TABLE_NAME}")
+        codecs[key] = _PgnCodec.from_dictionary(cursor.fetchone()[0])
+    return codecs[key]
+
+
+def _train_pgn_dictionary(cursor: sqlite3.Cursor) -> None:
+    """Train the PGN dictionary once the table holds enough games stored without one.
+
+    Uses the caller's transaction. The games are counted in the table, so they may
+    come from any number of runs. If training fails (e.g. on too little text) it is
+    retried on the next insert.
+    """
+    cursor.execute(
+        f"SELECT pgn FROM {_TABLE_NAME} WHERE typeof(pgn) = 'text' AND pgn != '' "
+        "ORDER BY id DESC LIMIT ?",
+        (_DICTIONARY_SAMPLES,),
+    )
+    samples = [row[0].encode("utf-8") for row in cursor.fetchall()]
+    if len(samples) < _DICTIONARY_SAMPLES:
+        return
+    try:
+        dictionary = zstd.train_dictionary(_DICTIONARY_SIZE, samples)
+    except zstd.ZstdError as e:
+        print(f"Warning: Could not train the PGN dictionary yet: {e}")
+        return
+    cursor.execute(
+        f"INSERT OR IGNORE INTO {_DICTIONARY_TABLE_NAME} (id, dict_id, data) VALUES (1, ?, ?)",
+        (dictionary.dict_id(), dictionary.as_bytes()),
+    )
 
 
-def _row_to_raw_game(row: tuple) -> RawGame:
-    """Convert a database row tuple into a RawGame object."""
-    return RawGame(id=row[0], file_id=row[1], pgn=row[2], processed=bool(row[3]))
+def _thread_state() -> threading.local:
+    if not hasattr(_local, "codecs"):
+        _local.codecs = {}
+    return _local
@@ -0,0 +1,61 @@
+"""Row counters maintained alongside inserts so counts never need a full table scan.
+
+The helpers take the caller's cursor: counters are updated in the same transaction as
+the rows they count and live in whichever database the caller is connected to.
+"""
+
+import sqlite3
+
+_TABLE_NAME = "row_counts"
+
+
+def create_row_counts_table(cursor: sqlite3.Cursor) -> None:
+    """Create the 'row_counts' table if it does not exist."""
+    cursor.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {_TABLE_NAME} (
+            table_name TEXT PRIMARY KEY,
+            row_count INTEGER NOT NULL
+        )
+        """
+    )
+
+
+def add_to_row_count(cursor: sqlite3.Cursor, table_name: str, delta: int) -> None:
+    """Add delta to a table's counter; call after inserting, before committing.
+
+    A missing counter (e.g. a table filled before counters existed) is seeded with a
+    single COUNT(*), which already includes the rows just inserted.
+    """
+    cursor.execute(
+        f"UPDATE {_TABLE_NAME} SET row_count = row_count + ? WHERE table_name = ?",
+        (delta, table_name),
+    )
+    if cursor.rowcount == 0:
+        seed_row_count(cursor, table_name)
+
+
+def seed_row_count(cursor: sqlite3.Cursor, table_name: str) -> None:
+    """Start a table's counter from a COUNT(*) of its rows, unless it already has one."""
+    cursor.execute(
+        f"""
+        INSERT OR IGNORE INTO {_TABLE_NAME} (table_name, row_count)
+        SELECT ?, COUNT(*) FROM {table_name}
+        """,
+        (table_name,),
+    )
+
+
+def get_row_count(cursor: sqlite3.Cursor, table_name: str) -> int:
+    """Return a table's row count in O(1).
+
+    Counters are seeded when their table is created. Without one this falls back to a
+    COUNT(*) and writes nothing, so a transaction the caller has open is left alone.
+    """
+    cursor.execute(f"SELECT row_count FROM {_TABLE_NAME} WHERE table_name = ?", (table_name,))
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+        row = cursor.fetchone()
+    count: int = row[0]
+    return count
@@ -0,0 +1,252 @@
+"""On-disk cache of Lichess .pgn.zst archives.
+
+Archives are streamed to ``<filename>.part`` while they are being read, so an interrupted
+download (dropped connection, early stop) resumes with an HTTP Range request from the
+bytes already on disk. Completed archives are renamed into place and the least recently
+used ones are evicted to stay under the disk budget.
+"""
+
+import os
+import re
+from pathlib import Path
+from typing import BinaryIO
+
+import requests
+
+from packages.train.src.constants import ARCHIVE_CACHE_DIR, ARCHIVE_CACHE_MAX_GB, CHUNK_SIZE
+from packages.train.src.dataset.models.file_metadata import FileMetadata
+
+_PART_SUFFIX = ".part"
+_ARCHIVE_GLOB = "*.pgn.zst"
+# FileMetadata.size_gb is rounded to two decimals
+_SIZE_TOLERANCE_GB = 0.01
+_CONTENT_RANGE_TOTAL = re.compile(r"/(\d+)$")
+
+
+class ArchiveCache:
+    """Stores downloaded archives locally and serves them without network I/O.
+
+    Args:
+        directory: Directory holding cached archives (created on first use)
+        max_size_gb: Disk budget; least recently used archives are evicted above it
+        chunk_size: Number of bytes requested per network read
+    """
+
+    def __init__(
+        self,
+        directory: str | Path = ARCHIVE_CACHE_DIR,
+        max_size_gb: float = ARCHIVE_CACHE_MAX_GB,
+        chunk_size: int = CHUNK_SIZE,
+    ):
+        self.directory = Path(directory)
+        self.max_size_gb = max_size_gb
+        self.chunk_size = chunk_size
+
+    def path_for(self, file_meta: FileMetadata) -> Path:
+        """Return the path a completed archive is stored at."""
+        return self.directory / file_meta.filename
+
+    def is_cached(self, file_meta: FileMetadata) -> bool:
+        """Return True if the complete archive is available locally."""
+        return self.path_for(file_meta).exists()
+
+    def open(self, file_meta: FileMetadata) -> "ArchiveReader":
+        """Open an archive for sequential reading, downloading missing bytes on demand.
+
+        Bytes already on disk are served first; the network is only contacted once
+        they are exhausted. Closing the reader early keeps the partial file so that the
+        next call resumes where this one stopped.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.path_for(file_meta)
+        if path.exists():
+            _touch(path)
+            return ArchiveReader(self, file_meta, path, complete=True)
+        return ArchiveReader(self, file_meta, _part_path(path), complete=False)
+
+    def fetch(self, file_meta: FileMetadata) -> Path:
+        """Make sure the complete archive is cached and return its path."""
+        with self.open(file_meta) as reader:
+            while reader.read(self.chunk_size):
+                pass
+        return self.path_for(file_meta)
+
+    def evict(self, keep: Path | None = None) -> list[Path]:
+        """Delete least recently used archives until the cache fits its budget.
+
+        Args:
+            keep: Archive that must not be evicted (e.g. the one just downloaded)
+
+        Returns:
+            Paths of the evicted archives
+        """
+        if not self.directory.exists():
+            return []
+
+        budget = self.max_size_gb * 1024**3
+        entries = [p for p in self.directory.iterdir() if p.is_file()]
+        total = sum(p.stat().st_size for p in entries)
+
+        evicted = []
+        archives = sorted(self.directory.glob(_ARCHIVE_GLOB), key=lambda p: p.stat().st_mtime)
+        for archive in archives:
+            if total <= budget:
+                break
+            if keep is not None and archive == keep:
+                continue
+            total -= archive.stat().st_size
+            archive.unlink()
+            evicted.append(archive)
+            print(f"Evicted {archive.name} from the archive cache.")
+        return evicted
+
+    def _finalize(self, file_meta: FileMetadata, part: Path, expected_bytes: int | None) -> None:
+        """Verify a finished download, move it into place and enforce the budget."""
+        actual_bytes = part.stat().st_size
+        if expected_bytes is not None and actual_bytes != expected_bytes:
+            raise ValueError(
+                f"Incomplete download of {file_meta.filename}: "
+                f"{actual_bytes} of {expected_bytes} bytes"
+            )
+        if file_meta.size_gb and abs(actual_bytes / 1024**3 - file_meta.size_gb) > (
+            _SIZE_TOLERANCE_GB
+        ):
+            part.unlink()
+            raise ValueError(
+                f"Size mismatch for {file_meta.filename}: expected {file_meta.size_gb} GB, "
+                f"got {actual_bytes / 1024**3:.2f} GB"
+            )
+
+        path = self.path_for(file_meta)
+        part.replace(path)
+        _touch(path)
+        self.evict(keep=path)
+
+
+class ArchiveReader:
+    """File-like reader that serves cached bytes first and tees network bytes to disk."""
+
+    def __init__(self, cache: ArchiveCache, file_meta: FileMetadata, path: Path, complete: bool):
+        self._cache = cache
+        self._file_meta = file_meta
+        self._path = path
+        self._complete = complete
+        self._local = path.open("rb") if path.exists() else None
+        self._response: requests.Response | None = None
+        self._sink: BinaryIO | None = None
+        self._expected_bytes: int | None = None
+
+    def read(self, size: int = -1) -> bytes:
+        if self._local is not None:
+            data = self._local.read(size)
+            if data:
+                return data
+            self._local.close()
+            self._local = None
+
+        if self._complete:
+            return b""
+
+        if self._response is None and not self._start_download():
+            return b""
+
+        assert self._response is not None and self._sink is not None
+        data = self._response.raw.read(size if size > 0 else self._cache.chunk_size)
+        if data:
+            self._sink.write(data)
+            return data
+
+        self._finish_download()
+        return b""
+
+    def _start_download(self) -> bool:
+        """Request the missing byte range. Returns False if nothing is left to download."""
+        offset = self._path.stat().st_size if self._path.exists() else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        response = requests.get(self._file_meta.url, headers=headers, stream=True)
+
+        if response.status_code == 416:
+            # The partial file already holds every byte; only the rename is missing
+            response.close()
+            self._complete = True
+            self._cache._finalize(self._file_meta, self._path, None)
+            return False
+
+        if response.status_code not in (200, 206):
+            response.close()
+            raise requests.HTTPError(
+                f"Failed to download {self._file_meta.filename} (status {response.status_code})",
+                response=response,
+            )
+
+        if response.status_code == 200 and offset:
+            # The server ignored the Range header; the cached bytes were already served
+            print(f"Server does not support resuming {self._file_meta.filename}; re-reading.")
+            _discard(response, offset)
+        elif offset:
+            print(f"Resuming {self._file_meta.filename} from byte {offset}...")
+
+        self._expected_bytes = _total_size(response, offset)
+        self._sink = self._path.open("ab")
+        self._response = response
+        return True
+
+    def _finish_download(self) -> None:
+        assert self._sink is not None
+        self._sink.close()
+        self._sink = None
+        self._close_response()
+        self._complete = True
+        self._cache._finalize(self._file_meta, self._path, self._expected_bytes)
+
+    def _close_response(self) -> None:
+        if self._response is not None:
+            self._response.close()
+            self._response = None
+
+    def close(self) -> None:
+        """Close local and network handles, keeping any partial download for resuming."""
+        if self._local is not None:
+            self._local.close()
+            self._local = None
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+        self._close_response()
+
+    def __enter__(self) -> "ArchiveReader":
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self.close()
+
+
+def _part_path(path: Path) -> Path:
+    return path.with_name(path.name + _PART_SUFFIX)
+
+
+def _touch(path: Path) -> None:
+    """Mark an archive as recently used (mtime drives LRU eviction)."""
+    os.utime(path)
+
+
+def _discard(response: requests.Response, num_bytes: int) -> None:
+    """Skip the first num_bytes of a response body."""
+    while num_bytes > 0:
+        data = response.raw.read(min(num_bytes, CHUNK_SIZE))
+        if not data:
+            break
+        num_bytes -= len(data)
+
+
+def _total_size(response: requests.Response, offset: int) -> int | None:
+    """Return the full archive size announced by the server, if any."""
+    content_range = response.headers.get("Content-Range")
+    if content_range:
+        match = _CONTENT_RANGE_TOTAL.search(content_range)
+        if match:
+            return int(match.group(1))
+    content_length = response.headers.get("Content-Length")
+    if content_length is None:
+        return None
+    return int(content_length) + (offset if response.status_code == 206 else 0)
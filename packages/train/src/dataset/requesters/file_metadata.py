@@ -1,56 +1,188 @@
 import re
-from collections.abc import Iterator
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from urllib.parse import urljoin
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from packages.train.src.constants import LICHESS_BASE_URL
+from packages.train.src.constants import LICHESS_BASE_URL, METADATA_WORKERS
 from packages.train.src.dataset.models.file_metadata import FileMetadata
 
 _BASE_URL = LICHESS_BASE_URL
 _COUNTS_URL = urljoin(_BASE_URL, "counts.txt")
 
+# (ETag, Last-Modified) of a previously fetched resource
+Validators = tuple[str | None, str | None]
 
-def fetch_files_metadata() -> Iterator[FileMetadata]:
+
+@dataclass
+class MetadataChanges:
+    """Result of an incremental metadata refresh.
+
+    Attributes:
+        new_files: Metadata for archives that were not known before
+        counts: Game counts per filename, empty if counts.txt did not change
+        validators: Validators of every resource that was downloaded, keyed by URL
+    """
+
+    new_files: list[FileMetadata] = field(default_factory=list)
+    counts: dict[str, int] = field(default_factory=dict)
+    validators: dict[str, Validators] = field(default_factory=dict)
+
+
+def fetch_files_metadata(max_workers: int = METADATA_WORKERS) -> Iterator[FileMetadata]:
     """
     Fetch metadata about all standard Lichess files.
 
+    File sizes are read with HEAD requests that run concurrently on a bounded thread
+    pool and reuse the connections of a shared session.
+
+    Args:
+        max_workers: Maximum number of concurrent HEAD requests
+
     Yields:
-        FileMetadata: Metadata for each .pgn.zst file.
+        FileMetadata: Metadata for each .pgn.zst file, in directory listing order.
+    """
+    with _make_session(max_workers) as session:
+        # --- Fetch counts.txt to get game counts ---
+        counts_resp = session.get(_COUNTS_URL)
+        counts_resp.raise_for_status()
+        counts = _parse_counts(counts_resp.text)
+
+        # --- Fetch standard directory page ---
+        resp = session.get(_BASE_URL)
+        resp.raise_for_status()
+        file_names = _parse_file_names(resp.text)
+
+        yield from _fetch_metadata(session, file_names, counts, max_workers)
+
+
+def fetch_files_metadata_changes(
+    known_filenames: Iterable[str],
+    validators: dict[str, Validators],
+    max_workers: int = METADATA_WORKERS,
+) -> MetadataChanges | None:
     """
-    # --- Fetch counts.txt to get game counts ---
-    counts_resp = requests.get(_COUNTS_URL)
-    counts_resp.raise_for_status()
+    Fetch only what changed since the last refresh.
+
+    counts.txt and the directory listing are requested with If-None-Match /
+    If-Modified-Since built from the stored validators, and HEAD requests are sent only
+    for filenames that are not known yet.
+
+    Args:
+        known_filenames: Filenames already stored in files_metadata
+        validators: Stored (ETag, Last-Modified) pairs keyed by URL
+        max_workers: Maximum number of concurrent HEAD requests
+
+    Returns:
+        The changes, or None if neither counts.txt nor the listing changed.
+    """
+    with _make_session(max_workers) as session:
+        counts_resp = _conditional_get(session, _COUNTS_URL, validators.get(_COUNTS_URL))
+        listing_resp = _conditional_get(session, _BASE_URL, validators.get(_BASE_URL))
+        if counts_resp is None and listing_resp is None:
+            return None
+
+        changes = MetadataChanges()
+        if counts_resp is not None:
+            changes.counts = _parse_counts(counts_resp.text)
+            changes.validators[_COUNTS_URL] = _validators_of(counts_resp)
+        if listing_resp is None:
+            return changes
+        changes.validators[_BASE_URL] = _validators_of(listing_resp)
 
+        known = set(known_filenames)
+        new_names = [name for name in _parse_file_names(listing_resp.text) if name not in known]
+        if new_names and counts_resp is None:
+            # The new archives need game counts even though counts.txt is unchanged
+            counts_resp = _conditional_get(session, _COUNTS_URL, None)
+            assert counts_resp is not None
+            counts = _parse_counts(counts_resp.text)
+        else:
+            counts = changes.counts
+
+        changes.new_files = list(_fetch_metadata(session, new_names, counts, max_workers))
+        return changes
+
+
+def _make_session(pool_size: int) -> requests.Session:
+    """Create a session whose connection pool can serve every worker at once."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _conditional_get(
+    session: requests.Session, url: str, validators: Validators | None
+) -> requests.Response | None:
+    """GET url unless it is unchanged since validators were recorded (returns None)."""
+    headers = {}
+    if validators is not None:
+        etag, last_modified = validators
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+    resp = session.get(url, headers=headers)
+    if resp.status_code == 304:
+        return None
+    resp.raise_for_status()
+    return resp
+
+
+def _validators_of(resp: requests.Response) -> Validators:
+    return resp.headers.get("ETag"), resp.headers.get("Last-Modified")
+
+
+def _parse_counts(text: str) -> dict[str, int]:
+    """Parse counts.txt into a filename -> number of games mapping."""
     counts: dict[str, int] = {}
-    for line in counts_resp.text.strip().splitlines():
+    for line in text.strip().splitlines():
         parts = line.split()
         if len(parts) == 2:
             filename, games = parts
             counts[filename] = int(games.replace(",", ""))
+    return counts
 
-    # --- Fetch standard directory page ---
-    resp = requests.get(_BASE_URL)
-    resp.raise_for_status()
-    html = resp.text
 
-    # --- Extract .pgn.zst files ---
-    file_names = re.findall(r'href="(lichess_db_standard_rated_[^"]+\.pgn\.zst)"', html)
+def _parse_file_names(html: str) -> list[str]:
+    """Extract .pgn.zst filenames from the directory listing."""
+    return re.findall(r'href="(lichess_db_standard_rated_[^"]+\.pgn\.zst)"', html)
 
-    for filename in file_names:
-        file_url = urljoin(_BASE_URL, filename)
 
-        # Get file size from HEAD request
-        head_resp = requests.head(file_url)
-        size_gb = int(head_resp.headers.get("Content-Length", 0)) / (1024**3)
+def _fetch_metadata(
+    session: requests.Session, file_names: list[str], counts: dict[str, int], max_workers: int
+) -> Iterator[FileMetadata]:
+    """HEAD every file concurrently and yield its metadata in file_names order."""
 
-        yield FileMetadata(
+    def build_metadata(filename: str) -> FileMetadata:
+        file_url = urljoin(_BASE_URL, filename)
+        return FileMetadata(
             url=file_url,
             filename=filename,
             games=counts.get(filename, 0),
-            size_gb=round(size_gb, 2),
+            size_gb=_fetch_size_gb(session, file_url),
         )
 
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        yield from executor.map(build_metadata, file_names)
+    finally:
+        # Don't wait on HEAD requests nobody will read when the caller stops early
+        executor.shutdown(cancel_futures=True)
+
+
+def _fetch_size_gb(session: requests.Session, file_url: str) -> float:
+    """Get a file's size from a HEAD request, rounded to two decimals."""
+    head_resp = session.head(file_url)
+    size_gb = int(head_resp.headers.get("Content-Length", 0)) / (1024**3)
+    return round(size_gb, 2)
+
 
 if __name__ == "__main__":
     files_metadata_iter = fetch_files_metadata()
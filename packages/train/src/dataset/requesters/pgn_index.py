@@ -0,0 +1,202 @@
+"""Byte-offset index of local PGN archives, for random access to single games.
+
+index_pgn_archive scans a .pgn or .pgn.zst file once and stores the offset, length and
+key headers of every game in the pgn_offsets table. A plain .pgn is indexed in place.
+A .pgn.zst is a single stream that can only be read from the start, so it is re-chunked
+into ``<name>.pgn.seekable.zst``: a sequence of independent zstd frames of about
+``frame_size`` decompressed bytes, each holding whole games. The result is still a
+valid .zst of the same PGN, and fetching a game decompresses one frame only.
+
+Game indexes are numbered like RawGame.game_index, so (archive, game_index) locates
+the text of a raw game whose PGN was dropped from the database.
+"""
+
+from collections.abc import Iterator
+from itertools import islice
+from pathlib import Path
+from typing import BinaryIO
+
+import zstandard as zstd
+
+from packages.train.src.constants import CHUNK_SIZE, DB_FILE, PGN_INDEX_FRAME_SIZE
+from packages.train.src.dataset.models.pgn_offset import PgnOffset
+from packages.train.src.dataset.parse_utils import parse_int
+from packages.train.src.dataset.processers.ingest_filter import parse_headers
+from packages.train.src.dataset.repositories.connection import get_connection
+from packages.train.src.dataset.repositories.pgn_offsets import (
+    delete_pgn_offsets,
+    fetch_pgn_offset,
+    insert_pgn_offsets,
+    rename_pgn_offsets,
+)
+from packages.train.src.dataset.requesters.raw_games import iter_pgn_game_spans
+
+_ZST_SUFFIX = ".pgn.zst"
+# Does not match the archive cache's *.pgn.zst glob, so the copy is never evicted
+_SEEKABLE_SUFFIX = ".pgn.seekable.zst"
+_FRAME_LEVEL = 9  # Archives are re-chunked once and read many times
+_INSERT_BATCH = 10_000
+_GAME_SEPARATOR = b"\n\n"
+
+
+def seekable_path(path: str | Path) -> Path:
+    """Return the path of the seekable copy written for a .pgn.zst archive."""
+    path = Path(path)
+    return path.with_name(path.name.removesuffix(_ZST_SUFFIX) + _SEEKABLE_SUFFIX)
+
+
+def index_pgn_archive(
+    path: str | Path,
+    frame_size: int = PGN_INDEX_FRAME_SIZE,
+    buffer_size: int = CHUNK_SIZE,
+) -> Path:
+    """Index every game of a local archive, replacing any previous index of it.
+
+    Args:
+        path: .pgn file, or .pgn.zst archive to re-chunk into seekable frames
+        frame_size: Decompressed bytes per zstd frame (a frame ends on a game boundary)
+        buffer_size: Number of bytes read from the archive at a time
+
+    Returns:
+        Path of the indexed archive, to pass to read_indexed_game
+
+    Raises:
+        ValueError: If the file is neither a .pgn nor a .pgn.zst
+    """
+    path = Path(path)
+    if path.name.endswith(_ZST_SUFFIX):
+        archive = seekable_path(path)
+        part = archive.with_name(archive.name + ".part")
+        with (
+            path.open("rb") as source,
+            zstd.ZstdDecompressor().stream_reader(source, read_across_frames=True) as reader,
+            part.open("wb") as sink,
+        ):
+            offsets = _rechunk(str(part), reader, sink, frame_size, buffer_size)
+            count = _save_index(str(part), offsets)
+        _replace_indexed_archive(part, archive)
+    elif path.suffix == ".pgn":
+        archive = path
+        with path.open("rb") as reader:
+            offsets = (
+                _pgn_offset(str(archive), game_index, offset, game)
+                for game_index, (offset, game) in enumerate(
+                    iter_pgn_game_spans(reader, buffer_size)
+                )
+            )
+            count = _save_index(str(archive), offsets)
+    else:
+        raise ValueError(f"Expected a .pgn or {_ZST_SUFFIX} archive, got {path}")
+
+    print(f"Indexed {count} games of {path.name} into {archive.name}")
+    return archive
+
+
+def read_indexed_game(archive: str | Path, game_index: int) -> str | None:
+    """Read one game of an indexed archive, or None if it is not indexed.
+
+    Costs one primary key lookup and one read (plus decompressing one frame for a
+    seekable .zst), whatever the position of the game in the archive.
+    """
+    location = fetch_pgn_offset(str(archive), game_index)
+    if location is None:
+        return None
+
+    with open(archive, "rb") as f:
+        if location.frame_offset is None:
+            f.seek(location.offset)
+            data = f.read(location.length)
+        else:
+            f.seek(location.frame_offset)
+            frame = zstd.ZstdDecompressor().decompress(f.read(location.frame_length))
+            data = frame[location.offset : location.offset + location.length]
+    return data.decode("utf-8")
+
+
+def _rechunk(
+    archive: str, reader: BinaryIO, sink: BinaryIO, frame_size: int, buffer_size: int
+) -> Iterator[PgnOffset]:
+    """Write the games of reader to sink as independent frames, yielding their offsets.
+
+    Offsets are yielded once their frame is written, as only then is its compressed
+    position known.
+    """
+    compressor = zstd.ZstdCompressor(level=_FRAME_LEVEL, write_content_size=True)
+    frame = bytearray()
+    pending: list[PgnOffset] = []
+    frame_offset = 0
+
+    for game_index, (_, game) in enumerate(iter_pgn_game_spans(reader, buffer_size)):
+        pending.append(_pgn_offset(archive, game_index, len(frame), game))
+        frame += game + _GAME_SEPARATOR
+        if len(frame) >= frame_size:
+            frame_offset += _write_frame(compressor, sink, frame, pending, frame_offset)
+            yield from pending
+            frame.clear()
+            pending = []
+
+    if pending:
+        _write_frame(compressor, sink, frame, pending, frame_offset)
+        yield from pending
+
+
+def _write_frame(
+    compressor: zstd.ZstdCompressor,
+    sink: BinaryIO,
+    frame: bytearray,
+    offsets: list[PgnOffset],
+    frame_offset: int,
+) -> int:
+    """Compress frame into sink, point offsets at it and return its compressed size."""
+    compressed = compressor.compress(bytes(frame))
+    sink.write(compressed)
+    for offset in offsets:
+        offset.frame_offset = frame_offset
+        offset.frame_length = len(compressed)
+    return len(compressed)
+
+
+def _save_index(archive: str, offsets: Iterator[PgnOffset]) -> int:
+    """Replace the index of an archive with offsets, committing in batches."""
+    conn = get_connection(DB_FILE)
+    with conn:
+        delete_pgn_offsets(conn.cursor(), archive)
+
+    count = 0
+    while batch := list(islice(offsets, _INSERT_BATCH)):
+        with conn:
+            insert_pgn_offsets(conn.cursor(), batch)
+        count += len(batch)
+    return count
+
+
+def _replace_indexed_archive(part: Path, archive: Path) -> None:
+    """Move a copy indexed under its .part name, and its index, to the archive path.
+
+    The previous index is dropped before the file is replaced and the new one is moved
+    to the archive key after, so a crash in between leaves the archive unindexed rather
+    than pointing at offsets of another file.
+    """
+    conn = get_connection(DB_FILE)
+    with conn:
+        delete_pgn_offsets(conn.cursor(), str(archive))
+    part.replace(archive)
+    with conn:
+        rename_pgn_offsets(conn.cursor(), str(part), str(archive))
+
+
+def _pgn_offset(archive: str, game_index: int, offset: int, game: bytes) -> PgnOffset:
+    header_end = game.find(_GAME_SEPARATOR)
+    header_block = game if header_end == -1 else game[:header_end]
+    headers = parse_headers(header_block.decode("utf-8", errors="replace"))
+    return PgnOffset(
+        archive=archive,
+        game_index=game_index,
+        offset=offset,
+        length=len(game),
+        event=headers.get("Event"),
+        site=headers.get("Site"),
+        white_elo=parse_int(headers.get("WhiteElo")),
+        black_elo=parse_int(headers.get("BlackElo")),
+        result=headers.get("Result"),
+    )
@@ -1,65 +1,185 @@
-from collections.abc import Iterator
+from collections.abc import Generator, Iterator
+from typing import BinaryIO, cast
 
 import requests
 import zstandard as zstd
 
-from packages.train.src.constants import CHUNK_SIZE, DEFAULT_MAX_FILES
+from packages.train.src.constants import CHUNK_SIZE, DEFAULT_BATCH_SIZE, DEFAULT_MAX_FILES
 from packages.train.src.dataset.models.file_metadata import FileMetadata
 from packages.train.src.dataset.models.raw_game import RawGame
+from packages.train.src.dataset.processers.ingest_filter import IngestFilter, parse_headers
 from packages.train.src.dataset.repositories.files_metadata import (
     fetch_files_metadata_under_size,
     mark_file_as_processed,
 )
-from packages.train.src.dataset.repositories.raw_games import save_raw_game
+from packages.train.src.dataset.repositories.ingest import save_downloaded_games
+from packages.train.src.dataset.requesters.archive_cache import ArchiveCache, ArchiveReader
 
+_EVENT_TAG = b"[Event "
+_GAME_SEPARATOR = b"\n\n" + _EVENT_TAG
 
-def fetch_raw_games_from_file(file_meta: FileMetadata) -> Iterator[RawGame]:
-    """Download, decompress, and parse a Lichess PGN file into RawGame objects."""
-    print(f"Downloading {file_meta.filename} ({file_meta.size_gb} GB)...")
-    response = requests.get(file_meta.url, stream=True)
-    if response.status_code != 200:
-        print(f"ERROR: Failed to download {file_meta.filename} (status {response.status_code})")
-        return
 
-    decompressor = zstd.ZstdDecompressor()
-    with decompressor.stream_reader(response.raw) as reader:  # type: ignore[arg-type]
-        buffer = bytearray()
-        while True:
-            chunk = reader.read(CHUNK_SIZE)
-            if not chunk:
-                break
-            buffer.extend(chunk)
+def fetch_raw_games_from_file(
+    file_meta: FileMetadata,
+    buffer_size: int = CHUNK_SIZE,
+    cache: ArchiveCache | None = None,
+    ingest_filter: IngestFilter | None = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Generator[RawGame, None, None]:
+    """Download, decompress, and parse a Lichess PGN file into RawGame objects.
 
-        decompressed_text = buffer.decode("utf-8")
+    Games are yielded while the file is still being downloaded, so peak memory is
+    bounded by ``buffer_size`` plus ``batch_size`` games. The first
+    ``file_meta.games_consumed`` games were read by an earlier, interrupted run and
+    are skipped. Every ``batch_size`` games read, the accepted ones are stored in the
+    same transaction that advances the file's cursor, so a run killed at any point
+    resumes after the last stored game. Games already stored (same Site URL) are
+    neither stored again nor yielded.
 
-    for pgn in _split_pgn_text_into_games(decompressed_text):
-        raw_game = RawGame(file_id=file_meta.id, pgn=pgn, processed=False)
-        save_raw_game(raw_game)
-        yield raw_game
+    Games rejected by ``ingest_filter`` (checked on the header block only) are
+    neither stored nor yielded.
+
+    When a cache is given the archive is read through it: cached bytes cost no network
+    I/O and a partial download resumes with a Range request.
+    """
+    source: BinaryIO | ArchiveReader
+    if cache is not None:
+        print(f"Reading {file_meta.filename} ({file_meta.size_gb} GB) through the cache...")
+        source = cache.open(file_meta)
+        close = source.close
+    else:
+        print(f"Downloading {file_meta.filename} ({file_meta.size_gb} GB)...")
+        response = requests.get(file_meta.url, stream=True)
+        if response.status_code != 200:
+            print(f"ERROR: Failed to download {file_meta.filename} (status {response.status_code})")
+            response.close()
+            return
+        source = cast(BinaryIO, response.raw)
+        close = response.close
+
+    try:
+        decompressor = zstd.ZstdDecompressor()
+        with decompressor.stream_reader(source) as reader:  # type: ignore[arg-type]
+            games_to_skip = file_meta.games_consumed
+            consumed = games_to_skip
+            pending: list[RawGame] = []
+            try:
+                for index, pgn in enumerate(_iter_pgn_games(reader, buffer_size)):
+                    if index < games_to_skip:
+                        continue
+                    consumed = index + 1
+                    headers = parse_headers(pgn)
+                    if ingest_filter is None or ingest_filter.accepts_headers(headers):
+                        pending.append(
+                            RawGame(
+                                file_id=file_meta.id,
+                                pgn=pgn,
+                                processed=False,
+                                game_index=index,
+                                site=headers.get("Site"),
+                            )
+                        )
+                    if consumed - file_meta.games_consumed >= batch_size:
+                        saved = save_downloaded_games(file_meta, pending, consumed)
+                        pending = []
+                        yield from saved
+
+                saved = save_downloaded_games(file_meta, pending, consumed)
+                pending = []
+                yield from saved
+            finally:
+                # Stopped between two batches: keep the games read so far
+                if consumed > file_meta.games_consumed:
+                    save_downloaded_games(file_meta, pending, consumed)
+    finally:
+        close()
 
 
 def fetch_new_raw_games(
-    max_files: int = DEFAULT_MAX_FILES, max_size_gb: float = 1
-) -> Iterator[RawGame]:
+    max_files: int = DEFAULT_MAX_FILES,
+    max_size_gb: float = 1,
+    cache: ArchiveCache | None = None,
+    ingest_filter: IngestFilter | None = None,
+) -> Generator[RawGame, None, None]:
     """Download unprocessed Lichess files and yield RawGame objects.
 
-    Downloads smallest files first to reduce memory usage.
+    Partially ingested files are resumed first, then the smallest files are downloaded
+    to reduce memory usage. If the caller closes the iterator before a file is
+    exhausted, the HTTP stream is closed and the file is left unprocessed; its cursor
+    (see fetch_raw_games_from_file) makes the next run resume from that point. Games
+    rejected by ``ingest_filter`` still count towards that progress.
     """
     candidate_files = fetch_files_metadata_under_size(max_gb=max_size_gb)
     unprocessed_files = [f for f in candidate_files if not f.processed]
-    unprocessed_files.sort(key=lambda f: f.size_gb)
+    unprocessed_files.sort(key=lambda f: (f.games_consumed == 0, f.size_gb))
     files_to_download = unprocessed_files[:max_files]
 
     for file_meta in files_to_download:
-        for game in fetch_raw_games_from_file(file_meta):  # noqa: UP028
-            yield game
-        mark_file_as_processed(file_meta)
-
-
-def _split_pgn_text_into_games(pgn_text: str) -> Iterator[str]:
-    """Split PGN text into individual games (each starts with '[Event ')."""
-    raw_games = pgn_text.strip().split("\n\n[Event ")
-    for i, raw in enumerate(raw_games):
-        if i > 0:
-            raw = "[Event " + raw
-        yield raw.strip()
+        resumed_from = file_meta.games_consumed
+        completed = False
+        try:
+            yield from fetch_raw_games_from_file(
+                file_meta, cache=cache, ingest_filter=ingest_filter
+            )
+            completed = True
+        finally:
+            if completed:
+                mark_file_as_processed(file_meta)
+            elif file_meta.games_consumed > resumed_from:
+                print(f"Stopped {file_meta.filename} after {file_meta.games_consumed} games.")
+
+
+def _iter_pgn_games(reader: BinaryIO, buffer_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Incrementally split a decompressed PGN stream into games (each starts with '[Event ')."""
+    for _, game in iter_pgn_game_spans(reader, buffer_size):
+        yield game.decode("utf-8")
+
+
+def iter_pgn_game_spans(
+    reader: BinaryIO, buffer_size: int = CHUNK_SIZE
+) -> Iterator[tuple[int, bytes]]:
+    """Incrementally split a PGN byte stream into games, with their position in the stream.
+
+    Reads at most ``buffer_size`` bytes at a time and only keeps the trailing, still
+    incomplete game between reads. Splitting is done on bytes, which is safe because
+    the separator is pure ASCII and never occurs inside a multi-byte UTF-8 sequence.
+
+    Yields:
+        (offset, game) pairs: the game's bytes without surrounding whitespace and the
+        offset of its first byte in the stream
+    """
+    pending = b""
+    pending_offset = 0  # Stream offset of pending[0]
+    while True:
+        chunk = reader.read(buffer_size)
+        if not chunk:
+            break
+        pending += chunk
+
+        *complete, rest = pending.split(_GAME_SEPARATOR)
+        if not complete:
+            continue
+
+        offset = pending_offset
+        for i, raw in enumerate(complete):
+            # Every game after the first one lost its '[Event ' prefix to the split
+            if i > 0:
+                offset -= len(_EVENT_TAG)
+                raw = _EVENT_TAG + raw
+            span = _strip_span(offset, raw)
+            if span is not None:
+                yield span
+            offset += len(raw) + len(_GAME_SEPARATOR)
+        pending = _EVENT_TAG + rest
+        pending_offset = offset - len(_EVENT_TAG)
+
+    span = _strip_span(pending_offset, pending)
+    if span is not None:
+        yield span
+
+
+def _strip_span(offset: int, raw: bytes) -> tuple[int, bytes] | None:
+    game = raw.strip()
+    if not game:
+        return None
+    return offset + len(raw) - len(raw.lstrip()), game
@@ -10,6 +10,10 @@ import sqlite3
 import chess
 
 from packages.train.src.constants import DB_FILE
+from packages.train.src.dataset.codecs.position_codec import (
+    move_code_to_san,
+    position_to_fen,
+)
 
 
 def load_snapshots(limit: int | None = None) -> list[tuple[str, str]]:
@@ -24,7 +28,7 @@ def load_snapshots(limit: int | None = None) -> list[tuple[str, str]]:
     conn = sqlite3.connect(DB_FILE)
     c = conn.cursor()
 
-    query = "SELECT fen, move FROM game_snapshots"
+    query = "SELECT position, move_code FROM game_snapshots"
     if limit is not None:
         query += f" LIMIT {limit}"
 
@@ -32,7 +36,7 @@ def load_snapshots(limit: int | None = None) -> list[tuple[str, str]]:
     rows = c.fetchall()
     conn.close()
 
-    return [(row[0], row[1]) for row in rows]
+    return [(position_to_fen(row[0]), move_code_to_san(row[0], row[1])) for row in rows]
 
 
 def get_random_move(board: chess.Board) -> chess.Move | None:
@@ -33,14 +33,13 @@ def trimmed_accuracy(model_path: str):
         # get snapshots from test set that meet the maia papers requirements
         cur.execute(
             """
-            SELECT gs.id FROM game_snapshots gs
-            JOIN game_statistics gst ON gs.raw_game_id = gst.raw_game_id
-            WHERE gs.id >= ? AND gs.id < ?
-            AND gst.event = 'Rated Blitz game'
-            AND gst.white_elo > 1100 AND gst.white_elo < 1900
-            AND gst.black_elo > 1100 AND gst.black_elo < 1900
-            AND ABS(gst.black_elo - gst.white_elo) < 200
-            AND gs.move_number > 10
+            SELECT id FROM game_snapshots
+            WHERE id >= ? AND id < ?
+            AND event_class = 'Rated Blitz game'
+            AND white_elo > 1100 AND white_elo < 1900
+            AND black_elo > 1100 AND black_elo < 1900
+            AND ABS(black_elo - white_elo) < 200
+            AND move_number > 10
         """,
             (test_set_start, test_set_end),
         )
@@ -4,6 +4,7 @@ import sys
 
 import torch
 
+from packages.train.src.dataset.repositories.connection import use_pragma_profile
 from packages.train.src.models.neural_network import NeuralNetwork
 from packages.train.src.train.trainer import Trainer
 
@@ -38,6 +39,9 @@ def main():
 
     config = load_config(config_path)
 
+    # Training only reads the database
+    use_pragma_profile("read")
+
     starting_model = NeuralNetwork()
 
     # load a user specified model as the starting point for further training
@@ -14,7 +14,10 @@ from packages.train.src.constants import (
     EPOCH_INFO_FILE_NAME,
     FINAL_SAVES_DIR,
 )
-from packages.train.src.dataset.loaders.game_snapshots import GameSnapshotsDataset
+from packages.train.src.dataset.loaders.game_snapshots import (
+    GameSnapshotsDataset,
+    collate_snapshots,
+)
 from packages.train.src.dataset.pipeline import pipeline
 from packages.train.src.models.neural_network import NeuralNetwork
 
@@ -136,6 +139,7 @@ class Trainer:
             shuffle=True,
             num_workers=self.num_workers,
             pin_memory=(self.device.type == "cuda"),
+            collate_fn=collate_snapshots,
         )
 
         return dataloader
@@ -181,7 +185,7 @@ class Trainer:
         for epoch in range(self.num_epochs):
             self.model.train()
 
-            for _batch, ((board, metadata), (chosen_move, legal_moves)) in enumerate(
+            for _batch, ((board, metadata), (chosen_move, (legal_rows, legal_moves))) in enumerate(
                 self.train_dataloader
             ):
                 # batch_x is a tuple (metadata, board), need to handle each component
@@ -189,14 +193,19 @@ class Trainer:
                 metadata = metadata.to(self.device, non_blocking=non_blocking)
                 board = board.to(self.device, non_blocking=non_blocking)
                 chosen_move = chosen_move.to(self.device, non_blocking=non_blocking)
-                legal_moves = legal_moves.to(self.device, non_blocking=non_blocking).float()
+                legal_rows = legal_rows.to(self.device, non_blocking=non_blocking)
+                legal_moves = legal_moves.to(self.device, non_blocking=non_blocking)
 
                 optimizer.zero_grad()
                 predicted_chosen, predicted_valid = self.model(metadata, board)
 
+                # The legal moves arrive sparse; the dense target only exists per batch
+                legal_target = torch.zeros_like(predicted_valid)
+                legal_target[legal_rows, legal_moves] = 1.0
+
                 # calculate loss
                 move_loss = self.move_criterion(predicted_chosen, chosen_move)
-                legal_loss = self.legal_criterion(predicted_valid, legal_moves)
+                legal_loss = self.legal_criterion(predicted_valid, legal_target)
                 loss = move_loss + legal_loss
 
                 # calculate accuracy
@@ -207,7 +216,7 @@ class Trainer:
 
                 legal_preds = (torch.sigmoid(predicted_valid) > 0.5).float()
                 legal_accuracy = (
-                    (legal_preds == legal_moves).sum().item() / legal_moves.numel()
+                    (legal_preds == legal_target).sum().item() / legal_target.numel()
                 ) * 100
                 average_move_loss = move_loss.item() / self.batch_size
                 average_legal_loss = legal_loss.item() / self.batch_size
@@ -0,0 +1,21 @@
+"""Pytest configuration and shared fixtures."""
+
+import sys
+
+import pytest
+
+_SRC_PACKAGE = "packages.train.src"
+
+
+@pytest.fixture(autouse=True)
+def db_file(tmp_path, monkeypatch):
+    """Point every module that imported DB_FILE at a temporary database.
+
+    Modules bind DB_FILE when they are imported, so it is replaced in each of them and
+    no test can reach the real database.
+    """
+    db_path = str(tmp_path / "test.db")
+    for name, module in list(sys.modules.items()):
+        if name.startswith(_SRC_PACKAGE) and hasattr(module, "DB_FILE"):
+            monkeypatch.setattr(module, "DB_FILE", db_path)
+    return db_path
@@ -0,0 +1,87 @@
+"""Tests for the compact position and move encoding."""
+
+from io import StringIO
+
+import chess
+import chess.pgn
+import pytest
+
+from packages.train.src.dataset.codecs.position_codec import (
+    POSITION_SIZE,
+    decode_move,
+    encode_move,
+    fen_to_position,
+    move_code_to_san,
+    pack_board,
+    position_to_fen,
+    san_to_move_code,
+    unpack_board,
+)
+
+_GAME = """1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 4. Bxc6 dxc6 5. O-O f6 6. d4 exd4 7. Nxd4 c5 \
+8. Nb3 Qxd1 9. Rxd1 Bg4 10. f3 Be6 11. Nc3 O-O-O 12. Rxd8+ Kxd8 13. Bf4 *"""
+
+
+def _positions() -> list[tuple[chess.Board, chess.Move]]:
+    game = chess.pgn.read_game(StringIO(_GAME))
+    assert game is not None
+    board = game.board()
+    positions = []
+    for move in game.mainline_moves():
+        positions.append((board.copy(stack=False), move))
+        board.push(move)
+    return positions
+
+
+class TestPackBoard:
+    """Tests for pack_board and unpack_board."""
+
+    def test_round_trips_every_position_of_a_game(self):
+        """Test positions with castling rights, captures and clocks survive packing."""
+        for board, _ in _positions():
+            packed = pack_board(board)
+
+            assert len(packed) == POSITION_SIZE <= 40
+            unpacked = unpack_board(packed)
+            assert unpacked.fen(en_passant="fen") == board.fen(en_passant="fen")
+            assert set(unpacked.legal_moves) == set(board.legal_moves)
+
+    @pytest.mark.parametrize(
+        "fen",
+        [
+            "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3",
+            "r3k2r/8/8/8/8/8/8/R3K2R b Kq - 12 40",
+            "8/8/8/8/8/8/8/K6k w - - 99 300",
+        ],
+    )
+    def test_round_trips_state(self, fen):
+        """Test en passant, partial castling rights and clocks are kept."""
+        assert position_to_fen(fen_to_position(fen)) == fen
+
+
+class TestEncodeMove:
+    """Tests for move codes."""
+
+    def test_round_trips_every_move_of_a_game(self):
+        """Test moves decode to themselves and fit in 16 bits."""
+        for _, move in _positions():
+            code = encode_move(move)
+
+            assert 0 <= code < 1 << 16
+            assert decode_move(code) == move
+
+    def test_promotion(self):
+        """Test the promotion piece is part of the code."""
+        queen = chess.Move.from_uci("b7b8q")
+        knight = chess.Move.from_uci("b7b8n")
+
+        assert encode_move(queen) != encode_move(knight)
+        assert decode_move(encode_move(knight)) == knight
+
+    def test_san_round_trip(self):
+        """Test SAN is available on demand from a packed position."""
+        fen = "r3k3/1P6/8/8/8/8/8/4K2R w K - 0 30"
+        position = fen_to_position(fen)
+
+        for san in ["O-O", "bxa8=Q+", "b8=N", "Rh8+"]:
+            assert move_code_to_san(position, san_to_move_code(fen, san)) == san
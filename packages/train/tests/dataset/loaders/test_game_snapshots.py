@@ -1,9 +1,30 @@
 from unittest.mock import patch
 
+import chess
+import numpy as np
 import pytest
-
-from packages.train.src.dataset.loaders.game_snapshots import GameSnapshotsDataset
+import torch
+
+from packages.train.src.dataset.codecs.position_codec import (
+    pack_board,
+    unpack_piece_bitboards,
+)
+from packages.train.src.dataset.loaders.game_snapshots import (
+    GameSnapshotsDataset,
+    collate_snapshots,
+)
+from packages.train.src.dataset.models.processed_snapshot import ProcessedSnapshot
+from packages.train.src.dataset.processers.legal_moves import get_legal_moves
 from packages.train.src.dataset.processers.processed_snapshots import ProcessedSnapshotsProcessor
+from packages.train.src.dataset.repositories import database, legal_move, processed_snapshots
+
+
+@pytest.fixture
+def legal_moves_db(db_file):
+    """A temporary database holding the legal move vocabulary."""
+    legal_move.create_legal_moves_table(db_file)
+    legal_move.save_legal_moves(get_legal_moves())
+    return db_file
 
 
 class TestGameSnapshotsDataset:
@@ -16,6 +37,68 @@ class TestGameSnapshotsDataset:
         with pytest.raises(ValueError, match="num_indexes is larger than the size of the database"):
             GameSnapshotsDataset(start_index=50, num_indexes=60, db_path=":memory:")
 
+    @patch("packages.train.src.dataset.loaders.game_snapshots.initialize_database")
+    @patch("packages.train.src.dataset.loaders.game_snapshots.get_processed_snapshot_ids")
+    @patch("packages.train.src.dataset.loaders.game_snapshots.get_processed_snapshots_batch")
+    @patch("packages.train.src.dataset.loaders.game_snapshots.count_processed_snapshots")
+    def test_getitems_expands_bitboards(self, mock_count, mock_batch, mock_ids, _mock_init):
+        """Test stored bitboards are returned as the one-hot planes of each board."""
+        mock_count.return_value = 10
+        mock_ids.return_value = np.array([1, 2])
+        boards = [chess.Board(), chess.Board("4k3/8/8/8/4P3/8/8/4K3 w - - 0 1")]
+        bitboards = unpack_piece_bitboards([pack_board(board) for board in boards])
+        mock_batch.return_value = {
+            i + 1: ProcessedSnapshot(i + 1, bitboards[i], torch.zeros(4), i, torch.tensor([i]))
+            for i in range(len(boards))
+        }
+        dataset = GameSnapshotsDataset(start_index=0, num_indexes=2, db_path=":memory:")
+
+        items = dataset.__getitems__([1, 0])
+
+        assert [chosen for _, (chosen, _) in items] == [1, 0]
+        for ((board, _), _), expected in zip(items, reversed(boards), strict=True):
+            assert board.shape == (12, 8, 8) and board.dtype == torch.float32
+            np.testing.assert_array_equal(
+                board.numpy(), ProcessedSnapshotsProcessor.board_to_tensor(expected).numpy()
+            )
+
+    def test_indexes_map_onto_processed_ids(self, db_file):
+        """Test samples are the processed snapshots in id order, whatever gaps the ids have."""
+        database.initialize_database()
+        bitboards = unpack_piece_bitboards([pack_board(chess.Board())])[0]
+        processed_snapshots.save_processed_snapshots(
+            [
+                (
+                    snapshot_id,
+                    bitboards.astype("<u8").tobytes(),
+                    np.zeros(4, dtype=np.float32).tobytes(),
+                    snapshot_id,
+                    np.array([snapshot_id], dtype="<u2").tobytes(),
+                )
+                for snapshot_id in [2, 5, 9, 10]
+            ]
+        )
+
+        dataset = GameSnapshotsDataset(start_index=1, num_indexes=2, db_path=db_file)
+
+        assert [chosen for _, (chosen, _) in dataset.__getitems__([0, 1])] == [5, 9]
+        assert dataset[1][1][1].tolist() == [9]
+
+    def test_collate_keeps_legal_moves_sparse(self):
+        """Test legal moves of different lengths are batched as mask coordinates."""
+        batch = [
+            ((torch.zeros(12, 8, 8), torch.zeros(4)), (5, torch.tensor([1, 4, 9]))),
+            ((torch.ones(12, 8, 8), torch.ones(4)), (7, torch.tensor([2]))),
+        ]
+
+        (board, metadata), (chosen_move, (legal_rows, legal_moves)) = collate_snapshots(batch)
+
+        assert board.shape == (2, 12, 8, 8)
+        assert metadata.shape == (2, 4)
+        assert chosen_move.tolist() == [5, 7]
+        assert legal_rows.tolist() == [0, 0, 0, 1]
+        assert legal_moves.tolist() == [1, 4, 9, 2]
+
     def test_fen_to_tensor(self):
         """Test conversion of FEN string to tensor."""
         fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"  # Starting position
@@ -46,20 +129,18 @@ class TestGameSnapshotsDataset:
         assert pytest.approx(result[0].item(), 0.001) == (2000 - 1638.43153) / 185.80054702756055
         assert pytest.approx(result[1].item(), 0.001) == (1500 - 1638.43153) / 185.80054702756055
 
+    @pytest.mark.usefixtures("legal_moves_db")
     def test_encode_move_valid(self):
         """Test encoding of valid chess move."""
         processor = ProcessedSnapshotsProcessor()
-        fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-        move_san = "e4"
-        move = processor._encode_move(fen, move_san)
+        move = processor._encode_move(chess.Move.from_uci("e2e4"))
         assert isinstance(move, int)
 
+    @pytest.mark.usefixtures("legal_moves_db")
     def test_encode_move_invalid(self):
-        """Test encoding of invalid chess move."""
+        """Test encoding of a move outside the legal move vocabulary."""
         processor = ProcessedSnapshotsProcessor()
-        fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-        move_san = "invalid_move"
-        move = processor._encode_move(fen, move_san)
+        move = processor._encode_move(chess.Move.null())
         assert move == 0
 
     @patch("packages.train.src.dataset.loaders.game_snapshots.count_processed_snapshots")
@@ -1,5 +1,6 @@
 import sqlite3
 
+import chess
 import pytest
 import torch
 
@@ -135,3 +136,30 @@ class TestLegalMovesDataset:
         assert dataset.vocab == custom_vocab
         assert dataset.get_move_from_index(100) == "e2e4"
         assert dataset.get_index_from_move("g1f3") == 101
+
+    def test_move_index_table(self, temp_database):
+        """Test the dense table agrees with the vocabulary and skips malformed entries."""
+        dataset = LegalMovesDataset(db_path=temp_database)
+        table = dataset.move_index_table
+
+        assert table.shape == (64, 64, 7)
+        assert table[chess.E2, chess.E4, 0] == 0
+        assert table[chess.E7, chess.E8, chess.QUEEN] == 2
+        assert table[chess.E7, chess.E8, 0] == -1
+        assert (table >= 0).sum() == 3  # "g8=Q+" is not a UCI move
+
+    def test_get_index_from_chess_move(self, temp_database):
+        """Test chess.Move lookups match the string vocabulary."""
+        dataset = LegalMovesDataset(db_path=temp_database)
+
+        assert dataset.get_index_from_chess_move(chess.Move.from_uci("g1f3")) == 1
+        assert dataset.get_index_from_chess_move(chess.Move.from_uci("e7e8q")) == 2
+        assert dataset.get_index_from_chess_move(chess.Move.from_uci("e7e8n")) == -1
+
+    def test_get_indices_from_moves(self, temp_database):
+        """Test a list of moves is mapped in one call, including custom vocabularies."""
+        dataset = LegalMovesDataset(db_path=temp_database, vocab={"e2e4": 100, "e7e8Q": 101})
+        moves = [chess.Move.from_uci(uci) for uci in ["e2e4", "g1f3", "e7e8q"]]
+
+        assert dataset.get_indices_from_moves(moves).tolist() == [100, -1, 101]
+        assert dataset.get_indices_from_moves([]).tolist() == []
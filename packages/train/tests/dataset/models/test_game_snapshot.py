@@ -1,5 +1,8 @@
 """Tests for GameSnapshot model."""
 
+import chess
+
+from packages.train.src.dataset.codecs.position_codec import encode_move, pack_board
 from packages.train.src.dataset.models.game_snapshot import GameSnapshot
 
 
@@ -8,41 +11,44 @@ class TestGameSnapshot:
 
     def test_creation_with_all_fields(self):
         """Test creating GameSnapshot with all required fields."""
-        fen = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
+        board = chess.Board()
         snapshot = GameSnapshot(
             raw_game_id=1,
             move_number=1,
             turn="w",
-            move="e4",
-            fen=fen,
+            move_code=encode_move(chess.Move.from_uci("e2e4")),
+            position=pack_board(board),
         )
         assert snapshot.raw_game_id == 1
         assert snapshot.move_number == 1
         assert snapshot.turn == "w"
         assert snapshot.move == "e4"
-        assert snapshot.fen == fen
+        assert snapshot.fen == chess.STARTING_FEN
 
     def test_black_turn(self):
         """Test GameSnapshot with black's turn."""
+        board = chess.Board("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1")
         snapshot = GameSnapshot(
             raw_game_id=1,
             move_number=2,
             turn="b",
-            move="e5",
-            fen="rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e6 0 2",
+            move_code=encode_move(board.parse_san("e5")),
+            position=pack_board(board),
         )
         assert snapshot.turn == "b"
         assert snapshot.move_number == 2
+        assert snapshot.move == "e5"
 
     def test_various_move_notations(self):
-        """Test GameSnapshot accepts various SAN notations."""
-        moves = ["e4", "Nf3", "Bb5", "O-O", "Qe2+", "Rxd8#", "exd5", "e8=Q"]
+        """Test GameSnapshot decodes various SAN notations."""
+        board = chess.Board("r3k3/1P6/8/3pP3/8/8/8/R3K2R w KQq d6 0 30")
+        moves = ["O-O", "O-O-O", "exd6", "b8=Q+", "bxa8=N", "Rxa8+", "Kd2"]
         for move in moves:
             snapshot = GameSnapshot(
                 raw_game_id=1,
                 move_number=1,
                 turn="w",
-                move=move,
-                fen="8/8/8/8/8/8/8/8 w - - 0 1",
+                move_code=encode_move(board.parse_san(move)),
+                position=pack_board(board),
             )
             assert snapshot.move == move
@@ -0,0 +1,93 @@
+"""Tests for the single-pass game parser."""
+
+from io import StringIO
+
+import chess
+import chess.pgn
+
+from packages.train.src.dataset.models.raw_game import RawGame
+from packages.train.src.dataset.processers.game_parser import parse_raw_game
+from packages.train.src.dataset.processers.game_statistics import extract_statistics_from_raw_game
+
+_LICHESS_PGN = """[Event "Rated Blitz game"]
+[Site "https://lichess.org/abcd1234"]
+[White "Alice"]
+[Black "Bob"]
+[Result "0-1"]
+[WhiteElo "1500"]
+[BlackElo "1520"]
+[TimeControl "180+0"]
+
+1. e4 { [%clk 0:03:00] } 1... e5 { [%clk 0:03:00] } 2. Nf3 (2. f4 exf4) 2... Nc6 \
+{ [%eval 0.3] } 3. Bc4 Nd4 4. Nxe5 Qg5 5. Nxf7 Qxg2 6. Rf1 Qxe4+ 7. Be2 Nf3# 0-1"""
+
+
+def _reference_snapshots(pgn: str) -> list[tuple[int, str, str, str]]:
+    """Snapshots built the straightforward way, from a full GameBuilder parse."""
+    game = chess.pgn.read_game(StringIO(pgn))
+    assert game is not None
+    board = game.board()
+    rows = []
+    for number, move in enumerate(game.mainline_moves(), start=1):
+        rows.append((number, "w" if board.turn else "b", board.san(move), board.fen()))
+        board.push(move)
+    return rows
+
+
+class TestParseRawGame:
+    """Tests for parse_raw_game."""
+
+    def test_snapshots_match_full_parse(self):
+        """Test the visitor yields the same snapshots as a full game tree parse."""
+        parsed = parse_raw_game(RawGame(id=7, pgn=_LICHESS_PGN))
+
+        assert parsed is not None
+        rows = [(s.move_number, s.turn, s.move, s.fen) for s in parsed.snapshots]
+        assert rows == _reference_snapshots(_LICHESS_PGN)
+        assert all(s.raw_game_id == 7 for s in parsed.snapshots)
+
+    def test_statistics_match_extractor(self):
+        """Test statistics equal the standalone extractor's, including total_moves."""
+        raw_game = RawGame(id=7, pgn=_LICHESS_PGN)
+
+        parsed = parse_raw_game(raw_game)
+
+        assert parsed is not None
+        assert parsed.statistics == extract_statistics_from_raw_game(raw_game)
+        assert parsed.statistics is not None and parsed.statistics.total_moves == 14
+
+    def test_snapshots_carry_game_statistics(self):
+        """Test every snapshot gets its game's Elo, result and event class inline."""
+        parsed = parse_raw_game(RawGame(id=7, pgn=_LICHESS_PGN))
+
+        assert parsed is not None
+        assert {(s.white_elo, s.black_elo, s.result, s.event_class) for s in parsed.snapshots} == {
+            (1500, 1520, "0-1", "Rated Blitz game")
+        }
+
+    def test_variations_and_comments_are_skipped(self):
+        """Test side lines never produce snapshots."""
+        parsed = parse_raw_game(RawGame(id=1, pgn=_LICHESS_PGN))
+
+        assert parsed is not None
+        assert "f4" not in [s.move for s in parsed.snapshots]
+        assert parsed.snapshots[1].move == "e5"
+
+    def test_unsaved_game_has_no_statistics(self):
+        """Test a game without id still yields snapshots but no statistics."""
+        parsed = parse_raw_game(RawGame(pgn=_LICHESS_PGN))
+
+        assert parsed is not None
+        assert parsed.statistics is None
+        assert parsed.snapshots[0].raw_game_id == 0
+
+    def test_illegal_move_keeps_earlier_moves(self):
+        """Test parsing stops at an illegal move like chess.pgn's GameBuilder."""
+        parsed = parse_raw_game(RawGame(id=1, pgn='[Event "x"]\n\n1. e4 e5 2. Ke3 Nc6 *'))
+
+        assert parsed is not None
+        assert [s.move for s in parsed.snapshots] == ["e4", "e5"]
+
+    def test_empty_pgn(self):
+        """Test an empty PGN gives no game."""
+        assert parse_raw_game(RawGame(id=1, pgn="")) is None
@@ -1,35 +1,15 @@
 """Tests for game_snapshots processer."""
 
-from packages.train.src.dataset.models.raw_game import RawGame
-from packages.train.src.dataset.processers.game_snapshots import _safe_int, raw_game_to_snapshots
-
-
-class TestSafeInt:
-    """Tests for _safe_int helper function."""
-
-    def test_valid_int_string(self):
-        """Test converting valid int string."""
-        assert _safe_int("1500") == 1500
-
-    def test_none(self):
-        """Test converting None."""
-        assert _safe_int(None) is None
-
-    def test_invalid_string(self):
-        """Test converting invalid string."""
-        assert _safe_int("not a number") is None
+from unittest.mock import patch
 
-    def test_empty_string(self):
-        """Test converting empty string."""
-        assert _safe_int("") is None
-
-    def test_negative_number(self):
-        """Test converting negative number."""
-        assert _safe_int("-100") == -100
+from packages.train.src.dataset.models.game_snapshot import GameSnapshot
+from packages.train.src.dataset.models.raw_game import RawGame
+from packages.train.src.dataset.processers.game_snapshots import (
+    SnapshotBatchProcessor,
+    raw_game_to_snapshots,
+)
 
-    def test_zero(self):
-        """Test converting zero."""
-        assert _safe_int("0") == 0
+_OPENINGS = ["1. e4 e5 2. Nf3 Nc6", "1. d4 d5 2. c4", "1. c4 e5", "1. Nf3 d5 2. g3 Nf6 3. Bg2"]
 
 
 class TestRawGameToSnapshots:
@@ -215,3 +195,59 @@ class TestRawGameToSnapshots:
         assert all(s.fen for s in snapshots)
         # FEN strings should have the correct format (contains spaces)
         assert all(" " in s.fen for s in snapshots)
+
+
+def _run_processor(workers: int, games: list[RawGame], should_stop=None):
+    """Run SnapshotBatchProcessor with the database layer mocked out."""
+    saved: list[GameSnapshot] = []
+    stats: list[int] = []
+    marked: list[int] = []
+
+    def save_chunk(statistics, snapshots, raw_game_ids):
+        stats.extend(s.raw_game_id for s in statistics)
+        saved.extend(snapshots)
+        marked.extend(raw_game_ids)
+
+    prefix = "packages.train.src.dataset.processers.game_snapshots"
+    with (
+        patch(f"{prefix}.count_snapshots", return_value=0),
+        patch(f"{prefix}.save_ingest_chunk", side_effect=save_chunk),
+    ):
+        processor = SnapshotBatchProcessor(batch_size=5, workers=workers, chunk_size=3)
+        processed = processor.process_games(iter(games), should_stop=should_stop)
+    return processed, saved, stats, marked
+
+
+class TestSnapshotBatchProcessorWorkers:
+    """Tests for parsing games in worker processes."""
+
+    def _games(self, count: int) -> list[RawGame]:
+        return [
+            RawGame(id=i + 1, pgn=f'[Event "Game {i}"]\n\n{_OPENINGS[i % len(_OPENINGS)]} *')
+            for i in range(count)
+        ]
+
+    def test_workers_match_serial_output(self):
+        """Test parallel processing writes exactly what serial processing writes."""
+        games = self._games(20)
+
+        serial = _run_processor(1, games)
+        parallel = _run_processor(3, games)
+
+        assert parallel == serial
+        assert serial[0] == 20
+        assert serial[3] == list(range(1, 21))
+
+    def test_workers_stop_early(self):
+        """Test should_stop ends parallel processing and leaves later games unprocessed."""
+        games = self._games(50)
+        state = {"calls": 0}
+
+        def should_stop():
+            state["calls"] += 1
+            return state["calls"] > 7
+
+        processed, _saved, _stats, marked = _run_processor(2, games, should_stop=should_stop)
+
+        assert processed == 7
+        assert marked == list(range(1, 8))
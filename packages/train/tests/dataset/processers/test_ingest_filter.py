@@ -0,0 +1,62 @@
+from packages.train.src.dataset.processers.ingest_filter import IngestFilter, parse_headers
+
+
+def _pgn(
+    event: str = "Rated Blitz game",
+    white_elo: str = "1500",
+    black_elo: str = "1550",
+    variant: str | None = None,
+) -> str:
+    tags = [f'[Event "{event}"]', f'[WhiteElo "{white_elo}"]', f'[BlackElo "{black_elo}"]']
+    if variant is not None:
+        tags.append(f'[Variant "{variant}"]')
+    # A tag-like line in the movetext must not be read as a header
+    return "\n".join(tags) + '\n\n1. e4 { [Event "Rated Bullet game"] } e5 1-0'
+
+
+class TestParseHeaders:
+    def test_reads_header_block_only(self):
+        """Test tag pairs after the first blank line are ignored."""
+        headers = parse_headers(_pgn())
+        assert headers == {"Event": "Rated Blitz game", "WhiteElo": "1500", "BlackElo": "1550"}
+
+
+class TestIngestFilter:
+    def test_accepts_matching_game(self):
+        """Test a standard blitz game inside the rating range is accepted."""
+        ingest_filter = IngestFilter(min_elo=1000, max_elo=2000, max_elo_gap=100)
+        assert ingest_filter.accepts(_pgn())
+
+    def test_rejects_ratings_outside_range(self):
+        """Test either player outside [min_elo, max_elo] rejects the game."""
+        ingest_filter = IngestFilter(min_elo=1000, max_elo=2000)
+        assert not ingest_filter.accepts(_pgn(white_elo="900"))
+        assert not ingest_filter.accepts(_pgn(black_elo="2100"))
+        assert not ingest_filter.accepts(_pgn(white_elo="?"))
+
+    def test_rejects_large_elo_gap(self):
+        """Test the rating difference is limited by max_elo_gap."""
+        ingest_filter = IngestFilter(max_elo_gap=30)
+        assert not ingest_filter.accepts(_pgn())
+        assert IngestFilter(max_elo_gap=50).accepts(_pgn())
+
+    def test_filters_time_control_class(self):
+        """Test the time-control class is read from the Event tag."""
+        ingest_filter = IngestFilter(time_controls=("Blitz", "Rapid"))
+        assert ingest_filter.accepts(_pgn(event="Rated Rapid tournament https://lichess.org/x"))
+        assert not ingest_filter.accepts(_pgn(event="Rated Bullet game"))
+        assert not ingest_filter.accepts(_pgn(event="Rated UltraBullet game"))
+        assert not ingest_filter.accepts(_pgn(event="Test"))
+
+    def test_filters_variant(self):
+        """Test a missing Variant tag counts as standard chess."""
+        ingest_filter = IngestFilter(variants=("Standard",))
+        assert ingest_filter.accepts(_pgn())
+        assert not ingest_filter.accepts(_pgn(variant="Chess960"))
+
+    def test_disabled_criteria_accept_everything(self):
+        """Test a filter with every criterion disabled accepts any game."""
+        ingest_filter = IngestFilter(
+            min_elo=None, max_elo=None, max_elo_gap=None, time_controls=(), variants=()
+        )
+        assert ingest_filter.accepts('[Event "Test"]\n\n1. e4 1-0')
@@ -0,0 +1,167 @@
+"""Tests for the batched processed-snapshot encoder."""
+
+import sqlite3
+from io import StringIO
+
+import chess
+import chess.pgn
+import numpy as np
+import pytest
+
+from packages.train.src.dataset.codecs.position_codec import (
+    bitboards_to_planes,
+    encode_move,
+    pack_board,
+    planes_to_bitboards,
+    unpack_piece_bitboards,
+)
+from packages.train.src.dataset.loaders.legal_moves import LegalMovesDataset
+from packages.train.src.dataset.processers.legal_moves import get_legal_moves
+from packages.train.src.dataset.processers.processed_snapshots import ProcessedSnapshotsProcessor
+
+_GAME = """1. e4 d5 2. exd5 Qxd5 3. Nc3 Qa5 4. d4 c6 5. Nf3 Bf5 6. Bc4 e6 7. O-O Nf6 \
+8. Re1 Bb4 9. a3 Bxc3 10. bxc3 O-O 11. Bg5 Nbd7 *"""
+
+
+@pytest.fixture(scope="module")
+def processor(tmp_path_factory):
+    """Processor over the full legal move vocabulary, stored in a temporary database."""
+    db_path = tmp_path_factory.mktemp("legal_moves") / "test.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE legal_moves (move TEXT, types TEXT)")
+    conn.executemany(
+        "INSERT INTO legal_moves (move, types) VALUES (?, ?)",
+        [(m.move, ",".join(m.types)) for m in get_legal_moves()],
+    )
+    conn.commit()
+    conn.close()
+    return ProcessedSnapshotsProcessor(LegalMovesDataset(db_path=db_path))
+
+
+def _rows() -> list[tuple]:
+    game = chess.pgn.read_game(StringIO(_GAME))
+    assert game is not None
+    board = game.board()
+    rows = []
+    for i, move in enumerate(game.mainline_moves()):
+        turn = "w" if board.turn == chess.WHITE else "b"
+        rows.append((i + 1, pack_board(board), encode_move(move), turn, 1500 + i, None, "1-0"))
+        board.push(move)
+    return rows
+
+
+def _reference_planes(board: chess.Board) -> np.ndarray:
+    planes = np.zeros((12, 8, 8), dtype=np.float32)
+    for square, piece in board.piece_map().items():
+        channel = piece.piece_type - 1 + (0 if piece.color else 6)
+        planes[channel, chess.square_rank(square), chess.square_file(square)] = 1.0
+    return planes
+
+
+class TestUnpackPieceBitboards:
+    """Tests for decoding packed positions in bulk."""
+
+    def test_matches_python_chess(self):
+        """Test each column is the bitboard of one piece type and color."""
+        board = chess.Board("r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQ1RK1 b kq - 5 4")
+
+        bitboards = unpack_piece_bitboards([pack_board(board), pack_board(chess.Board())])
+
+        assert bitboards.shape == (2, 12)
+        expected = [
+            board.pieces_mask(piece_type, color)
+            for color in (chess.WHITE, chess.BLACK)
+            for piece_type in chess.PIECE_TYPES
+        ]
+        assert [int(b) for b in bitboards[0]] == expected
+
+    def test_planes_round_trip(self):
+        """Test bitboards expand to the reference planes and pack back unchanged."""
+        board = chess.Board("r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQ1RK1 b kq - 5 4")
+        bitboards = unpack_piece_bitboards([pack_board(board)])
+
+        planes = bitboards_to_planes(bitboards)
+
+        np.testing.assert_array_equal(planes[0], _reference_planes(board))
+        np.testing.assert_array_equal(planes_to_bitboards(planes), bitboards)
+
+
+class TestProcessSnapshotRows:
+    """Tests for ProcessedSnapshotsProcessor.process_snapshot_rows."""
+
+    def test_shapes_and_dtypes(self, processor):
+        """Test the batch is returned as contiguous arrays."""
+        rows = _rows()
+
+        encoded = processor.process_snapshot_rows(rows)
+
+        n = len(rows)
+        assert len(encoded) == n
+        assert encoded.boards.shape == (n, 12, 8, 8)
+        assert encoded.metadata.shape == (n, 4)
+        assert encoded.chosen_moves.shape == (n,)
+        assert len(encoded.valid_moves) == n
+        assert all(valid.dtype == np.uint16 for valid in encoded.valid_moves)
+        assert encoded.boards.dtype == encoded.metadata.dtype == np.float32
+        assert encoded.boards.flags.c_contiguous
+
+    def test_matches_row_by_row_encoding(self, processor):
+        """Test every row is encoded as the single-board helpers encode it."""
+        rows = _rows()
+
+        encoded = processor.process_snapshot_rows(rows)
+
+        game = chess.pgn.read_game(StringIO(_GAME))
+        assert game is not None
+        board = game.board()
+        for i, move in enumerate(game.mainline_moves()):
+            np.testing.assert_array_equal(encoded.boards[i], _reference_planes(board))
+            np.testing.assert_array_equal(
+                encoded.boards[i], processor.board_to_tensor(board).numpy()
+            )
+            turn = "w" if board.turn == chess.WHITE else "b"
+            expected_metadata = np.concatenate(
+                [
+                    processor.normalize_elo(1500 + i, 0).numpy(),
+                    processor.encode_turn(turn).numpy(),
+                ]
+            )
+            np.testing.assert_allclose(encoded.metadata[i], expected_metadata, rtol=1e-6)
+            assert encoded.chosen_moves[i] == processor.legal_moves.get_index_from_move(move.uci())
+            legal = {processor.legal_moves.get_index_from_move(m.uci()) for m in board.legal_moves}
+            assert -1 not in legal
+            assert list(encoded.valid_moves[i]) == sorted(legal)
+            board.push(move)
+
+    def test_promotions_are_in_the_vocabulary(self, processor):
+        """Test promotion moves map to their vocabulary entries."""
+        board = chess.Board("4k3/1P6/8/8/8/8/8/4K3 w - - 0 1")
+        row = (1, pack_board(board), encode_move(chess.Move.from_uci("b7b8n")), "w", 0, 0, "")
+
+        encoded = processor.process_snapshot_rows([row])
+
+        vocabulary = processor.legal_moves
+        assert encoded.chosen_moves[0] == vocabulary.get_index_from_move("b7b8N") > 0
+        promotions = {vocabulary.get_index_from_move(f"b7b8{p}") for p in "QRBN"}
+        assert promotions <= set(encoded.valid_moves[0].tolist())
+
+    def test_skips_rows_that_cannot_be_decoded(self, processor, capsys):
+        """Test corrupt positions and missing moves are reported and left out of the batch."""
+        rows = _rows()[:4]
+        rows[1] = (rows[1][0], b"corrupt", *rows[1][2:])
+        rows[2] = (rows[2][0], rows[2][1], None, *rows[2][3:])
+
+        encoded = processor.process_snapshot_rows(rows)
+
+        assert list(encoded.snapshot_ids) == [1, 4]
+        output = capsys.readouterr().out
+        assert "Failed to process snapshot 2" in output
+        assert "Failed to process snapshot 3" in output
+
+    def test_empty_batch(self, processor):
+        """Test an empty batch gives empty arrays."""
+        encoded = processor.process_snapshot_rows([])
+
+        assert len(encoded) == 0
+        assert encoded.boards.shape == (0, 12, 8, 8)
+        assert encoded.valid_moves == []
@@ -0,0 +1,77 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from packages.train.src.dataset.models.legal_move import LegalMove
+from packages.train.src.dataset.repositories import connection, legal_move
+
+
+@pytest.fixture(autouse=True)
+def fresh_connections():
+    connection.close_connections()
+    yield
+    connection.close_connections()
+    connection.use_pragma_profile(connection.DEFAULT_PRAGMA_PROFILE)
+
+
+def _pragma(conn, name):
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+class TestGetConnection:
+    def test_reuses_connection_per_thread(self, tmp_path):
+        """The same thread gets the same connection for the same path."""
+        db_path = tmp_path / "test.db"
+
+        assert connection.get_connection(db_path) is connection.get_connection(str(db_path))
+
+    def test_threads_get_their_own_connection(self, tmp_path):
+        """sqlite3 connections are not shared between threads."""
+        db_path = str(tmp_path / "test.db")
+        main_conn = connection.get_connection(db_path)
+        other = []
+
+        thread = threading.Thread(target=lambda: other.append(connection.get_connection(db_path)))
+        thread.start()
+        thread.join()
+
+        assert other[0] is not main_conn
+
+    def test_applies_bulk_profile_by_default(self, tmp_path):
+        """New connections use WAL and the bulk cache size."""
+        conn = connection.get_connection(tmp_path / "test.db")
+
+        assert _pragma(conn, "journal_mode") == "wal"
+        assert _pragma(conn, "cache_size") == connection.PRAGMA_PROFILES["bulk"]["cache_size"]
+
+    def test_switching_profile_updates_open_connections(self, tmp_path):
+        """An open connection picks up the new profile when it is requested again."""
+        db_path = tmp_path / "test.db"
+        connection.get_connection(db_path)
+
+        connection.use_pragma_profile("read")
+        conn = connection.get_connection(db_path)
+
+        assert _pragma(conn, "cache_size") == connection.PRAGMA_PROFILES["read"]["cache_size"]
+
+    def test_unknown_profile_raises(self):
+        """Only the profiles in PRAGMA_PROFILES can be selected."""
+        with pytest.raises(ValueError, match="Unknown pragma profile"):
+            connection.use_pragma_profile("turbo")
+
+    def test_in_memory_database_persists_across_calls(self):
+        """':memory:' works with the repositories because the connection is kept open."""
+        with patch("packages.train.src.dataset.repositories.legal_move.DB_FILE", ":memory:"):
+            legal_move.create_legal_moves_table(":memory:")
+            legal_move.save_legal_moves([LegalMove(move="e2e4", types=["pawn"])])
+
+            assert legal_move.count_legal_moves() == 1
+
+    def test_closes_least_recently_used_connection(self, tmp_path):
+        """Each thread keeps a bounded number of databases open."""
+        first = connection.get_connection(tmp_path / "0.db")
+        for i in range(1, connection._MAX_CONNECTIONS_PER_THREAD + 1):
+            connection.get_connection(tmp_path / f"{i}.db")
+
+        assert connection.get_connection(tmp_path / "0.db") is not first
@@ -0,0 +1,158 @@
+"""Tests for schema versioning and migrations."""
+
+import sqlite3
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from packages.train.src.dataset.models.raw_game import RawGame
+from packages.train.src.dataset.repositories import database, ingest, raw_games
+
+
+@pytest.fixture
+def temp_db(db_file):
+    """An empty temporary database."""
+    return db_file
+
+
+def _query(db_path: str, sql: str) -> list[tuple]:
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+class TestInitializeDatabase:
+    """Tests for the migration runner."""
+
+    def test_new_database_is_at_current_version(self, temp_db):
+        """Test a new database runs every migration and records the version."""
+        database.initialize_database()
+
+        assert database.get_schema_state(temp_db) == (database.SCHEMA_VERSION, False)
+        assert _query(temp_db, "SELECT version FROM schema_version") == [(database.SCHEMA_VERSION,)]
+        assert _query(temp_db, "SELECT name FROM sqlite_master WHERE name = 'raw_games'")
+
+    @pytest.mark.usefixtures("temp_db")
+    def test_current_schema_runs_no_migration(self):
+        """Test a current database is only checked, not migrated again."""
+        database.initialize_database()
+        migration = MagicMock()
+
+        with patch.object(database, "MIGRATIONS", [migration] * database.SCHEMA_VERSION):
+            database.initialize_database()
+
+        migration.assert_not_called()
+
+    def test_runs_only_pending_migrations_in_order(self, temp_db):
+        """Test an older database runs the migrations it is missing, once, on its path."""
+        database.initialize_database()
+        calls = []
+        migrations = [
+            *database.MIGRATIONS,
+            lambda path: calls.append((2, path)),
+            lambda path: calls.append((3, path)),
+        ]
+
+        with (
+            patch.object(database, "MIGRATIONS", migrations),
+            patch.object(database, "SCHEMA_VERSION", len(migrations)),
+        ):
+            database.initialize_database()
+            database.initialize_database()
+
+        assert calls == [(2, temp_db), (3, temp_db)]
+        assert _query(temp_db, "SELECT version FROM schema_version") == [(len(migrations),)]
+
+    def test_unversioned_database_is_migrated(self, temp_db):
+        """Test a database created before versioning is upgraded in place."""
+        for table_creator in database.TABLE_CREATORS:
+            table_creator(temp_db)
+
+        assert database.get_schema_state(temp_db) == (0, False)
+        database.initialize_database()
+
+        assert database.get_schema_state(temp_db) == (database.SCHEMA_VERSION, False)
+
+    def test_newer_schema_raises(self, temp_db):
+        """Test a database written by a newer version is not touched."""
+        database.initialize_database()
+        conn = sqlite3.connect(temp_db)
+        conn.execute("UPDATE schema_version SET version = version + 1")
+        conn.commit()
+        conn.close()
+
+        with pytest.raises(RuntimeError, match="newer"):
+            database.initialize_database()
+
+    def test_rebuilds_indexes_after_interrupted_ingest(self, temp_db):
+        """Test indexes dropped by an ingest that never finished are rebuilt on startup."""
+        database.initialize_database()
+
+        # Simulate a crash inside bulk_ingest: the block is left without rebuilding
+        with patch.object(ingest, "rebuild_dropped_indexes"), ingest.bulk_ingest():
+            pass
+        dropped = _query(temp_db, "SELECT name FROM dropped_indexes")
+        assert ("idx_game_snapshots_raw_game_id",) in dropped
+        assert database.get_schema_state(temp_db) == (database.SCHEMA_VERSION, True)
+
+        database.initialize_database()
+
+        assert database.get_schema_state(temp_db) == (database.SCHEMA_VERSION, False)
+        assert _query(
+            temp_db,
+            "SELECT name FROM sqlite_master WHERE name = 'idx_game_snapshots_raw_game_id'",
+        )
+
+
+class TestSizeBudget:
+    """Tests for incremental vacuum and the database size budget."""
+
+    def test_uses_incremental_vacuum(self, temp_db):
+        """Test migrated databases release free pages without a full VACUUM."""
+        database.initialize_database()
+
+        assert _query(temp_db, "PRAGMA auto_vacuum") == [(2,)]
+
+    def test_existing_database_is_not_vacuumed(self, temp_db, capsys):
+        """Test a database made before incremental vacuum is left as is, with a hint."""
+        conn = sqlite3.connect(temp_db)
+        conn.execute("CREATE TABLE legacy (id INTEGER PRIMARY KEY)")
+        conn.close()
+
+        database.initialize_database()
+
+        assert _query(temp_db, "PRAGMA auto_vacuum") == [(0,)]
+        assert "PRAGMA auto_vacuum = INCREMENTAL; VACUUM;" in capsys.readouterr().out
+
+    @pytest.mark.usefixtures("temp_db")
+    def test_reclaim_free_pages_shrinks_file(self):
+        """Test pages freed by dropping PGN are returned to the file system."""
+        database.initialize_database()
+        raw_games.save_raw_games_batch(
+            [RawGame(file_id=1, pgn="x" * 10_000, processed=True) for _ in range(100)]
+        )
+        size_before = database.database_size_gb()
+
+        raw_games.drop_processed_pgn()
+        assert database.reclaim_free_pages() > 0
+
+        assert database.database_size_gb() < size_before / 2
+        assert database.reclaim_free_pages() == 0
+
+    def test_over_size_budget_drops_pgn_before_giving_up(self, temp_db):
+        """Test the budget is only reported as reached once nothing can be reclaimed."""
+        database.initialize_database()
+        raw_games.save_raw_games_batch(
+            [RawGame(file_id=1, pgn="x" * 10_000, processed=True) for _ in range(100)]
+        )
+        size_gb = database.database_size_gb()
+
+        assert database.over_size_budget(max_size_gb=2 * size_gb) is False
+        assert _query(temp_db, "SELECT COUNT(*) FROM raw_games WHERE pgn != ''") == [(100,)]
+
+        assert database.over_size_budget(max_size_gb=size_gb / 2) is False
+        assert _query(temp_db, "SELECT COUNT(*) FROM raw_games WHERE pgn != ''") == [(0,)]
+
+        assert database.over_size_budget(max_size_gb=database.database_size_gb()) is True
@@ -11,14 +11,9 @@ from packages.train.src.dataset.repositories import database, files_metadata
 
 
 @pytest.fixture
-def temp_db(tmp_path):
+def temp_db(db_file):
     """Create a temporary database for testing."""
-    db_path = tmp_path / "test.db"
-    with (
-        patch("packages.train.src.dataset.repositories.db_utils.DB_FILE", str(db_path)),
-        patch("packages.train.src.dataset.repositories.files_metadata.DB_FILE", str(db_path)),
-    ):
-        yield str(db_path)
+    return db_file
 
 
 class TestDatabaseInitialization:
@@ -62,13 +57,8 @@ class TestFilesMetadataTable:
     @pytest.fixture(autouse=True)
     def setup_db(self, temp_db):
         """Initialize database before each test."""
-        with (
-            patch("packages.train.src.dataset.repositories.database.DB_FILE", temp_db),
-            patch("packages.train.src.dataset.repositories.files_metadata.DB_FILE", temp_db),
-            patch("packages.train.src.dataset.repositories.db_utils.DB_FILE", temp_db),
-        ):
-            database.initialize_database()
-            self.db_path = temp_db
+        database.initialize_database()
+        self.db_path = temp_db
 
     def test_save_file_metadata(self, temp_db):
         """Test saving a single FileMetadata object."""
@@ -155,6 +145,51 @@ class TestFilesMetadataTable:
             conn.close()
             assert count == 3
 
+    def test_save_files_metadata_upserts_existing_urls(self, temp_db):
+        """Test that re-saving known URLs keeps ids and progress but refreshes counts."""
+        with patch("packages.train.src.dataset.repositories.files_metadata.DB_FILE", temp_db):
+            old = FileMetadata(
+                url="https://example.com/file1.pgn", filename="file1.pgn", games=10, size_gb=0.1
+            )
+            files_metadata.save_file_metadata(old)
+            files_metadata.mark_file_as_processed(old)
+
+            refreshed = FileMetadata(
+                url="https://example.com/file1.pgn", filename="file1.pgn", games=50, size_gb=0.4
+            )
+            new = FileMetadata(
+                url="https://example.com/file2.pgn", filename="file2.pgn", games=20, size_gb=0.2
+            )
+            files_metadata.save_files_metadata([refreshed, new])
+
+            assert refreshed.id == old.id
+            assert new.id is not None and new.id != old.id
+
+        conn = sqlite3.connect(temp_db)
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT games, size_gb, processed FROM files_metadata WHERE url = ?", (old.url,)
+        )
+        row = cursor.fetchone()
+        cursor.execute("SELECT COUNT(*) FROM files_metadata")
+        count = cursor.fetchone()[0]
+        conn.close()
+        assert row == (50, 0.4, 1)
+        assert count == 2
+
+    def test_update_files_games(self, temp_db):
+        """Test refreshing game counts of known files by filename."""
+        with patch("packages.train.src.dataset.repositories.files_metadata.DB_FILE", temp_db):
+            metadata = FileMetadata(
+                url="https://example.com/file.pgn", filename="file.pgn", games=10, size_gb=0.1
+            )
+            files_metadata.save_file_metadata(metadata)
+
+            files_metadata.update_files_games({"file.pgn": 42, "unknown.pgn": 7})
+
+            fetched = list(files_metadata.fetch_all_files_metadata())
+            assert [(f.filename, f.games) for f in fetched] == [("file.pgn", 42)]
+
     def test_mark_file_as_processed(self, temp_db):
         """Test marking a file as processed."""
         with patch("packages.train.src.dataset.repositories.files_metadata.DB_FILE", temp_db):
@@ -322,3 +357,22 @@ class TestFilesMetadataTable:
             files_metadata.ensure_metadata_exists()
 
             mock_fetch.assert_not_called()
+
+    def test_migration_adds_progress_column_to_old_schema(self, temp_db):
+        """Test databases created before progress tracking gain the new column."""
+        conn = sqlite3.connect(temp_db)
+        conn.execute("DROP TABLE files_metadata")
+        conn.execute(
+            "CREATE TABLE files_metadata (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT UNIQUE, "
+            "filename TEXT, games INTEGER, size_gb REAL, processed INTEGER DEFAULT 0)"
+        )
+        conn.commit()
+        conn.close()
+
+        files_metadata.add_games_consumed_column(temp_db)
+        files_metadata.add_games_consumed_column(temp_db)
+
+        conn = sqlite3.connect(temp_db)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(files_metadata)")}
+        conn.close()
+        assert "games_consumed" in columns
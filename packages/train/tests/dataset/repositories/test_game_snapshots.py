@@ -5,23 +5,36 @@ from unittest.mock import patch
 
 import pytest
 
+from packages.train.src.dataset.codecs.position_codec import (
+    fen_to_position,
+    move_code_to_san,
+    position_to_fen,
+    san_to_move_code,
+)
 from packages.train.src.dataset.models.game_snapshot import GameSnapshot
 from packages.train.src.dataset.repositories import database, game_snapshots
+from packages.train.src.dataset.repositories.connection import get_connection
+
+_AFTER_E4 = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+
+
+def _snapshot(move_number: int = 1, fen: str = _AFTER_E4, move: str = "e5", **kwargs):
+    """Build a snapshot from a FEN and a SAN move."""
+    return GameSnapshot(
+        raw_game_id=kwargs.pop("raw_game_id", 1),
+        move_number=move_number,
+        turn=fen.split()[1],
+        move_code=san_to_move_code(fen, move),
+        position=fen_to_position(fen),
+        **kwargs,
+    )
 
 
 @pytest.fixture
-def temp_db(tmp_path):
+def temp_db(db_file):
     """Create a temporary database for testing."""
-    db_path = tmp_path / "test.db"
-    with (
-        patch("packages.train.src.dataset.repositories.db_utils.DB_FILE", str(db_path)),
-        patch("packages.train.src.dataset.repositories.database.DB_FILE", str(db_path)),
-        patch("packages.train.src.dataset.repositories.game_snapshots.DB_FILE", str(db_path)),
-        patch("packages.train.src.dataset.repositories.files_metadata.DB_FILE", str(db_path)),
-        patch("packages.train.src.dataset.repositories.raw_games.DB_FILE", str(db_path)),
-    ):
-        database.initialize_database()
-        yield str(db_path)
+    database.initialize_database()
+    return db_file
 
 
 class TestGameSnapshotsTable:
@@ -29,8 +42,7 @@ class TestGameSnapshotsTable:
 
     def test_create_table(self, temp_db):
         """Test creating the game_snapshots table."""
-        with patch("packages.train.src.dataset.repositories.game_snapshots.DB_FILE", temp_db):
-            game_snapshots.create_game_snapshots_table()
+        game_snapshots.create_game_snapshots_table(temp_db)
 
         conn = sqlite3.connect(temp_db)
         cursor = conn.cursor()
@@ -40,8 +52,8 @@ class TestGameSnapshotsTable:
         assert cursor.fetchone() is not None
         conn.close()
 
-    def test_table_has_fen_column(self, temp_db):
-        """Test that table has fen column instead of 64 square columns."""
+    def test_table_has_packed_columns(self, temp_db):
+        """Test that table stores packed positions and move codes, not FEN and SAN."""
         conn = sqlite3.connect(temp_db)
         cursor = conn.cursor()
         cursor.execute("PRAGMA table_info(game_snapshots)")
@@ -49,7 +61,8 @@ class TestGameSnapshotsTable:
         conn.close()
 
         column_names = [col[1] for col in columns]
-        assert "fen" in column_names
+        assert {"position", "move_code"} <= set(column_names)
+        assert not {"fen", "move"} & set(column_names)
         # Ensure we don't have old square_ columns
         square_columns = [col for col in column_names if col.startswith("square_")]
         assert len(square_columns) == 0
@@ -62,42 +75,25 @@ class TestGameSnapshotsTable:
     def test_save_snapshot(self, temp_db):
         """Test saving a single snapshot."""
         with patch("packages.train.src.dataset.repositories.game_snapshots.DB_FILE", temp_db):
-            fen = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
-            snapshot = GameSnapshot(
-                raw_game_id=1,
-                move_number=1,
-                turn="w",
-                move="e4",
-                fen=fen,
-            )
+            snapshot = _snapshot()
             game_snapshots.save_snapshot(snapshot)
 
             conn = sqlite3.connect(temp_db)
             cursor = conn.cursor()
             cursor.execute(
-                "SELECT * FROM game_snapshots WHERE raw_game_id = ? AND move_number = ?", (1, 1)
+                "SELECT move_code, position FROM game_snapshots "
+                "WHERE raw_game_id = ? AND move_number = ?",
+                (1, 1),
             )
             row = cursor.fetchone()
             conn.close()
 
-            assert row is not None
-            assert row[4] == "e4"  # move
-            assert row[5] == fen  # fen
+            assert row == (snapshot.move_code, snapshot.position)
 
     def test_save_multiple_snapshots(self, temp_db):
         """Test saving multiple snapshots."""
         with patch("packages.train.src.dataset.repositories.game_snapshots.DB_FILE", temp_db):
-            fen = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
-            snapshots = [
-                GameSnapshot(
-                    raw_game_id=1,
-                    move_number=i,
-                    turn="w",
-                    move=f"move{i}",
-                    fen=fen,
-                )
-                for i in range(5)
-            ]
+            snapshots = [_snapshot(move_number=i) for i in range(5)]
             game_snapshots.save_snapshots(snapshots)
 
             conn = sqlite3.connect(temp_db)
@@ -111,17 +107,7 @@ class TestGameSnapshotsTable:
     def test_count_snapshots(self, temp_db):
         """Test counting snapshots in the database."""
         with patch("packages.train.src.dataset.repositories.game_snapshots.DB_FILE", temp_db):
-            fen = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
-            snapshots = [
-                GameSnapshot(
-                    raw_game_id=1,
-                    move_number=i,
-                    turn="w",
-                    move=f"move{i}",
-                    fen=fen,
-                )
-                for i in range(10)
-            ]
+            snapshots = [_snapshot(move_number=i) for i in range(10)]
             game_snapshots.save_snapshots(snapshots)
 
             count = game_snapshots.count_snapshots()
@@ -133,84 +119,115 @@ class TestGameSnapshotsTable:
             count = game_snapshots.count_snapshots()
             assert count == 0
 
+    def test_count_snapshots_reads_maintained_counter(self, temp_db):
+        """Test the count comes from the row_counts table kept up to date by inserts."""
+        with patch("packages.train.src.dataset.repositories.game_snapshots.DB_FILE", temp_db):
+            snapshot = _snapshot()
+            game_snapshots.save_snapshots_batch([snapshot] * 3)
+            game_snapshots.save_snapshot(snapshot)
+
+            conn = sqlite3.connect(temp_db)
+            row = conn.execute(
+                "SELECT row_count FROM row_counts WHERE table_name = 'game_snapshots'"
+            ).fetchone()
+            # Rows written behind the repository's back are not seen by the counter
+            conn.execute("INSERT INTO game_snapshots (raw_game_id) VALUES (1)")
+            conn.commit()
+            conn.close()
+
+            assert row == (4,)
+            assert game_snapshots.count_snapshots() == 4
+
+    def test_count_snapshots_seeds_counter_from_existing_rows(self, temp_db):
+        """Test a table filled before counters existed is counted and then tracked."""
+        conn = sqlite3.connect(temp_db)
+        conn.execute("DELETE FROM row_counts")
+        conn.executemany(
+            "INSERT INTO game_snapshots (raw_game_id) VALUES (?)", [(i,) for i in range(6)]
+        )
+        conn.commit()
+        conn.close()
+
+        with patch("packages.train.src.dataset.repositories.game_snapshots.DB_FILE", temp_db):
+            assert game_snapshots.count_snapshots() == 6
+            snapshot = _snapshot()
+            game_snapshots.save_snapshots_batch([snapshot, snapshot])
+            assert game_snapshots.count_snapshots() == 8
+
+    def test_count_snapshots_leaves_open_transaction_alone(self, temp_db):
+        """Test counting without a counter does not commit the caller's pending writes."""
+        conn = get_connection(temp_db)
+        conn.execute("DELETE FROM row_counts")
+        conn.commit()
+        conn.execute("INSERT INTO game_snapshots (raw_game_id) VALUES (1)")
+
+        assert game_snapshots.count_snapshots() == 1
+        conn.rollback()
+
+        assert game_snapshots.count_snapshots() == 0
+
+    def test_migration_seeds_counters_of_existing_tables(self, temp_db):
+        """Test databases filled before counters were seeded get them from the migration."""
+        conn = sqlite3.connect(temp_db)
+        conn.execute("DELETE FROM row_counts")
+        conn.execute("INSERT INTO game_snapshots (raw_game_id) VALUES (1)")
+        conn.commit()
+        conn.close()
+
+        database._seed_row_counts(temp_db)
+
+        conn = sqlite3.connect(temp_db)
+        rows = conn.execute("SELECT table_name, row_count FROM row_counts ORDER BY 1").fetchall()
+        conn.close()
+        assert rows == [("game_snapshots", 1), ("processed_snapshots", 0)]
+
     def test_save_snapshot_different_fen_positions(self, temp_db):
         """Test saving snapshots with different FEN positions."""
         with patch("packages.train.src.dataset.repositories.game_snapshots.DB_FILE", temp_db):
             # Starting position after 1. e4
-            fen1 = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
+            fen1 = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
             # After 1. e4 e5
-            fen2 = "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e6 0 2"
-
-            snapshot1 = GameSnapshot(
-                raw_game_id=1,
-                move_number=1,
-                turn="w",
-                move="e4",
-                fen=fen1,
-            )
-            snapshot2 = GameSnapshot(
-                raw_game_id=1,
-                move_number=2,
-                turn="b",
-                move="e5",
-                fen=fen2,
-            )
+            fen2 = "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2"
+
+            snapshot1 = _snapshot(move_number=1, fen=fen1, move="e5")
+            snapshot2 = _snapshot(move_number=2, fen=fen2, move="Nf3")
 
             game_snapshots.save_snapshot(snapshot1)
             game_snapshots.save_snapshot(snapshot2)
 
-            # Verify FENs were saved correctly
+            # Verify the positions decode to the saved FENs
             conn = sqlite3.connect(temp_db)
             cursor = conn.cursor()
-            cursor.execute(
-                "SELECT fen FROM game_snapshots WHERE raw_game_id = ? AND move_number = ?", (1, 1)
-            )
-            saved_fen1 = cursor.fetchone()[0]
-            cursor.execute(
-                "SELECT fen FROM game_snapshots WHERE raw_game_id = ? AND move_number = ?", (1, 2)
-            )
-            saved_fen2 = cursor.fetchone()[0]
+            cursor.execute("SELECT position FROM game_snapshots ORDER BY move_number")
+            positions = [row[0] for row in cursor.fetchall()]
             conn.close()
 
-            assert saved_fen1 == fen1
-            assert saved_fen2 == fen2
+            assert [position_to_fen(position) for position in positions] == [fen1, fen2]
 
     def test_save_snapshot_basic(self, temp_db):
         """Test saving a basic snapshot."""
         with patch("packages.train.src.dataset.repositories.game_snapshots.DB_FILE", temp_db):
-            fen = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
-            snapshot = GameSnapshot(
-                raw_game_id=1,
-                move_number=1,
-                turn="w",
-                move="e4",
-                fen=fen,
-            )
-            game_snapshots.save_snapshot(snapshot)
+            game_snapshots.save_snapshot(_snapshot())
 
             conn = sqlite3.connect(temp_db)
             cursor = conn.cursor()
             cursor.execute(
-                "SELECT move, fen FROM game_snapshots WHERE raw_game_id = ? AND move_number = ?",
+                "SELECT position, move_code FROM game_snapshots "
+                "WHERE raw_game_id = ? AND move_number = ?",
                 (1, 1),
             )
-            row = cursor.fetchone()
+            position, move_code = cursor.fetchone()
             conn.close()
 
-            assert row[0] == "e4"
-            assert row[1] == fen
+            assert len(position) <= 40
+            assert position_to_fen(position) == _AFTER_E4
+            assert move_code_to_san(position, move_code) == "e5"
 
     def test_save_snapshot_high_move_number(self, temp_db):
         """Test saving a snapshot with high move number."""
         with patch("packages.train.src.dataset.repositories.game_snapshots.DB_FILE", temp_db):
             fen = "8/6k1/8/8/8/8/6K1/8 w - - 0 75"
-            snapshot = GameSnapshot(
-                raw_game_id=1,
-                move_number=150,
-                turn="w",
-                move="Kg3",
-                fen=fen,
-            )
+            snapshot = _snapshot(move_number=150, fen=fen, move="Kg3")
             game_snapshots.save_snapshot(snapshot)
 
             conn = sqlite3.connect(temp_db)
@@ -227,23 +244,193 @@ class TestGameSnapshotsTable:
     def test_save_snapshot_complex_move(self, temp_db):
         """Test saving snapshots with complex move notation."""
         with patch("packages.train.src.dataset.repositories.game_snapshots.DB_FILE", temp_db):
-            fen = "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1"
-            moves = ["e4", "Nf3", "O-O", "Qxd8+", "Rxd8#"]
-
-            for i, move in enumerate(moves):
-                snapshot = GameSnapshot(
-                    raw_game_id=1,
-                    move_number=i,
-                    turn="w",
-                    move=move,
-                    fen=fen,
-                )
-                game_snapshots.save_snapshot(snapshot)
+            # Castling, mating captures and (under)promotions
+            fen = "3q2k1/1P3ppp/8/8/8/8/5PPP/R2QK2R w KQ - 0 30"
+            moves = ["O-O", "Qxd8#", "Rxd8#", "b8=N", "bxa8=R#"]
+            fens = [fen, fen, "3q2k1/5ppp/8/8/8/8/5PPP/3RK2R w K - 0 31", fen]
+            fens.append("r5k1/1P3ppp/8/8/8/8/5PPP/4K2R w K - 0 32")
+
+            for i, (position_fen, move) in enumerate(zip(fens, moves, strict=True)):
+                game_snapshots.save_snapshot(_snapshot(move_number=i, fen=position_fen, move=move))
 
             conn = sqlite3.connect(temp_db)
             cursor = conn.cursor()
-            cursor.execute("SELECT move FROM game_snapshots ORDER BY move_number")
+            cursor.execute("SELECT position, move_code FROM game_snapshots ORDER BY move_number")
             rows = cursor.fetchall()
             conn.close()
 
-            assert [row[0] for row in rows] == moves
+            assert [move_code_to_san(*row) for row in rows] == moves
+
+
+class TestSnapshotBatches:
+    """Tests for keyset-paginated snapshot batches."""
+
+    @pytest.fixture
+    def five_snapshots(self, temp_db):
+        """Five snapshots of two games; only game 1 has statistics."""
+        with patch("packages.train.src.dataset.repositories.game_snapshots.DB_FILE", temp_db):
+            game_snapshots.save_snapshots_batch(
+                [
+                    _snapshot(
+                        raw_game_id=raw_game_id,
+                        move_number=move_number,
+                        white_elo=1500 if raw_game_id == 1 else None,
+                        black_elo=1600 if raw_game_id == 1 else None,
+                        result="1-0" if raw_game_id == 1 else None,
+                    )
+                    for raw_game_id, move_number in [(1, 1), (1, 2), (2, 1), (1, 3), (1, 4)]
+                ]
+            )
+        return temp_db
+
+    def test_batch_resumes_after_id(self, five_snapshots):
+        """Test a batch starts after the given id rather than at an offset."""
+        with patch(
+            "packages.train.src.dataset.repositories.game_snapshots.DB_FILE", five_snapshots
+        ):
+            rows = game_snapshots.get_snapshots_batch(after_id=2, batch_size=10)
+
+        # Snapshot 3 has no statistics and is skipped
+        assert [row[0] for row in rows] == [4, 5]
+        assert rows[0][4:] == (1500, 1600, "1-0")
+
+    def test_last_snapshot_id_skips_rows_without_statistics(self, five_snapshots):
+        """Test the last id is that of the last snapshot with statistics."""
+        with patch(
+            "packages.train.src.dataset.repositories.game_snapshots.DB_FILE", five_snapshots
+        ):
+            game_snapshots.save_snapshots_batch([_snapshot(raw_game_id=2, move_number=2)])
+
+            assert game_snapshots.get_last_snapshot_id() == 5
+            assert game_snapshots.get_last_snapshot_id(max_snapshots=3) == 4
+            assert game_snapshots.get_last_snapshot_id(max_snapshots=10) == 5
+            assert game_snapshots.get_last_snapshot_id(max_snapshots=0) == 0
+
+    def test_iter_batches_streams_every_row_once(self, five_snapshots):
+        """Test the generator yields consecutive id-ordered batches."""
+        with patch(
+            "packages.train.src.dataset.repositories.game_snapshots.DB_FILE", five_snapshots
+        ):
+            batches = list(game_snapshots.iter_snapshots_batches(batch_size=2))
+
+        assert [[row[0] for row in batch] for batch in batches] == [[1, 2], [4, 5]]
+
+    def test_iter_batches_after_id(self, five_snapshots):
+        """Test the generator starts after after_id."""
+        with patch(
+            "packages.train.src.dataset.repositories.game_snapshots.DB_FILE", five_snapshots
+        ):
+            batches = list(game_snapshots.iter_snapshots_batches(after_id=4, batch_size=2))
+
+        assert [[row[0] for row in batch] for batch in batches] == [[5]]
+
+
+class TestStatisticsColumns:
+    """Tests for the denormalised statistics columns."""
+
+    def test_saves_statistics_inline(self, temp_db):
+        """Test snapshots store their game's Elo, result and event class."""
+        snapshot = _snapshot(
+            white_elo=1500,
+            black_elo=1600,
+            result="0-1",
+            event_class="Rated Blitz game",
+        )
+        with patch("packages.train.src.dataset.repositories.game_snapshots.DB_FILE", temp_db):
+            game_snapshots.save_snapshot(snapshot)
+
+        conn = sqlite3.connect(temp_db)
+        row = conn.execute(
+            "SELECT white_elo, black_elo, result, event_class FROM game_snapshots"
+        ).fetchone()
+        conn.close()
+
+        assert row == (1500, 1600, "0-1", "Rated Blitz game")
+
+    def test_migration_backfills_existing_snapshots(self, tmp_path):
+        """Test a version 1 database gets the columns filled from game_statistics."""
+        db_path = str(tmp_path / "v1.db")
+        conn = sqlite3.connect(db_path)
+        conn.executescript(
+            """
+            CREATE TABLE game_snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, raw_game_id INTEGER,
+                move_number INTEGER, turn TEXT, move TEXT, fen TEXT
+            );
+            CREATE TABLE game_statistics (
+                raw_game_id INTEGER UNIQUE, event TEXT, result TEXT,
+                white_elo INTEGER, black_elo INTEGER
+            );
+            INSERT INTO game_snapshots (raw_game_id, move_number) VALUES (1, 1), (2, 1);
+            INSERT INTO game_statistics VALUES
+                (1, 'Rated Blitz tournament https://lichess.org/tournament/abc', '1-0', 1500, 1600);
+            """
+        )
+        conn.commit()
+        conn.close()
+
+        game_snapshots.add_statistics_columns(db_path)
+
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute(
+            "SELECT white_elo, black_elo, result, event_class FROM game_snapshots ORDER BY id"
+        ).fetchall()
+        conn.close()
+
+        assert rows == [
+            (1500, 1600, "1-0", "Rated Blitz tournament"),
+            (None, None, None, None),
+        ]
+
+
+def _v2_database(db_path: str, rows: list[tuple]) -> None:
+    """Create a version 2 game_snapshots table holding (raw_game_id, move, fen, result) rows."""
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        """
+        CREATE TABLE game_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, raw_game_id INTEGER,
+            move_number INTEGER, turn TEXT, move TEXT, fen TEXT, result TEXT
+        )
+        """
+    )
+    conn.executemany(
+        "INSERT INTO game_snapshots (raw_game_id, move, fen, result) VALUES (?, ?, ?, ?)", rows
+    )
+    conn.commit()
+    conn.close()
+
+
+class TestPackedColumns:
+    """Tests for the binary position and move columns."""
+
+    def test_migration_packs_existing_snapshots(self, tmp_path):
+        """Test a version 2 database gets its fen and SAN converted and dropped."""
+        db_path = str(tmp_path / "v2.db")
+        _v2_database(db_path, [(1, "e5", _AFTER_E4, "1-0"), (2, None, None, None)])
+
+        game_snapshots.pack_snapshot_columns(db_path)
+
+        conn = sqlite3.connect(db_path)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(game_snapshots)")}
+        rows = conn.execute("SELECT position, move_code FROM game_snapshots ORDER BY id").fetchall()
+        conn.close()
+
+        assert not {"fen", "move"} & columns
+        assert position_to_fen(rows[0][0]) == _AFTER_E4
+        assert move_code_to_san(*rows[0]) == "e5"
+        assert rows[1] == (None, None)
+
+    def test_migration_keeps_text_columns_if_a_row_cannot_be_converted(self, tmp_path):
+        """Test the fen and SAN are not dropped while a row would lose its position."""
+        db_path = str(tmp_path / "v2.db")
+        _v2_database(db_path, [(1, "e5", _AFTER_E4, "1-0"), (2, "e4", "not a fen", "1-0")])
+
+        with pytest.raises(RuntimeError, match="1 game_snapshots rows"):
+            game_snapshots.pack_snapshot_columns(db_path)
+
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute("SELECT fen, position FROM game_snapshots ORDER BY id").fetchall()
+        conn.close()
+
+        assert rows == [(_AFTER_E4, None), ("not a fen", None)]
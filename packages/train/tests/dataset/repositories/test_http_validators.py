@@ -0,0 +1,28 @@
+import pytest
+
+from packages.train.src.dataset.repositories import http_validators
+
+
+@pytest.fixture
+def temp_db(db_file):
+    http_validators.create_http_validators_table(db_file)
+    return db_file
+
+
+@pytest.mark.usefixtures("temp_db")
+class TestHttpValidators:
+    def test_empty_table_returns_no_validators(self):
+        """Nothing stored yet means unconditional requests."""
+        assert http_validators.fetch_http_validators() == {}
+
+    def test_save_replaces_existing_validators(self):
+        """Saving a URL twice keeps only the latest validators."""
+        http_validators.save_http_validators(
+            {"https://a": ('"v1"', None), "https://b": (None, "x")}
+        )
+        http_validators.save_http_validators({"https://a": ('"v2"', "y")})
+
+        assert http_validators.fetch_http_validators() == {
+            "https://a": ('"v2"', "y"),
+            "https://b": (None, "x"),
+        }
@@ -0,0 +1,226 @@
+"""Tests for the transactional ingest writer."""
+
+import io
+import sqlite3
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from packages.train.src.dataset.models.file_metadata import FileMetadata
+from packages.train.src.dataset.models.game_snapshot import GameSnapshot
+from packages.train.src.dataset.models.game_statistics import GameStatistics
+from packages.train.src.dataset.models.raw_game import RawGame
+from packages.train.src.dataset.repositories import database, files_metadata, ingest, raw_games
+
+
+@pytest.fixture
+def temp_db(db_file):
+    """Create a temporary database with two unprocessed raw games."""
+    database.initialize_database()
+    for _ in range(2):
+        raw_games.save_raw_game(RawGame(file_id=1, pgn="1. e4 *"))
+    return db_file
+
+
+def _query(db_path: str, sql: str) -> list[tuple]:
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def _chunk() -> tuple[list[GameStatistics], list[GameSnapshot], list[int]]:
+    statistics = [GameStatistics(raw_game_id=i, event="Test") for i in (1, 2)]
+    snapshots = [
+        GameSnapshot(raw_game_id=i, move_number=1, turn="w", move_code=0, position=b"")
+        for i in (1, 2)
+    ]
+    return statistics, snapshots, [1, 2]
+
+
+class TestSaveIngestChunk:
+    """Tests for save_ingest_chunk."""
+
+    def test_writes_everything(self, temp_db):
+        """Test statistics, snapshots, counters and processed flags are all written."""
+        ingest.save_ingest_chunk(*_chunk())
+
+        assert _query(temp_db, "SELECT COUNT(*) FROM game_statistics") == [(2,)]
+        assert _query(temp_db, "SELECT COUNT(*) FROM game_snapshots") == [(2,)]
+        assert _query(temp_db, "SELECT processed FROM raw_games ORDER BY id") == [(1,), (1,)]
+        assert _query(
+            temp_db, "SELECT row_count FROM row_counts WHERE table_name = 'game_snapshots'"
+        ) == [(2,)]
+
+    def test_drops_pgn_of_processed_games(self, temp_db):
+        """Test the PGN text is dropped with the processed flag unless configured otherwise."""
+        ingest.save_ingest_chunk(*_chunk())
+        for _ in range(2):
+            raw_games.save_raw_game(RawGame(file_id=1, pgn="1. d4 *"))
+        with patch.object(ingest, "KEEP_PROCESSED_PGN", True):
+            ingest.save_ingest_chunk([], [], [3, 4])
+
+        assert _query(temp_db, "SELECT pgn, processed FROM raw_games ORDER BY id") == [
+            ("", 1),
+            ("", 1),
+            ("1. d4 *", 1),
+            ("1. d4 *", 1),
+        ]
+
+    def test_failure_rolls_back_the_whole_chunk(self, temp_db):
+        """Test a failure after some inserts leaves the database untouched."""
+        with (
+            patch.object(ingest, "mark_raw_games_as_processed", side_effect=RuntimeError),
+            pytest.raises(RuntimeError),
+        ):
+            ingest.save_ingest_chunk(*_chunk())
+
+        assert _query(temp_db, "SELECT COUNT(*) FROM game_statistics") == [(0,)]
+        assert _query(temp_db, "SELECT COUNT(*) FROM game_snapshots") == [(0,)]
+        assert _query(temp_db, "SELECT processed FROM raw_games ORDER BY id") == [(0,), (0,)]
+
+
+def _file() -> FileMetadata:
+    file = FileMetadata(
+        url="https://example.com/a.pgn.zst", filename="a.pgn.zst", games=5, size_gb=0.1
+    )
+    files_metadata.save_file_metadata(file)
+    return file
+
+
+def _game(i: int, file_id: int | None) -> RawGame:
+    return RawGame(file_id=file_id, pgn="1. e4 *", game_index=i, site=f"https://lichess.org/{i}")
+
+
+class TestSaveDownloadedGames:
+    """Tests for save_downloaded_games and crash-safe resume."""
+
+    def test_commits_games_with_the_cursor(self, temp_db):
+        """Test the games and the file's cursor are stored together."""
+        file = _file()
+
+        inserted = ingest.save_downloaded_games(file, [_game(0, file.id), _game(2, file.id)], 3)
+
+        assert [g.id for g in inserted] == [3, 4]
+        assert file.games_consumed == 3
+        assert _query(temp_db, "SELECT games_consumed FROM files_metadata") == [(3,)]
+
+    def test_failure_keeps_games_and_cursor_consistent(self, temp_db):
+        """Test a failed batch neither stores its games nor advances the cursor."""
+        file = _file()
+
+        with (
+            patch.object(ingest, "set_file_progress", side_effect=RuntimeError),
+            pytest.raises(RuntimeError),
+        ):
+            ingest.save_downloaded_games(file, [_game(0, file.id)], 1)
+
+        assert file.games_consumed == 0
+        assert _query(temp_db, "SELECT games_consumed FROM files_metadata") == [(0,)]
+        assert _query(temp_db, "SELECT COUNT(*) FROM raw_games") == [(2,)]
+
+    def test_resume_after_crash_stores_every_game_once(self, temp_db):
+        """Test a run dying mid-file is resumed from its cursor without duplicates."""
+        import zstandard as zstd
+
+        from packages.train.src.dataset.requesters import raw_games as requester
+
+        file = _file()
+        pgn = "\n\n".join(
+            f'[Event "Rated Blitz game"]\n[Site "https://lichess.org/{i}"]\n\n1. e4 1-0'
+            for i in range(5)
+        )
+        compressed = zstd.ZstdCompressor().compress(pgn.encode())
+
+        def download(*_args, **_kwargs):
+            response = MagicMock(status_code=200)
+            response.raw = io.BytesIO(compressed)
+            return response
+
+        save = ingest.save_downloaded_games
+        calls = []
+
+        def crash_from_second_batch(*args):
+            calls.append(args)
+            if len(calls) >= 2:
+                raise KeyboardInterrupt
+            return save(*args)
+
+        with (
+            patch.object(requester.requests, "get", side_effect=download),
+            patch.object(requester, "save_downloaded_games", side_effect=crash_from_second_batch),
+            pytest.raises(KeyboardInterrupt),
+        ):
+            list(requester.fetch_raw_games_from_file(file, batch_size=2))
+
+        stored = files_metadata.fetch_file_metadata_by_filename("a.pgn.zst")
+        assert stored is not None and stored.games_consumed == 2
+        with patch.object(requester.requests, "get", side_effect=download):
+            resumed = list(requester.fetch_raw_games_from_file(stored, batch_size=2))
+
+        assert [g.game_index for g in resumed] == [2, 3, 4]
+        sites = _query(temp_db, "SELECT site FROM raw_games WHERE site IS NOT NULL ORDER BY id")
+        assert sites == [(f"https://lichess.org/{i}",) for i in range(5)]
+        assert _query(temp_db, "SELECT games_consumed FROM files_metadata") == [(5,)]
+
+
+def _index_names(db_path: str) -> set[str]:
+    rows = _query(db_path, "SELECT name FROM sqlite_master WHERE type = 'index' AND sql NOT NULL")
+    return {row[0] for row in rows}
+
+
+class TestBulkIngest:
+    """Tests for the bulk_ingest index lifecycle."""
+
+    def test_initialize_database_creates_indexes(self, temp_db):
+        """Test every declared secondary index exists after initialization."""
+        assert {
+            "idx_raw_games_unprocessed",
+            "idx_raw_games_unprocessed_file",
+            "idx_game_snapshots_raw_game_id",
+            "idx_game_statistics_eco",
+            "idx_game_statistics_time_control",
+            "idx_game_statistics_event_elo",
+        } <= _index_names(temp_db)
+
+    def test_drops_output_indexes_and_rebuilds_them(self, temp_db):
+        """Test output table indexes are gone inside the block and back afterwards."""
+        before = _index_names(temp_db)
+
+        with ingest.bulk_ingest():
+            inside = _index_names(temp_db)
+            ingest.save_ingest_chunk(*_chunk())
+
+        assert inside == {
+            "idx_raw_games_unprocessed",
+            "idx_raw_games_unprocessed_file",
+            "idx_raw_games_site",
+        }
+        assert _index_names(temp_db) == before
+
+    def test_rebuilds_indexes_after_failure(self, temp_db):
+        """Test indexes are rebuilt even if the ingest raises."""
+        before = _index_names(temp_db)
+
+        with pytest.raises(RuntimeError), ingest.bulk_ingest():
+            raise RuntimeError
+
+        assert _index_names(temp_db) == before
+
+    def test_disabled_keeps_indexes(self, temp_db):
+        """Test enabled=False leaves the indexes in place."""
+        before = _index_names(temp_db)
+
+        with ingest.bulk_ingest(enabled=False):
+            assert _index_names(temp_db) == before
+
+    def test_unprocessed_games_query_uses_index(self, temp_db):
+        """Test the unprocessed games reader is an index search, not a table scan."""
+        plan = _query(
+            temp_db,
+            "EXPLAIN QUERY PLAN SELECT id, file_id, pgn, processed FROM raw_games "
+            "WHERE processed = 0 AND id > 0 ORDER BY id LIMIT 10",
+        )
+
+        assert "USING INDEX idx_raw_games_unprocessed" in plan[0][3]
@@ -10,12 +10,10 @@ from packages.train.src.dataset.repositories import legal_move
 
 
 @pytest.fixture
-def temp_db(tmp_path):
+def temp_db(db_file):
     """Create a temporary database for testing."""
-    db_path = tmp_path / "test.db"
-    with patch("packages.train.src.dataset.repositories.legal_move.DB_FILE", str(db_path)):
-        legal_move.create_legal_moves_table()
-        yield str(db_path)
+    legal_move.create_legal_moves_table(db_file)
+    return db_file
 
 
 class TestLegalMovesRepository:
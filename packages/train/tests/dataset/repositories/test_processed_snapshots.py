@@ -0,0 +1,97 @@
+"""Tests for processed_snapshots repository."""
+
+import chess
+import numpy as np
+import pytest
+
+from packages.train.src.dataset.codecs.position_codec import (
+    pack_board,
+    unpack_piece_bitboards,
+)
+from packages.train.src.dataset.processers.processed_snapshots import ProcessedSnapshotsProcessor
+from packages.train.src.dataset.repositories import processed_snapshots
+from packages.train.src.dataset.repositories.connection import get_connection
+
+_FEN = "r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQ1RK1 b kq - 5 4"
+_METADATA = np.array([0.5, -0.5, 0.0, 1.0], dtype=np.float32)
+_VALID = np.array([3, 17, 2103], dtype="<u2")
+
+
+@pytest.fixture
+def temp_db(db_file):
+    """A temporary database holding only the processed_snapshots table."""
+    processed_snapshots.create_processed_snapshots_table(db_file)
+    return db_file
+
+
+def _row(snapshot_id: int, board: bytes) -> tuple:
+    return (snapshot_id, board, _METADATA.tobytes(), 1, _VALID.tobytes())
+
+
+@pytest.mark.usefixtures("temp_db")
+class TestProcessedSnapshots:
+    """Tests for saving and reading processed snapshots."""
+
+    def test_bitboards_round_trip(self):
+        """Test the stored 96 byte bitboards come back as the board planes."""
+        board = chess.Board(_FEN)
+        bitboards = unpack_piece_bitboards([pack_board(board)])[0]
+        processed_snapshots.save_processed_snapshots([_row(3, bitboards.astype("<u8").tobytes())])
+
+        snapshot = processed_snapshots.get_processed_snapshots_batch([3])[3]
+
+        np.testing.assert_array_equal(snapshot.bitboards, bitboards)
+        np.testing.assert_array_equal(
+            snapshot.board.numpy(), ProcessedSnapshotsProcessor.board_to_tensor(board).numpy()
+        )
+        np.testing.assert_array_equal(snapshot.metadata.numpy(), _METADATA)
+        assert snapshot.chosen_move == 1
+        assert snapshot.valid_moves.tolist() == [3, 17, 2103]
+
+    def test_pack_processed_boards_converts_float_planes(self, temp_db):
+        """Test boards stored as float32 planes are rewritten as bitboards."""
+        boards = [chess.Board(), chess.Board(_FEN)]
+        planes = [ProcessedSnapshotsProcessor.board_to_tensor(b).numpy() for b in boards]
+        processed_snapshots.save_processed_snapshots(
+            [_row(i + 1, p.tobytes()) for i, p in enumerate(planes)]
+        )
+
+        processed_snapshots.pack_processed_boards(temp_db)
+        processed_snapshots.pack_processed_boards(temp_db)  # Already packed rows are left alone
+
+        conn = get_connection(temp_db)
+        sizes = conn.execute("SELECT length(board) FROM processed_snapshots").fetchall()
+        assert sizes == [(96,), (96,)]
+        snapshots = processed_snapshots.get_processed_snapshots_batch([1, 2])
+        for i, expected in enumerate(planes):
+            np.testing.assert_array_equal(snapshots[i + 1].board.numpy(), expected)
+
+    def test_pack_valid_moves_converts_dense_masks(self, temp_db):
+        """Test legal moves stored as a float32 mask are rewritten as uint16 indices."""
+        mask = np.zeros(2104, dtype=np.float32)
+        mask[_VALID] = 1.0
+        processed_snapshots.save_processed_snapshots(
+            [
+                (1, b"", _METADATA.tobytes(), 1, mask.tobytes()),
+                (2, b"", _METADATA.tobytes(), 1, _VALID.tobytes()),
+            ]
+        )
+
+        processed_snapshots.pack_valid_moves(temp_db)
+
+        conn = get_connection(temp_db)
+        sizes = conn.execute("SELECT length(valid_moves) FROM processed_snapshots").fetchall()
+        assert sizes == [(6,), (6,)]
+        snapshots = processed_snapshots.get_processed_snapshots_batch([1, 2])
+        assert (
+            snapshots[1].valid_moves.tolist() == snapshots[2].valid_moves.tolist() == [3, 17, 2103]
+        )
+
+    def test_processed_snapshot_ids_skip_gaps(self):
+        """Test ids are returned in order by position, not by value."""
+        processed_snapshots.save_processed_snapshots(
+            [_row(snapshot_id, b"") for snapshot_id in [9, 2, 5, 10]]
+        )
+
+        assert processed_snapshots.get_processed_snapshot_ids(1, 2).tolist() == [5, 9]
+        assert processed_snapshots.get_processed_snapshot_ids(3, 5).tolist() == [10]
@@ -1,6 +1,7 @@
 """Tests for raw_games repository."""
 
 import sqlite3
+import threading
 from unittest.mock import patch
 
 import pytest
@@ -10,17 +11,10 @@ from packages.train.src.dataset.repositories import database, raw_games
 
 
 @pytest.fixture
-def temp_db(tmp_path):
+def temp_db(db_file):
     """Create a temporary database for testing."""
-    db_path = tmp_path / "test.db"
-    with (
-        patch("packages.train.src.dataset.repositories.db_utils.DB_FILE", str(db_path)),
-        patch("packages.train.src.dataset.repositories.database.DB_FILE", str(db_path)),
-        patch("packages.train.src.dataset.repositories.raw_games.DB_FILE", str(db_path)),
-        patch("packages.train.src.dataset.repositories.files_metadata.DB_FILE", str(db_path)),
-    ):
-        database.initialize_database()
-        yield str(db_path)
+    database.initialize_database()
+    return db_file
 
 
 class TestRawGamesTable:
@@ -28,8 +22,7 @@ class TestRawGamesTable:
 
     def test_create_table(self, temp_db):
         """Test creating the raw_games table."""
-        with patch("packages.train.src.dataset.repositories.raw_games.DB_FILE", temp_db):
-            raw_games.create_raw_games_table()
+        raw_games.create_raw_games_table(temp_db)
 
         conn = sqlite3.connect(temp_db)
         cursor = conn.cursor()
@@ -194,3 +187,138 @@ class TestRawGamesTable:
             fetched = raw_games.fetch_raw_games()
             assert len(fetched) == 1
             assert fetched[0].pgn == pgn
+
+    def test_fetch_unprocessed_pages_through_results(self, temp_db):
+        """Test unprocessed games are yielded in id order across several pages."""
+        with patch("packages.train.src.dataset.repositories.raw_games.DB_FILE", temp_db):
+            games = [RawGame(file_id=1, pgn=f"1. e4 e5 {i}", processed=False) for i in range(5)]
+            raw_games.save_raw_games(games)
+
+            unprocessed = list(raw_games.fetch_unprocessed_raw_games(batch_size=2))
+            assert [g.pgn for g in unprocessed] == [g.pgn for g in games]
+            ids = [g.id for g in unprocessed if g.id is not None]
+            assert len(ids) == len(unprocessed) and ids == sorted(ids)
+
+    def test_game_index_round_trips(self, temp_db):
+        """Test the position of a game in its archive is stored and fetched."""
+        with patch("packages.train.src.dataset.repositories.raw_games.DB_FILE", temp_db):
+            raw_games.save_raw_games_batch([RawGame(file_id=1, pgn="1. e4 *", game_index=41)])
+
+            assert raw_games.fetch_raw_games()[0].game_index == 41
+
+    def test_games_already_stored_are_skipped(self, temp_db):
+        """Test a game is stored once per site, and games without a site are kept."""
+        with patch("packages.train.src.dataset.repositories.raw_games.DB_FILE", temp_db):
+            first = RawGame(file_id=1, pgn="1. e4 *", site="https://lichess.org/a")
+            raw_games.save_raw_game(first)
+            games = [
+                RawGame(file_id=1, pgn="1. e4 *", site="https://lichess.org/a"),
+                RawGame(file_id=1, pgn="1. d4 *", site="https://lichess.org/b"),
+                RawGame(file_id=1, pgn="1. c4 *"),
+                RawGame(file_id=1, pgn="1. c4 *"),
+            ]
+
+            with sqlite3.connect(temp_db) as conn:
+                inserted = raw_games.insert_raw_games(conn.cursor(), games)
+
+            assert [g.pgn for g in inserted] == ["1. d4 *", "1. c4 *", "1. c4 *"]
+            assert games[0].id is None
+            assert all(g.id is not None for g in inserted)
+            assert [g.site for g in raw_games.fetch_raw_games()] == [
+                "https://lichess.org/a",
+                "https://lichess.org/b",
+                None,
+                None,
+            ]
+
+    def test_other_constraint_violations_are_raised(self, temp_db):
+        """Test only a duplicate site is skipped; other invalid games still fail."""
+        game = RawGame(file_id=1, pgn="1. e4 *", site="https://lichess.org/a")
+        game.pgn = None  # type: ignore[assignment]
+
+        with (
+            sqlite3.connect(temp_db) as conn,
+            pytest.raises(sqlite3.IntegrityError, match="NOT NULL"),
+        ):
+            raw_games.insert_raw_games(conn.cursor(), [game])
+
+    def test_drop_processed_pgn(self, temp_db):
+        """Test only processed games lose their PGN, in batches."""
+        with patch("packages.train.src.dataset.repositories.raw_games.DB_FILE", temp_db):
+            games = [RawGame(file_id=1, pgn=f"1. e4 e5 {i}", processed=i != 2) for i in range(5)]
+            raw_games.save_raw_games_batch(games)
+
+            assert raw_games.drop_processed_pgn(batch_size=2) == 4
+            assert raw_games.drop_processed_pgn() == 0
+            assert [g.pgn for g in raw_games.fetch_raw_games()] == ["", "", "1. e4 e5 2", "", ""]
+
+
+def _lichess_pgn(i: int) -> str:
+    return (
+        f'[Event "Rated Blitz game"]\n[Site "https://lichess.org/{i:08x}"]\n'
+        f'[White "player{i * 7919 % 10_007}"]\n[Black "player{i * 104_729 % 10_007}"]\n'
+        f'[Result "1-0"]\n[WhiteElo "{1200 + i % 500}"]\n[BlackElo "{1300 + i % 400}"]\n'
+        f'[TimeControl "300+0"]\n[Termination "Normal"]\n\n1. e4 e5 2. Nf3 Nc6 {i} 1-0'
+    )
+
+
+class TestPgnCompression:
+    """Tests for the transparent zstd dictionary compression of PGN text."""
+
+    def test_compresses_after_training_and_reads_back_text(self, temp_db):
+        """Test games are stored as dictionary-compressed BLOBs once enough were seen."""
+        games = [RawGame(file_id=1, pgn=_lichess_pgn(i)) for i in range(60)]
+        with (
+            patch("packages.train.src.dataset.repositories.raw_games.DB_FILE", temp_db),
+            patch.object(raw_games, "_DICTIONARY_SAMPLES", 20),
+        ):
+            raw_games.save_raw_games_batch(games[:20])
+            raw_games.save_raw_games_batch(games[20:40])
+            for game in games[40:]:
+                raw_games.save_raw_game(game)
+
+            assert [g.pgn for g in raw_games.fetch_raw_games()] == [g.pgn for g in games]
+            assert [g.pgn for g in raw_games.fetch_unprocessed_raw_games(batch_size=7)] == [
+                g.pgn for g in games
+            ]
+
+        conn = sqlite3.connect(temp_db)
+        types = conn.execute(
+            "SELECT typeof(pgn), length(pgn) FROM raw_games ORDER BY id"
+        ).fetchall()
+        conn.close()
+        # Games stored before the dictionary existed stay plain text
+        assert {t for t, _ in types[:20]} == {"text"}
+        assert {t for t, _ in types[20:]} == {"blob"}
+        assert sum(n for _, n in types[20:]) * 3 < sum(len(g.pgn) for g in games[20:])
+
+    def test_counts_games_of_earlier_runs(self, temp_db):
+        """Test games stored by short runs in other threads add up to a dictionary."""
+        games = [RawGame(file_id=1, pgn=_lichess_pgn(i)) for i in range(24)]
+        with (
+            patch("packages.train.src.dataset.repositories.raw_games.DB_FILE", temp_db),
+            patch.object(raw_games, "_DICTIONARY_SAMPLES", 20),
+        ):
+            for start in range(0, 24, 8):
+                run = threading.Thread(
+                    target=raw_games.save_raw_games_batch, args=(games[start : start + 8],)
+                )
+                run.start()
+                run.join()
+
+            assert [g.pgn for g in raw_games.fetch_raw_games()] == [g.pgn for g in games]
+
+        conn = sqlite3.connect(temp_db)
+        assert conn.execute("SELECT COUNT(*) FROM pgn_dictionary").fetchone() == (1,)
+        conn.close()
+
+    def test_no_dictionary_below_sample_count(self, temp_db):
+        """Test small databases keep plain text."""
+        with patch("packages.train.src.dataset.repositories.raw_games.DB_FILE", temp_db):
+            raw_games.save_raw_games_batch(
+                [RawGame(file_id=1, pgn=_lichess_pgn(i)) for i in range(5)]
+            )
+
+        conn = sqlite3.connect(temp_db)
+        assert conn.execute("SELECT COUNT(*) FROM pgn_dictionary").fetchone() == (0,)
+        conn.close()
@@ -0,0 +1,184 @@
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from packages.train.src.dataset.models.file_metadata import FileMetadata
+from packages.train.src.dataset.requesters.archive_cache import ArchiveCache
+
+ARCHIVE = bytes(range(256)) * 64  # 16 KiB
+
+
+class _ArchiveServer:
+    """Local HTTP stand-in for the Lichess database host, with Range support."""
+
+    def __init__(self, body: bytes = ARCHIVE, support_range: bool = True):
+        self.body = body
+        self.support_range = support_range
+        self.requests: list[str | None] = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                range_header = self.headers.get("Range")
+                server.requests.append(range_header)
+                start = 0
+                if range_header and server.support_range:
+                    start = int(range_header.removeprefix("bytes=").rstrip("-"))
+                    if start >= len(server.body):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(server.body)}")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header(
+                        "Content-Range", f"bytes {start}-{len(server.body) - 1}/{len(server.body)}"
+                    )
+                else:
+                    self.send_response(200)
+                payload = server.body[start:]
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *_args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}/archive.pgn.zst"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def server():
+    srv = _ArchiveServer()
+    yield srv
+    srv.stop()
+
+
+@pytest.fixture
+def cache_dir():
+    with tempfile.TemporaryDirectory() as directory:
+        yield Path(directory)
+
+
+def _file_meta(url: str, filename: str = "archive.pgn.zst") -> FileMetadata:
+    # size_gb=0 disables the size sanity check for these tiny archives
+    return FileMetadata(id=1, url=url, filename=filename, games=0, size_gb=0)
+
+
+class TestArchiveCache:
+    def test_download_is_cached(self, server, cache_dir):
+        """A full read stores the archive; a second read costs no requests."""
+        cache = ArchiveCache(directory=cache_dir, chunk_size=1024)
+        file_meta = _file_meta(server.url)
+
+        path = cache.fetch(file_meta)
+
+        assert path.read_bytes() == ARCHIVE
+        assert cache.is_cached(file_meta)
+        assert server.requests == [None]
+
+        with cache.open(file_meta) as reader:
+            assert reader.read() == ARCHIVE
+        assert len(server.requests) == 1
+
+    def test_early_close_keeps_partial_download(self, server, cache_dir):
+        """Closing a reader before EOF leaves a .part file and no completed archive."""
+        cache = ArchiveCache(directory=cache_dir, chunk_size=1024)
+        file_meta = _file_meta(server.url)
+
+        with cache.open(file_meta) as reader:
+            data = reader.read(1024)
+
+        assert data == ARCHIVE[:1024]
+        assert not cache.is_cached(file_meta)
+        part = cache_dir / "archive.pgn.zst.part"
+        assert part.read_bytes() == ARCHIVE[:1024]
+
+    def test_resumes_partial_download_with_range(self, server, cache_dir):
+        """Bytes already on disk are served locally and the rest is requested by range."""
+        cache = ArchiveCache(directory=cache_dir, chunk_size=1024)
+        file_meta = _file_meta(server.url)
+        (cache_dir / "archive.pgn.zst.part").write_bytes(ARCHIVE[:5000])
+
+        with cache.open(file_meta) as reader:
+            data = b"".join(iter(lambda: reader.read(1024), b""))
+
+        assert data == ARCHIVE
+        assert server.requests == ["bytes=5000-"]
+        assert cache.path_for(file_meta).read_bytes() == ARCHIVE
+        assert not (cache_dir / "archive.pgn.zst.part").exists()
+
+    def test_complete_partial_file_is_finalized(self, server, cache_dir):
+        """A .part file that already holds every byte is renamed after a 416 response."""
+        cache = ArchiveCache(directory=cache_dir)
+        file_meta = _file_meta(server.url)
+        (cache_dir / "archive.pgn.zst.part").write_bytes(ARCHIVE)
+
+        assert cache.fetch(file_meta).read_bytes() == ARCHIVE
+        assert server.requests == [f"bytes={len(ARCHIVE)}-"]
+
+    def test_server_without_range_support(self, cache_dir):
+        """If the server ignores Range, already cached bytes are skipped in the response."""
+        srv = _ArchiveServer(support_range=False)
+        try:
+            cache = ArchiveCache(directory=cache_dir)
+            file_meta = _file_meta(srv.url)
+            (cache_dir / "archive.pgn.zst.part").write_bytes(ARCHIVE[:3000])
+
+            with cache.open(file_meta) as reader:
+                data = b"".join(iter(lambda: reader.read(1024), b""))
+
+            assert data == ARCHIVE
+            assert cache.path_for(file_meta).read_bytes() == ARCHIVE
+        finally:
+            srv.stop()
+
+    def test_size_mismatch_discards_download(self, server, cache_dir):
+        """An archive whose size disagrees with the metadata is not kept."""
+        cache = ArchiveCache(directory=cache_dir)
+        file_meta = FileMetadata(
+            id=1, url=server.url, filename="archive.pgn.zst", games=0, size_gb=5.0
+        )
+
+        with pytest.raises(ValueError, match="Size mismatch"):
+            cache.fetch(file_meta)
+
+        assert not cache.is_cached(file_meta)
+        assert not (cache_dir / "archive.pgn.zst.part").exists()
+
+    def test_evicts_least_recently_used(self, cache_dir):
+        """Archives are evicted oldest first until the cache fits its budget."""
+        cache = ArchiveCache(directory=cache_dir, max_size_gb=2500 / 1024**3)
+        for age, name in enumerate(["new.pgn.zst", "mid.pgn.zst", "old.pgn.zst"]):
+            path = cache_dir / name
+            path.write_bytes(b"x" * 1000)
+            os.utime(path, (1_000_000 - age * 100, 1_000_000 - age * 100))
+
+        evicted = cache.evict()
+
+        assert [p.name for p in evicted] == ["old.pgn.zst"]
+        assert sorted(p.name for p in cache_dir.iterdir()) == ["mid.pgn.zst", "new.pgn.zst"]
+
+    def test_evict_spares_kept_archive(self, cache_dir):
+        """The archive passed as keep survives even when it is the oldest."""
+        cache = ArchiveCache(directory=cache_dir, max_size_gb=1500 / 1024**3)
+        old = cache_dir / "old.pgn.zst"
+        new = cache_dir / "new.pgn.zst"
+        for age, path in enumerate([new, old]):
+            path.write_bytes(b"x" * 1000)
+            os.utime(path, (1_000_000 - age * 100, 1_000_000 - age * 100))
+
+        evicted = cache.evict(keep=old)
+
+        assert evicted == [new]
+        assert old.exists()
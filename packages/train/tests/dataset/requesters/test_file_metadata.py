@@ -0,0 +1,139 @@
+from unittest.mock import MagicMock, patch
+
+from packages.train.src.dataset.requesters import file_metadata
+from packages.train.src.dataset.requesters.file_metadata import (
+    fetch_files_metadata,
+    fetch_files_metadata_changes,
+)
+
+_LISTING = """
+<a href="lichess_db_standard_rated_2013-01.pgn.zst">2013-01</a>
+<a href="lichess_db_standard_rated_2013-02.pgn.zst">2013-02</a>
+<a href="lichess_db_standard_rated_2013-03.pgn.zst">2013-03</a>
+"""
+_COUNTS = """
+lichess_db_standard_rated_2013-01.pgn.zst 121,332
+lichess_db_standard_rated_2013-02.pgn.zst 123,961
+"""
+
+
+def _response(text: str = "", headers: dict | None = None) -> MagicMock:
+    response = MagicMock()
+    response.text = text
+    response.headers = headers or {}
+    return response
+
+
+class TestFetchFilesMetadata:
+    @patch("packages.train.src.dataset.requesters.file_metadata.requests.Session")
+    def test_heads_run_on_shared_session(self, mock_session_cls):
+        """Every request goes through one session and results keep listing order."""
+        session = mock_session_cls.return_value.__enter__.return_value
+        session.get.side_effect = lambda url: _response(
+            _COUNTS if url.endswith("counts.txt") else _LISTING
+        )
+        sizes = {"2013-01": 1024**3, "2013-02": 2 * 1024**3, "2013-03": 512 * 1024**2}
+        session.head.side_effect = lambda url: _response(
+            headers={"Content-Length": str(sizes[url[-15:-8]])}
+        )
+
+        files = list(fetch_files_metadata(max_workers=2))
+
+        assert [f.filename[-15:-8] for f in files] == ["2013-01", "2013-02", "2013-03"]
+        assert [f.size_gb for f in files] == [1.0, 2.0, 0.5]
+        assert [f.games for f in files] == [121332, 123961, 0]
+        assert session.head.call_count == 3
+        mock_session_cls.assert_called_once()
+
+    @patch("packages.train.src.dataset.requesters.file_metadata.requests.Session")
+    def test_missing_content_length_gives_zero_size(self, mock_session_cls):
+        """A HEAD response without Content-Length yields a size of zero."""
+        session = mock_session_cls.return_value.__enter__.return_value
+        session.get.side_effect = lambda url: _response(
+            _COUNTS if url.endswith("counts.txt") else _LISTING
+        )
+        session.head.return_value = _response()
+
+        files = list(fetch_files_metadata(max_workers=4))
+
+        assert len(files) == 3
+        assert all(f.size_gb == 0 for f in files)
+
+
+def _conditional_session(mock_session_cls, changed: dict[str, bool]) -> MagicMock:
+    """Session whose GETs return 304 for unchanged resources (keyed 'counts'/'listing')."""
+    session: MagicMock = mock_session_cls.return_value.__enter__.return_value
+
+    def get(url, headers=None):
+        key = "counts" if url.endswith("counts.txt") else "listing"
+        if headers and not changed[key]:
+            response = _response()
+            response.status_code = 304
+            return response
+        response = _response(
+            _COUNTS if key == "counts" else _LISTING,
+            headers={"ETag": f'"{key}-v2"', "Last-Modified": "Wed, 01 Jan 2025 00:00:00 GMT"},
+        )
+        response.status_code = 200
+        return response
+
+    session.get.side_effect = get
+    session.head.return_value = _response(headers={"Content-Length": str(1024**3)})
+    return session
+
+
+class TestFetchFilesMetadataChanges:
+    _KNOWN = [
+        "lichess_db_standard_rated_2013-01.pgn.zst",
+        "lichess_db_standard_rated_2013-02.pgn.zst",
+    ]
+
+    @patch("packages.train.src.dataset.requesters.file_metadata.requests.Session")
+    def test_unchanged_resources_return_none(self, mock_session_cls):
+        """Two 304 responses mean nothing to do and no HEAD requests."""
+        session = _conditional_session(mock_session_cls, {"counts": False, "listing": False})
+        validators: dict[str, tuple[str | None, str | None]] = dict.fromkeys(
+            (file_metadata._COUNTS_URL, file_metadata._BASE_URL), ('"old"', None)
+        )
+
+        assert fetch_files_metadata_changes(self._KNOWN, validators) is None
+
+        for call in session.get.call_args_list:
+            assert call.kwargs["headers"] == {"If-None-Match": '"old"'}
+        session.head.assert_not_called()
+
+    @patch("packages.train.src.dataset.requesters.file_metadata.requests.Session")
+    def test_only_new_files_are_requested(self, mock_session_cls):
+        """A changed listing triggers HEAD requests for unseen filenames only."""
+        session = _conditional_session(mock_session_cls, {"counts": True, "listing": True})
+
+        changes = fetch_files_metadata_changes(self._KNOWN, validators={})
+
+        assert changes is not None
+        assert [f.filename for f in changes.new_files] == [
+            "lichess_db_standard_rated_2013-03.pgn.zst"
+        ]
+        assert changes.new_files[0].size_gb == 1.0
+        assert changes.counts["lichess_db_standard_rated_2013-02.pgn.zst"] == 123961
+        assert set(changes.validators.values()) == {
+            ('"counts-v2"', "Wed, 01 Jan 2025 00:00:00 GMT"),
+            ('"listing-v2"', "Wed, 01 Jan 2025 00:00:00 GMT"),
+        }
+        session.head.assert_called_once()
+
+    @patch("packages.train.src.dataset.requesters.file_metadata.requests.Session")
+    def test_unchanged_counts_are_refetched_for_new_files(self, mock_session_cls):
+        """New archives still get game counts when counts.txt answered 304."""
+        session = _conditional_session(mock_session_cls, {"counts": False, "listing": True})
+        known = ["lichess_db_standard_rated_2013-01.pgn.zst"]
+        validators: dict[str, tuple[str | None, str | None]] = {
+            file_metadata._COUNTS_URL: ('"old"', None)
+        }
+
+        changes = fetch_files_metadata_changes(known, validators)
+
+        assert changes is not None
+        assert [f.games for f in changes.new_files] == [123961, 0]
+        # counts.txt did not change, so existing rows need no update
+        assert changes.counts == {}
+        assert session.get.call_count == 3
@@ -0,0 +1,127 @@
+"""Tests for the byte-offset index of local PGN archives."""
+
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+import zstandard as zstd
+
+from packages.train.src.dataset.repositories import pgn_offsets
+from packages.train.src.dataset.requesters.pgn_index import (
+    index_pgn_archive,
+    read_indexed_game,
+    seekable_path,
+)
+
+
+def _game(i: int) -> str:
+    return (
+        f'[Event "Rated Blitz game"]\n[Site "https://lichess.org/g{i:05d}"]\n'
+        f'[WhiteElo "{1500 + i}"]\n[BlackElo "?"]\n[Result "1-0"]\n\n'
+        f"1. e4 e5 2. Qh5 Nc6 3. Bc4 Nf6 4. Qxf7# 1-0"
+    )
+
+
+_GAMES = [_game(i) for i in range(300)]
+_PGN = "\n\n\n".join(_GAMES) + "\n"
+
+
+@pytest.fixture
+def temp_db(db_file):
+    """A temporary database holding only the pgn_offsets table."""
+    pgn_offsets.create_pgn_offsets_table(db_file)
+    return db_file
+
+
+@pytest.mark.usefixtures("temp_db")
+class TestIndexPgnArchive:
+    """Tests for index_pgn_archive and read_indexed_game."""
+
+    def test_plain_pgn_is_indexed_in_place(self, tmp_path):
+        """Test every game of a .pgn is read back from its offset."""
+        path = tmp_path / "games.pgn"
+        path.write_text(_PGN)
+
+        archive = index_pgn_archive(path, buffer_size=97)
+
+        assert archive == path
+        assert pgn_offsets.count_pgn_offsets(str(archive)) == len(_GAMES)
+        for game_index in [0, 1, 150, len(_GAMES) - 1]:
+            assert read_indexed_game(archive, game_index) == _GAMES[game_index]
+        offset = pgn_offsets.fetch_pgn_offset(str(archive), 0)
+        assert offset is not None and offset.frame_offset is None
+
+    def test_zstd_archive_is_rechunked_into_frames(self, tmp_path):
+        """Test a .pgn.zst is copied into seekable frames holding whole games."""
+        path = tmp_path / "lichess.pgn.zst"
+        path.write_bytes(zstd.ZstdCompressor().compress(_PGN.encode()))
+
+        archive = index_pgn_archive(path, frame_size=4096, buffer_size=97)
+
+        assert archive == seekable_path(path) == tmp_path / "lichess.pgn.seekable.zst"
+        assert not archive.with_name(archive.name + ".part").exists()
+        for game_index in range(len(_GAMES)):
+            assert read_indexed_game(archive, game_index) == _GAMES[game_index]
+
+        first = pgn_offsets.fetch_pgn_offset(str(archive), 0)
+        last = pgn_offsets.fetch_pgn_offset(str(archive), len(_GAMES) - 1)
+        assert first is not None and first.frame_offset == 0
+        assert last is not None and last.frame_offset is not None and last.frame_offset > 0
+        # The seekable copy still decompresses to the whole PGN
+        with archive.open("rb") as f:
+            reader = zstd.ZstdDecompressor().stream_reader(f, read_across_frames=True)
+            assert reader.read().decode() == "\n\n".join(_GAMES) + "\n\n"
+
+    def test_records_key_headers(self, tmp_path):
+        """Test headers are stored so games can be selected without reading them."""
+        path = tmp_path / "games.pgn"
+        path.write_text(_PGN)
+
+        index_pgn_archive(path)
+
+        offset = pgn_offsets.fetch_pgn_offset(str(path), 7)
+        assert offset is not None
+        assert offset.event == "Rated Blitz game"
+        assert offset.site == "https://lichess.org/g00007"
+        assert (offset.white_elo, offset.black_elo, offset.result) == (1507, None, "1-0")
+
+    def test_reindexing_replaces_previous_index(self, tmp_path):
+        """Test indexing again drops offsets of games no longer in the archive."""
+        path = tmp_path / "games.pgn"
+        path.write_text(_PGN)
+        index_pgn_archive(path)
+
+        path.write_text("\n\n".join(_GAMES[:5]))
+        index_pgn_archive(path)
+
+        assert pgn_offsets.count_pgn_offsets(str(path)) == 5
+        assert read_indexed_game(path, 4) == _GAMES[4]
+        assert read_indexed_game(path, 5) is None
+
+    def test_crash_before_replacing_the_copy_leaves_it_unindexed(self, tmp_path):
+        """Test offsets of a new seekable copy never point into the copy it replaces."""
+        path = tmp_path / "lichess.pgn.zst"
+        path.write_bytes(zstd.ZstdCompressor().compress(_PGN.encode()))
+        archive = index_pgn_archive(path, frame_size=4096)
+
+        with (
+            patch.object(Path, "replace", side_effect=OSError("interrupted")),
+            pytest.raises(OSError, match="interrupted"),
+        ):
+            index_pgn_archive(path, frame_size=1024)
+
+        assert pgn_offsets.count_pgn_offsets(str(archive)) == 0
+        assert read_indexed_game(archive, 0) is None
+
+        assert index_pgn_archive(path, frame_size=1024) == archive
+        assert pgn_offsets.count_pgn_offsets(str(archive)) == len(_GAMES)
+        assert pgn_offsets.count_pgn_offsets(str(archive) + ".part") == 0
+        assert read_indexed_game(archive, 150) == _GAMES[150]
+
+    def test_rejects_other_files(self, tmp_path):
+        """Test files that are not PGN archives raise."""
+        path = tmp_path / "games.txt"
+        path.write_text(_PGN)
+
+        with pytest.raises(ValueError, match=".pgn"):
+            index_pgn_archive(path)
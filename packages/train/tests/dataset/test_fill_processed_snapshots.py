@@ -0,0 +1,167 @@
+"""Tests for fill_processed_snapshots module."""
+
+from io import StringIO
+from unittest.mock import patch
+
+import chess.pgn
+import pytest
+
+from packages.train.src.dataset.codecs.position_codec import encode_move, pack_board
+from packages.train.src.dataset.fillers import fill_processed_snapshots as filler
+from packages.train.src.dataset.fillers.fill_processed_snapshots import fill_processed_snapshots
+from packages.train.src.dataset.models.game_snapshot import GameSnapshot
+from packages.train.src.dataset.processers.legal_moves import get_legal_moves
+from packages.train.src.dataset.processers.processed_snapshots import ProcessedSnapshotsProcessor
+from packages.train.src.dataset.repositories import (
+    database,
+    game_snapshots,
+    legal_move,
+    processed_ranges,
+)
+from packages.train.src.dataset.repositories.connection import get_connection
+
+_GAME = """1. e4 d5 2. exd5 Qxd5 3. Nc3 Qa5 4. d4 c6 5. Nf3 Bf5 6. Bc4 e6 7. O-O Nf6 \
+8. Re1 Bb4 9. a3 Bxc3 10. bxc3 O-O 11. Bg5 Nbd7 *"""
+
+
+def _snapshots() -> list[GameSnapshot]:
+    """The 22 positions of _GAME; every fifth one has no statistics."""
+    game = chess.pgn.read_game(StringIO(_GAME))
+    assert game is not None
+    board = game.board()
+    snapshots = []
+    for i, move in enumerate(game.mainline_moves()):
+        snapshots.append(
+            GameSnapshot(
+                raw_game_id=1,
+                move_number=i // 2 + 1,
+                turn="w" if board.turn == chess.WHITE else "b",
+                move_code=encode_move(move),
+                position=pack_board(board),
+                white_elo=1500 + i,
+                black_elo=1600,
+                result=None if i % 5 == 4 else "1-0",
+            )
+        )
+        board.push(move)
+    return snapshots
+
+
+_ENCODED_IDS = [i + 1 for i in range(22) if i % 5 != 4]
+
+
+@pytest.fixture
+def temp_db(db_file):
+    """A temporary database holding the snapshots of one game."""
+    database.initialize_database()
+    legal_move.save_legal_moves(get_legal_moves())
+    game_snapshots.save_snapshots_batch(_snapshots())
+    return db_file
+
+
+def _stored_rows(db_path: str) -> list[tuple]:
+    return (
+        get_connection(db_path)
+        .execute("SELECT * FROM processed_snapshots ORDER BY snapshot_id")
+        .fetchall()
+    )
+
+
+def _expected_rows() -> list[tuple]:
+    """The rows a single pass over all snapshots encodes."""
+    rows = game_snapshots.get_snapshots_batch(0, 100)
+    return filler._encode_rows(ProcessedSnapshotsProcessor(), rows)
+
+
+class TestFillProcessedSnapshots:
+    """Tests for fill_processed_snapshots."""
+
+    def test_encodes_every_range(self, temp_db):
+        """Test every snapshot with statistics is encoded and every range is done."""
+        fill_processed_snapshots(batch_size=2, max_snapshots=None, workers=1, range_size=5)
+
+        assert _stored_rows(temp_db) == _expected_rows()
+        ranges = processed_ranges.fetch_processed_ranges()
+        assert [(r.start_id, r.end_id) for r in ranges] == [
+            (0, 5),
+            (5, 10),
+            (10, 15),
+            (15, 20),
+            (20, 22),
+        ]
+        assert all(r.done for r in ranges)
+
+    def test_workers_write_the_same_rows(self, temp_db):
+        """Test encoding in worker processes stores exactly what one process stores."""
+        fill_processed_snapshots(batch_size=2, max_snapshots=None, workers=3, range_size=4)
+
+        assert _stored_rows(temp_db) == _expected_rows()
+        assert all(r.done for r in processed_ranges.fetch_processed_ranges())
+
+    def test_max_snapshots_bounds_the_ranges(self, temp_db):
+        """Test only the ids up to the max_snapshots-th snapshot with statistics are encoded."""
+        fill_processed_snapshots(batch_size=3, max_snapshots=8, workers=1, range_size=5)
+
+        stored_ids = [row[0] for row in _stored_rows(temp_db)]
+        assert stored_ids == _ENCODED_IDS[:8]
+        assert processed_ranges.fetch_processed_ranges()[-1].end_id == _ENCODED_IDS[7]
+
+    def test_resumes_each_range_after_interruption(self, temp_db):
+        """Test an interrupted run continues every range after its last saved batch."""
+        calls = []
+
+        def crash_on_third_batch(data, start_id, last_id):
+            calls.append((start_id, last_id))
+            if len(calls) == 3:
+                raise RuntimeError("interrupted")
+            save_processed_batch(data, start_id, last_id)
+
+        save_processed_batch = filler.save_processed_batch
+        with (
+            patch.object(filler, "save_processed_batch", crash_on_third_batch),
+            pytest.raises(RuntimeError),
+        ):
+            fill_processed_snapshots(batch_size=2, max_snapshots=None, workers=1, range_size=10)
+
+        first_range = processed_ranges.fetch_processed_ranges()[0]
+        assert (first_range.last_id, first_range.done) == (4, False)
+        assert len(_stored_rows(temp_db)) == 4
+
+        with patch.object(filler, "save_processed_batch", wraps=save_processed_batch) as save:
+            fill_processed_snapshots(batch_size=2, max_snapshots=None, workers=1, range_size=10)
+
+        assert _stored_rows(temp_db) == _expected_rows()
+        # The first range continues after id 4, the last one saved before the crash
+        assert [row[0] for row in save.call_args_list[0].args[0]] == [6, 7]
+
+    def test_snapshots_processed_before_ranges_are_not_encoded_again(self, temp_db):
+        """Test the migration records earlier sequential runs as one finished range."""
+        conn = get_connection(temp_db)
+        with conn:
+            conn.execute("DELETE FROM processed_ranges")
+            conn.execute("INSERT INTO processed_snapshots VALUES (3, x'', x'', 0, x'')")
+        processed_ranges.create_processed_ranges_table(temp_db)
+
+        fill_processed_snapshots(batch_size=2, max_snapshots=None, workers=1, range_size=10)
+
+        stored_ids = [row[0] for row in _stored_rows(temp_db)]
+        assert stored_ids == [3] + [i for i in _ENCODED_IDS if i > 3]
+
+    @pytest.mark.usefixtures("temp_db")
+    def test_worker_errors_are_raised(self):
+        """Test a range failing in a worker process stops the run with its error."""
+        with (
+            patch.object(filler, "_encode_rows", side_effect=ValueError("corrupt")),
+            pytest.raises(ValueError, match="corrupt"),
+        ):
+            fill_processed_snapshots(batch_size=2, max_snapshots=None, workers=2, range_size=4)
+
+    def test_writer_errors_stop_the_workers(self, temp_db):
+        """Test the workers are shut down when saving a batch fails."""
+        with (
+            patch.object(filler, "save_processed_batch", side_effect=RuntimeError("disk full")),
+            pytest.raises(RuntimeError, match="disk full"),
+        ):
+            fill_processed_snapshots(batch_size=1, max_snapshots=None, workers=2, range_size=4)
+
+        assert _stored_rows(temp_db) == []
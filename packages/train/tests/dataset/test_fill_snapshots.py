@@ -1,6 +1,11 @@
 """Tests for fill_snapshots module."""
 
-from unittest.mock import MagicMock, patch
+from collections.abc import Generator
+from contextlib import nullcontext
+from itertools import chain, repeat
+from unittest.mock import ANY, MagicMock, patch
+
+import pytest
 
 from packages.train.src.dataset.fillers.fill_snapshots_and_statistics import (
     fill_database_with_snapshots,
@@ -10,6 +15,42 @@ from packages.train.src.dataset.models.file_metadata import FileMetadata
 from packages.train.src.dataset.models.raw_game import RawGame
 
 
+@pytest.fixture(autouse=True)
+def mock_bulk_ingest():
+    """Keep the fillers from dropping indexes in the real database."""
+    with patch(
+        "packages.train.src.dataset.fillers.fill_snapshots_and_statistics.bulk_ingest",
+        side_effect=lambda **_: nullcontext(),
+    ) as mock:
+        yield mock
+
+
+def _empty_stream() -> Generator[RawGame, None, None]:
+    """A closeable game stream that yields nothing."""
+    yield from ()
+
+
+def _save_downloaded_games(file_meta, games, games_consumed):
+    """Stand-in for save_downloaded_games that stores nothing."""
+    file_meta.games_consumed = games_consumed
+    return games
+
+
+@pytest.fixture(autouse=True)
+def mock_size_budget():
+    """Keep the fillers from measuring and vacuuming the real database."""
+    with (
+        patch(
+            "packages.train.src.dataset.fillers.fill_snapshots_and_statistics.over_size_budget",
+            return_value=False,
+        ) as mock,
+        patch(
+            "packages.train.src.dataset.fillers.fill_snapshots_and_statistics.reclaim_free_pages"
+        ),
+    ):
+        yield mock
+
+
 class TestFillDatabaseWithSnapshots:
     """Tests for fill_database_with_snapshots function."""
 
@@ -68,14 +109,12 @@ class TestFillDatabaseWithSnapshots:
         "packages.train.src.dataset.fillers.fill_snapshots_and_statistics.fetch_unprocessed_raw_games"
     )
     @patch("packages.train.src.dataset.fillers.fill_snapshots_and_statistics.fetch_new_raw_games")
-    @patch("packages.train.src.dataset.processers.game_snapshots.raw_game_to_snapshots")
-    @patch("packages.train.src.dataset.processers.game_snapshots.save_snapshots_batch")
-    @patch("packages.train.src.dataset.processers.game_snapshots.mark_raw_game_as_processed")
+    @patch("packages.train.src.dataset.processers.game_snapshots.parse_raw_game")
+    @patch("packages.train.src.dataset.processers.game_snapshots.save_ingest_chunk")
     def test_processes_unprocessed_games(
         self,
-        mock_mark_processed,
-        mock_save_snapshot,
-        mock_to_snapshots,
+        mock_save_chunk,
+        mock_parse,
         mock_fetch_new,
         mock_fetch_games,
         mock_count,
@@ -91,8 +130,8 @@ class TestFillDatabaseWithSnapshots:
         game = RawGame(id=1, pgn="1. e4 e5", processed=False)
         # Return game once, then empty list to avoid infinite loop
         mock_fetch_games.side_effect = [iter([game]), iter([])]
-        # Mock fetch_new_raw_games to return empty list
-        mock_fetch_new.return_value = []
+        # Mock fetch_new_raw_games to return an empty (closeable) game stream
+        mock_fetch_new.side_effect = lambda **_: _empty_stream()
 
         from packages.train.src.dataset.models.game_snapshot import GameSnapshot
 
@@ -100,16 +139,17 @@ class TestFillDatabaseWithSnapshots:
             raw_game_id=1,
             move_number=1,
             turn="w",
-            move="e4",
-            fen="rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1",
+            move_code=0,
+            position=b"",
         )
-        mock_to_snapshots.return_value = [snapshot]
+        from packages.train.src.dataset.processers.game_parser import ParsedGame
+
+        mock_parse.return_value = ParsedGame(statistics=None, snapshots=[snapshot])
 
         fill_database_with_snapshots(snapshots_threshold=10_000, print_interval=1)
 
-        mock_to_snapshots.assert_called()
-        mock_save_snapshot.assert_called()
-        mock_mark_processed.assert_called()
+        mock_parse.assert_called_once_with(game)
+        mock_save_chunk.assert_called_once_with([], [snapshot], [1])
 
     # Skipping this test due to complexity in mocking all count_snapshots() calls
     # @patch("packages.train.src.dataset.fillers.fill_snapshots_and_statistics.initialize_database")
@@ -157,7 +197,7 @@ class TestFillDatabaseWithSnapshots:
         """Test that function stops when no new files are available."""
         mock_files_exist.return_value = True
         mock_fetch_unprocessed.side_effect = lambda: iter([])  # Return new iterator each call
-        mock_fetch_new.return_value = []  # No new files
+        mock_fetch_new.side_effect = lambda **_: _empty_stream()  # No new files
         mock_count.return_value = 0
 
         fill_database_with_snapshots(snapshots_threshold=10_000)
@@ -196,6 +236,52 @@ class TestFillDatabaseWithSnapshots:
         # Should stop with 500 snapshots when threshold is 500
         assert mock_count.call_count >= 1
 
+    @patch("packages.train.src.dataset.fillers.fill_snapshots_and_statistics.initialize_database")
+    @patch(
+        "packages.train.src.dataset.fillers.fill_snapshots_and_statistics.ensure_metadata_exists"
+    )
+    @patch(
+        "packages.train.src.dataset.fillers.fill_snapshots_and_statistics.SnapshotBatchProcessor"
+    )
+    def test_drops_indexes_only_for_bulk_runs(
+        self, mock_processor_class, _mock_ensure, _mock_init, mock_bulk_ingest
+    ):
+        """Indexes are dropped only when the run more than doubles the snapshot count."""
+        mock_processor = MagicMock()
+        mock_processor_class.return_value = mock_processor
+
+        # The first count is read before ingesting; later ones already meet the threshold
+        for threshold in (1_500, 10_000):
+            mock_processor.get_snapshot_count.side_effect = chain([1_000], repeat(threshold))
+            fill_database_with_snapshots(snapshots_threshold=threshold)
+
+        assert [c.kwargs["enabled"] for c in mock_bulk_ingest.call_args_list] == [False, True]
+
+    @patch("packages.train.src.dataset.fillers.fill_snapshots_and_statistics.initialize_database")
+    @patch(
+        "packages.train.src.dataset.fillers.fill_snapshots_and_statistics.ensure_metadata_exists"
+    )
+    @patch(
+        "packages.train.src.dataset.fillers.fill_snapshots_and_statistics.SnapshotBatchProcessor"
+    )
+    @patch("packages.train.src.dataset.fillers.fill_snapshots_and_statistics.fetch_new_raw_games")
+    def test_stops_at_size_budget(
+        self, mock_fetch_new, mock_processor_class, _mock_ensure, _mock_init, mock_size_budget
+    ):
+        """Test no more games are ingested once the database is over its size budget."""
+        mock_processor = MagicMock()
+        mock_processor.get_snapshot_count.return_value = 0
+        mock_processor_class.return_value = mock_processor
+        mock_size_budget.return_value = True
+
+        fill_database_with_snapshots(
+            snapshots_threshold=10_000, max_size_gb=1.0, max_db_size_gb=2.0
+        )
+
+        mock_size_budget.assert_called_with(2.0)
+        mock_processor.process_games.assert_not_called()
+        mock_fetch_new.assert_not_called()
+
 
 class TestFillDatabaseWithSnapshotsFromFilename:
     """Tests for fill_database_with_snapshots_from_lichess_filename function."""
@@ -261,7 +347,7 @@ class TestFillDatabaseWithSnapshotsFromFilename:
 
         fill_database_with_snapshots_from_lichess_filename("test.pgn.zst")
 
-        mock_fetch_games.assert_called_once_with(file_meta)
+        mock_fetch_games.assert_called_once_with(file_meta, cache=ANY, ingest_filter=ANY)
         mock_mark.assert_called_once_with(file_meta)
 
     @patch("packages.train.src.dataset.fillers.fill_snapshots_and_statistics.initialize_database")
@@ -322,9 +408,8 @@ class TestSnapshotBatchProcessor:
             assert processor.print_interval == 50
 
     @patch("packages.train.src.dataset.processers.game_snapshots.count_snapshots")
-    @patch("packages.train.src.dataset.processers.game_snapshots.save_snapshots_batch")
-    @patch("packages.train.src.dataset.processers.game_snapshots.mark_raw_game_as_processed")
-    def test_process_games_basic(self, mock_mark, _mock_save_batch, mock_count):
+    @patch("packages.train.src.dataset.processers.game_snapshots.save_ingest_chunk")
+    def test_process_games_basic(self, mock_save_chunk, mock_count):
         """Test basic game processing."""
         from packages.train.src.dataset.processers.game_snapshots import SnapshotBatchProcessor
 
@@ -343,12 +428,16 @@ class TestSnapshotBatchProcessor:
         games_processed = processor.process_games(iter([game]))
 
         assert games_processed == 1
-        mock_mark.assert_called_once_with(game)
+        mock_save_chunk.assert_called_once()
+        statistics, snapshots, raw_game_ids = mock_save_chunk.call_args.args
+        assert [s.raw_game_id for s in statistics] == [1]
+        assert [s.move for s in snapshots] == ["e4"]
+        assert raw_game_ids == [1]
+        assert game.processed
 
     @patch("packages.train.src.dataset.processers.game_snapshots.count_snapshots")
-    @patch("packages.train.src.dataset.processers.game_snapshots.save_snapshots_batch")
-    @patch("packages.train.src.dataset.processers.game_snapshots.mark_raw_game_as_processed")
-    def test_process_games_with_filter(self, mock_mark, _mock_save_batch, mock_count):
+    @patch("packages.train.src.dataset.processers.game_snapshots.save_ingest_chunk")
+    def test_process_games_with_filter(self, mock_save_chunk, mock_count):
         """Test processing games with filter."""
         from packages.train.src.dataset.processers.game_snapshots import SnapshotBatchProcessor
 
@@ -371,12 +460,11 @@ class TestSnapshotBatchProcessor:
         )
 
         assert games_processed == 1
-        assert mock_mark.call_count == 1
+        assert mock_save_chunk.call_args.args[2] == [1]
 
     @patch("packages.train.src.dataset.processers.game_snapshots.count_snapshots")
-    @patch("packages.train.src.dataset.processers.game_snapshots.save_snapshots_batch")
-    @patch("packages.train.src.dataset.processers.game_snapshots.mark_raw_game_as_processed")
-    def test_process_games_with_stop_condition(self, _mock_mark, _mock_save_batch, mock_count):
+    @patch("packages.train.src.dataset.processers.game_snapshots.save_ingest_chunk")
+    def test_process_games_with_stop_condition(self, _mock_save_chunk, mock_count):
         """Test processing stops when should_stop returns True."""
         from packages.train.src.dataset.processers.game_snapshots import SnapshotBatchProcessor
 
@@ -405,6 +493,34 @@ class TestSnapshotBatchProcessor:
 
         assert games_processed == 2
 
+    @patch("packages.train.src.dataset.processers.game_snapshots.count_snapshots")
+    @patch("packages.train.src.dataset.processers.game_snapshots.save_ingest_chunk")
+    def test_process_games_with_batch_stop_condition(self, mock_save_chunk, mock_count):
+        """Test should_stop_after_batch is only checked once a batch is committed."""
+        from packages.train.src.dataset.processers.game_snapshots import SnapshotBatchProcessor
+
+        mock_count.return_value = 0
+
+        processor = SnapshotBatchProcessor(batch_size=2)
+
+        pgn = """[Event "Test"]
+[White "P1"]
+[Black "P2"]
+[Result "1-0"]
+
+1. e4 1-0"""
+        games = [RawGame(id=i, file_id=1, pgn=pgn, processed=False) for i in range(7)]
+        should_stop_after_batch = MagicMock(side_effect=[False, True])
+
+        games_processed = processor.process_games(
+            iter(games),
+            should_stop_after_batch=should_stop_after_batch,
+        )
+
+        assert games_processed == 4
+        assert should_stop_after_batch.call_count == 2
+        assert [call.args[2] for call in mock_save_chunk.call_args_list] == [[0, 1], [2, 3]]
+
     def test_get_snapshot_count(self):
         """Test getting current snapshot count."""
         from packages.train.src.dataset.processers.game_snapshots import SnapshotBatchProcessor
@@ -421,7 +537,10 @@ class TestFetchRawGamesFromFile:
     """Tests for fetch_raw_games_from_file in requesters."""
 
     @patch("packages.train.src.dataset.requesters.raw_games.requests.get")
-    @patch("packages.train.src.dataset.requesters.raw_games.save_raw_game")
+    @patch(
+        "packages.train.src.dataset.requesters.raw_games.save_downloaded_games",
+        side_effect=_save_downloaded_games,
+    )
     def test_downloads_and_parses_file(self, _mock_save, mock_get):
         """Test downloading and parsing a PGN file."""
         from packages.train.src.dataset.requesters.raw_games import fetch_raw_games_from_file
@@ -456,6 +575,70 @@ class TestFetchRawGamesFromFile:
         assert games[0].file_id == 1
         assert "e4" in games[0].pgn
 
+    @patch("packages.train.src.dataset.requesters.raw_games.requests.get")
+    @patch(
+        "packages.train.src.dataset.requesters.raw_games.save_downloaded_games",
+        side_effect=_save_downloaded_games,
+    )
+    def test_skips_games_consumed_by_earlier_run(self, mock_save, mock_get):
+        """Test games stored by an interrupted run are not stored again."""
+        import zstandard as zstd
+
+        from packages.train.src.dataset.requesters.raw_games import fetch_raw_games_from_file
+
+        file_meta = FileMetadata(
+            id=1,
+            url="https://example.com/test.pgn.zst",
+            filename="test.pgn.zst",
+            games=3,
+            size_gb=0.1,
+            games_consumed=2,
+        )
+        pgn_text = "\n\n".join(f'[Event "Game {i}"]\n\n1. e4 1-0' for i in range(3))
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        compressed = zstd.ZstdCompressor().compress(pgn_text.encode("utf-8"))
+        mock_response.raw.read = MagicMock(side_effect=[compressed, b""])
+        mock_get.return_value = mock_response
+
+        games = list(fetch_raw_games_from_file(file_meta))
+
+        assert [g.pgn.splitlines()[0] for g in games] == ['[Event "Game 2"]']
+        mock_save.assert_called_once_with(file_meta, games, 3)
+        mock_response.close.assert_called_once()
+
+    @patch("packages.train.src.dataset.requesters.raw_games.requests.get")
+    @patch(
+        "packages.train.src.dataset.requesters.raw_games.save_downloaded_games",
+        side_effect=_save_downloaded_games,
+    )
+    def test_rejected_games_are_not_stored(self, mock_save, mock_get):
+        """Test games rejected by the ingest filter are skipped but counted as read."""
+        import zstandard as zstd
+
+        from packages.train.src.dataset.processers.ingest_filter import IngestFilter
+        from packages.train.src.dataset.requesters.raw_games import fetch_raw_games_from_file
+
+        file_meta = FileMetadata(
+            id=1, url="https://example.com/t.pgn.zst", filename="t.pgn.zst", games=3, size_gb=0.1
+        )
+        events = ["Rated Bullet game", "Rated Blitz game", "Rated Bullet game"]
+        pgn_text = "\n\n".join(f'[Event "{event}"]\n\n1. e4 1-0' for event in events)
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        compressed = zstd.ZstdCompressor().compress(pgn_text.encode("utf-8"))
+        mock_response.raw.read = MagicMock(side_effect=[compressed, b""])
+        mock_get.return_value = mock_response
+        ingest_filter = IngestFilter(
+            min_elo=None, max_elo=None, max_elo_gap=None, time_controls=("Blitz",), variants=()
+        )
+
+        games = list(fetch_raw_games_from_file(file_meta, ingest_filter=ingest_filter))
+
+        assert [g.pgn.splitlines()[0] for g in games] == ['[Event "Rated Blitz game"]']
+        mock_save.assert_called_once_with(file_meta, games, 3)
+        assert file_meta.games_consumed == 3
+
     @patch("packages.train.src.dataset.requesters.raw_games.requests.get")
     def test_handles_download_error(self, mock_get):
         """Test handling of download errors."""
@@ -478,6 +661,91 @@ class TestFetchRawGamesFromFile:
         assert len(games) == 0
 
 
+class TestFetchNewRawGames:
+    """Tests for fetch_new_raw_games early stopping and resuming."""
+
+    @patch("packages.train.src.dataset.requesters.raw_games.fetch_files_metadata_under_size")
+    @patch("packages.train.src.dataset.requesters.raw_games.fetch_raw_games_from_file")
+    @patch("packages.train.src.dataset.requesters.raw_games.mark_file_as_processed")
+    def test_closing_early_leaves_file_unprocessed(self, mock_mark, mock_fetch_games, mock_files):
+        """Test closing the stream early does not mark the file as processed."""
+        from packages.train.src.dataset.requesters.raw_games import fetch_new_raw_games
+
+        file_meta = FileMetadata(
+            id=1, url="https://example.com/a.pgn.zst", filename="a", games=10, size_gb=0.1
+        )
+        file_meta.games_consumed = 3
+        mock_files.return_value = [file_meta]
+
+        def read_games(meta, **_kwargs):
+            # The requester advances games_consumed as it reads
+            for i in range(5):
+                meta.games_consumed += 1
+                yield RawGame(id=i, file_id=1, pgn="1. e4")
+
+        mock_fetch_games.side_effect = read_games
+
+        games = fetch_new_raw_games(max_files=1)
+        next(games)
+        next(games)
+        games.close()
+
+        mock_mark.assert_not_called()
+
+    @patch("packages.train.src.dataset.requesters.raw_games.fetch_files_metadata_under_size")
+    @patch("packages.train.src.dataset.requesters.raw_games.fetch_raw_games_from_file")
+    @patch("packages.train.src.dataset.requesters.raw_games.mark_file_as_processed")
+    def test_resumes_partial_files_first(self, mock_mark, mock_fetch_games, mock_files):
+        """Test partially ingested files are picked before smaller fresh files."""
+        from packages.train.src.dataset.requesters.raw_games import fetch_new_raw_games
+
+        small = FileMetadata(url="https://example.com/s", filename="s", games=1, size_gb=0.1)
+        partial = FileMetadata(
+            url="https://example.com/p", filename="p", games=1, size_gb=0.5, games_consumed=2
+        )
+        mock_files.return_value = [small, partial]
+        mock_fetch_games.return_value = iter([])
+
+        list(fetch_new_raw_games(max_files=1))
+
+        mock_fetch_games.assert_called_once_with(partial, cache=None, ingest_filter=None)
+        mock_mark.assert_called_once_with(partial)
+
+
+class TestIterPgnGames:
+    """Tests for the incremental PGN splitter in requesters."""
+
+    def test_splits_across_buffer_boundaries(self):
+        """Test games are reassembled when separators straddle buffer reads."""
+        import io
+
+        from packages.train.src.dataset.requesters.raw_games import _iter_pgn_games
+
+        games = [f'[Event "Game {i}"]\n[Result "1-0"]\n\n1. e4 1-0' for i in range(5)]
+        stream = io.BytesIO("\n\n".join(games).encode("utf-8"))
+
+        assert list(_iter_pgn_games(stream, buffer_size=7)) == games
+
+    def test_preserves_unicode(self):
+        """Test multi-byte characters split across reads are decoded intact."""
+        import io
+
+        from packages.train.src.dataset.requesters.raw_games import _iter_pgn_games
+
+        games = ['[Event "Ä"]\n[White "♔"]\n\n1. e4 1-0', '[Event "B"]\n\n1. d4 0-1']
+        stream = io.BytesIO("\n\n".join(games).encode("utf-8"))
+
+        assert list(_iter_pgn_games(stream, buffer_size=3)) == games
+
+    def test_empty_stream(self):
+        """Test an empty stream yields no games."""
+        import io
+
+        from packages.train.src.dataset.requesters.raw_games import _iter_pgn_games
+
+        assert list(_iter_pgn_games(io.BytesIO(b""))) == []
+
+
 class TestEnsureMetadataExists:
     """Tests for ensure_metadata_exists in repositories."""
 
@@ -46,14 +46,10 @@ def sample_raw_game(sample_pgn):
 
 
 @pytest.fixture
-def temp_db(tmp_path, monkeypatch):
-    """Create a temporary database for testing using tmp_path and monkeypatch."""
-    db_path = tmp_path / "test.db"
-    import packages.train.src.dataset.repositories.game_statistics as stats_repo
-
-    monkeypatch.setattr(stats_repo, "DB_FILE", str(db_path))
-    create_game_statistics_table()
-    yield str(db_path)
+def temp_db(db_file):
+    """Create a temporary database for testing."""
+    create_game_statistics_table(db_file)
+    return db_file
 
 
 def test_extract_statistics_from_raw_game(sample_raw_game):
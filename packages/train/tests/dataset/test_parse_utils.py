@@ -0,0 +1,31 @@
+"""Tests for parse_utils module."""
+
+from packages.train.src.dataset.parse_utils import parse_int
+
+
+class TestParseInt:
+    """Tests for parse_int helper function."""
+
+    def test_valid_int_string(self):
+        """Test converting valid int string."""
+        assert parse_int("1500") == 1500
+
+    def test_none(self):
+        """Test converting None."""
+        assert parse_int(None) is None
+
+    def test_invalid_string(self):
+        """Test converting invalid string."""
+        assert parse_int("not a number") is None
+
+    def test_empty_string(self):
+        """Test converting empty string."""
+        assert parse_int("") is None
+
+    def test_negative_number(self):
+        """Test converting negative number."""
+        assert parse_int("-100") == -100
+
+    def test_zero(self):
+        """Test converting zero."""
+        assert parse_int("0") == 0
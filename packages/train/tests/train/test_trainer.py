@@ -78,7 +78,7 @@ def mock_trainer(mock_values, tmp_path):
             (torch.randn(12, 8, 8), torch.randn(4)),  # (board, metadata)
             (
                 torch.randint(0, 2104, ()),
-                torch.randint(0, 2, (2104,)),
+                torch.randint(0, 2104, (30,)),
             ),  # (chosen_move, valid_moves)
         )
         mock_dataset.return_value = mock_dataset_instance
@@ -231,7 +231,7 @@ def test_auto_save_timing(mock_values, tmp_path):
             (torch.randn(12, 8, 8), torch.randn(4)),  # (board, metadata)
             (
                 torch.randint(0, 2104, ()),
-                torch.randint(0, 2, (2104,)),
+                torch.randint(0, 2104, (30,)),
             ),  # (chosen_move, valid_moves)
         )
         mock_dataset.return_value = mock_dataset_instance
@@ -290,7 +290,7 @@ def test_data_loading_edge_cases_empty_dataset(mock_values, tmp_path):
             (torch.randn(12, 8, 8), torch.randn(4)),  # (board, metadata)
             (
                 torch.randint(0, 2104, ()),
-                torch.randint(0, 2, (2104,)),
+                torch.randint(0, 2104, (30,)),
             ),  # (chosen_move, valid_moves)
         )
         mock_dataset.return_value = mock_dataset_instance
@@ -323,7 +323,7 @@ def test_data_loading_edge_cases_invalid_split(mock_values, tmp_path):
             (torch.randn(12, 8, 8), torch.randn(4)),  # (board, metadata)
             (
                 torch.randint(0, 2104, ()),
-                torch.randint(0, 2, (2104,)),
+                torch.randint(0, 2104, (30,)),
             ),  # (chosen_move, valid_moves)
         )
         mock_dataset.return_value = mock_dataset_instance
@@ -352,7 +352,7 @@ def test_error_handling_invalid_hyperparameters(mock_values, tmp_path):
             (torch.randn(12, 8, 8), torch.randn(4)),  # (board, metadata)
             (
                 torch.randint(0, 2104, (1,)),
-                torch.randint(0, 2, (2104,)),
+                torch.randint(0, 2104, (30,)),
             ),  # (chosen_move, valid_moves)
         )
 